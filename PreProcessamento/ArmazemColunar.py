@@ -0,0 +1,301 @@
+import json
+import os
+import sys
+import time
+import numpy as np
+from FluxoColunar import ler_blocos
+from FluxoCompacto import empacotar_ip, desempacotar_ip, ip_do_documento, AF_IPV4
+from CamposDerivados import MATERIALIZAVEIS, adicionar_derivados
+
+# Armazém colunar local: um arquivo binário de largura fixa por campo (lido com memory-map) e um
+# meta.json com o número de fluxos e o mínimo/máximo de cada campo numérico em cada chunk.
+#   <diretorio>/<campo>.bin  (valores little-endian, sem cabeçalho)
+#   <diretorio>/meta.json
+# Os IPs ficam empacotados em 16 bytes (IPv4 completado com zeros) com a família em "af".
+# "criado" e "versao" (incrementada a cada confirmação) no meta.json identificam os dados para os caches.
+# Com derivados=True o armazém também guarda os campos derivados (CamposDerivados.py) em float64; os campos
+# de cada armazém ficam em "campos" no meta.json.
+
+DIRETORIO_ARMAZEM = "./Datasets/Colunar"  # Cada coleção fica em <DIRETORIO_ARMAZEM>/<coleção>
+LINHAS_POR_CHUNK = 1 << 20
+LOTE_EXPORTACAO = 100000  # Documentos lidos do MongoDB por vez na exportação
+VERSAO_FORMATO = 1
+
+CAMPOS = {
+    "af": "u1",
+    "src": "S16",
+    "src_port": "<u2",
+    "dst": "S16",
+    "dst_port": "<u2",
+    "npackets_src": "<i8",
+    "nbytes_src": "<i8",
+    "npackets_dst": "<i8",
+    "nbytes_dst": "<i8",
+    "npackets_total": "<i8",
+    "nbytes_total": "<i8",
+    "start": "<i8",
+    "duration": "<i8",
+}
+CAMPOS_IP = ("af", "src", "dst")
+CAMPOS_NUMERICOS = [campo for campo in CAMPOS if campo not in CAMPOS_IP]
+CAMPOS_DERIVADOS = {campo: "<f8" for campo in MATERIALIZAVEIS}
+
+def caminho_meta(diretorio):
+    return os.path.join(diretorio, "meta.json")
+
+def caminho_campo(diretorio, campo):
+    return os.path.join(diretorio, f"{campo}.bin")
+
+def ler_meta(diretorio):
+    if not os.path.isfile(caminho_meta(diretorio)):
+        return None
+    with open(caminho_meta(diretorio), "r", encoding="utf-8") as file:
+        return json.load(file)
+
+# Converte uma coluna de IPs (texto, ou inteiros IPv4 quando o parser roda sem IPv6) em (af, bytes)
+def ips_para_bytes(valores):
+    valores = np.asarray(valores)
+    if valores.dtype.kind in "iu":
+        ips = valores.astype(">u4").view("S4").astype("S16")
+        return np.full(len(valores), AF_IPV4, dtype="u1"), ips
+    empacotados = [empacotar_ip(ip) for ip in valores.tolist()]
+    return (np.array([af for af, _ in empacotados], dtype="u1"),
+            np.array([ip for _, ip in empacotados], dtype="S16"))
+
+# Grava fluxos no fim do armazém. Os dados só passam a valer quando o meta.json é gravado
+# (confirmar/fechar); o que foi escrito depois da última confirmação é descartado ao reabrir.
+# derivados=True acrescenta os campos derivados; num armazém que já tem fluxos eles são calculados
+# para os fluxos existentes (backfill) e gravados na próxima confirmação.
+class EscritorColunar:
+    def __init__(self, diretorio, linhas_por_chunk=LINHAS_POR_CHUNK, derivados=False):
+        os.makedirs(diretorio, exist_ok=True)
+        self.diretorio = diretorio
+        self.meta = ler_meta(diretorio) or {
+            "versao_formato": VERSAO_FORMATO,
+            "linhas": 0,
+            "versao": 0,
+            "criado": time.time(),
+            "linhas_por_chunk": linhas_por_chunk,
+            "campos": CAMPOS,
+            "chunks": [],
+        }
+        if derivados:
+            self.meta["campos"] = {**self.meta["campos"], **CAMPOS_DERIVADOS}
+        self.campos = self.meta["campos"]
+        self.linhas = self.meta["linhas"]
+        self.arquivos = {}
+        for campo, dtype in self.campos.items():
+            file = open(caminho_campo(diretorio, campo), "ab")
+            gravadas = min(os.path.getsize(caminho_campo(diretorio, campo)) // np.dtype(dtype).itemsize, self.linhas)
+            file.truncate(gravadas * np.dtype(dtype).itemsize)
+            self.arquivos[campo] = file
+            if gravadas < self.linhas:
+                self._preencher(campo, gravadas)
+
+    # Calcula o campo derivado dos fluxos [inicio, linhas) a partir das colunas já gravadas
+    def _preencher(self, campo, inicio):
+        funcao, _ = MATERIALIZAVEIS[campo]
+        por_chunk = self.meta["linhas_por_chunk"]
+        colunas = abrir_colunas(self.diretorio, self.linhas, {c: CAMPOS[c] for c in CAMPOS_NUMERICOS})
+        for posicao in range(inicio, self.linhas, por_chunk):
+            fim = min(posicao + por_chunk, self.linhas)
+            chunk = {c: valores[posicao:fim] for c, valores in colunas.items()}
+            np.ascontiguousarray(funcao(chunk), dtype=self.campos[campo]).tofile(self.arquivos[campo])
+
+    # Acrescenta um bloco de colunas no formato do FluxoColunar (IPs em texto ou inteiros)
+    # ou já com os IPs empacotados e a coluna "af"
+    def adicionar(self, colunas):
+        if "af" not in colunas:
+            af, src = ips_para_bytes(colunas["src"])
+            _, dst = ips_para_bytes(colunas["dst"])
+            colunas = dict(colunas, af=af, src=src, dst=dst)
+        if any(campo not in colunas for campo in self.campos):
+            colunas = adicionar_derivados(colunas)
+        for campo, dtype in self.campos.items():
+            np.ascontiguousarray(colunas[campo], dtype=dtype).tofile(self.arquivos[campo])
+        self.linhas += len(colunas["af"])
+
+    # Atualiza as estatísticas dos chunks novos (ou incompletos, ou sem algum campo) e grava o meta.json
+    def confirmar(self):
+        for file in self.arquivos.values():
+            file.flush()
+            os.fsync(file.fileno())
+
+        por_chunk = self.meta["linhas_por_chunk"]
+        numericos = {campo: dtype for campo, dtype in self.campos.items() if campo not in CAMPOS_IP}
+        chunks = []
+        for c in self.meta["chunks"]:
+            if c["fim"] - c["inicio"] != por_chunk or any(campo not in c["min"] for campo in numericos):
+                break
+            chunks.append(c)
+        colunas = abrir_colunas(self.diretorio, self.linhas, numericos)
+        for inicio in range(len(chunks) * por_chunk, self.linhas, por_chunk):
+            fim = min(inicio + por_chunk, self.linhas)
+            chunks.append({
+                "inicio": inicio,
+                "fim": fim,
+                "min": {campo: colunas[campo][inicio:fim].min().item() for campo in numericos},
+                "max": {campo: colunas[campo][inicio:fim].max().item() for campo in numericos},
+            })
+
+        self.meta.update(linhas=self.linhas, chunks=chunks, versao=self.meta.get("versao", 0) + 1)
+        temporario = caminho_meta(self.diretorio) + ".tmp"
+        with open(temporario, "w", encoding="utf-8") as file:
+            json.dump(self.meta, file)
+        os.replace(temporario, caminho_meta(self.diretorio))
+
+    def fechar(self, confirmar=True):
+        if confirmar:
+            self.confirmar()
+        for file in self.arquivos.values():
+            file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, tipo, valor, traceback):
+        self.fechar(confirmar=tipo is None)
+
+# Abre as colunas ({campo: dtype}) como memmaps somente leitura (o memmap não aceita arquivos vazios)
+def abrir_colunas(diretorio, linhas, campos):
+    colunas = {}
+    for campo, dtype in campos.items():
+        if linhas == 0:
+            colunas[campo] = np.empty(0, dtype=dtype)
+        else:
+            colunas[campo] = np.memmap(caminho_campo(diretorio, campo), dtype=dtype, mode="r", shape=(linhas,))
+    return colunas
+
+# Leitura do armazém: todas as colunas e chunks são views sem cópia dos arquivos mapeados
+class ArmazemColunar:
+    def __init__(self, diretorio):
+        self.meta = ler_meta(diretorio)
+        if self.meta is None:
+            raise FileNotFoundError(f"Armazém colunar não encontrado: {diretorio}")
+        self.diretorio = diretorio
+        self.linhas = self.meta["linhas"]
+        self.colunas = abrir_colunas(diretorio, self.linhas, self.meta.get("campos", CAMPOS))
+
+    def __len__(self):
+        return self.linhas
+
+    def versao(self):
+        return {"documentos": self.linhas, "versao": self.meta.get("versao", 0), "criado": self.meta.get("criado")}
+
+    def coluna(self, campo):
+        return self.colunas[campo]
+
+    # Mínimo e máximo de um campo numérico, só pelos metadados (sem varrer os dados)
+    def minimo(self, campo):
+        return min((c["min"][campo] for c in self.meta["chunks"]), default=None)
+
+    def maximo(self, campo):
+        return max((c["max"][campo] for c in self.meta["chunks"]), default=None)
+
+    # Percorre os chunks devolvendo {campo: view}; o campo "_id" é a posição de cada fluxo no armazém.
+    # filtros = {campo: (minimo, maximo)} pula os chunks cujo intervalo [min, max] não cruza o pedido
+    # (os fluxos do chunk ainda precisam ser filtrados).
+    def chunks(self, campos, filtros=None):
+        for chunk in self.meta["chunks"]:
+            if self.cruza(chunk, filtros):
+                yield self.ler_chunk(chunk, campos)
+
+    # O intervalo [min, max] do chunk (metadados) cruza todos os filtros?
+    @staticmethod
+    def cruza(chunk, filtros):
+        return not filtros or all(
+            chunk["max"][campo] >= minimo and chunk["min"][campo] <= maximo
+            for campo, (minimo, maximo) in filtros.items()
+        )
+
+    def ler_chunk(self, chunk, campos):
+        return {
+            campo: np.arange(chunk["inicio"], chunk["fim"]) if campo == "_id"
+            else self.colunas[campo][chunk["inicio"]:chunk["fim"]]
+            for campo in campos
+        }
+
+    # Monta os documentos (mesmo formato do FluxoFile.to_dict()) das linhas pedidas
+    def documentos(self, indices):
+        docs = []
+        for i in np.asarray(indices).tolist():
+            af = int(self.colunas["af"][i])
+            tamanho_ip = 4 if af == AF_IPV4 else 16
+            doc = {
+                "src": desempacotar_ip(af, self.colunas["src"][i].ljust(tamanho_ip, b"\0")),
+                "src_port": int(self.colunas["src_port"][i]),
+                "dst": desempacotar_ip(af, self.colunas["dst"][i].ljust(tamanho_ip, b"\0")),
+                "dst_port": int(self.colunas["dst_port"][i]),
+            }
+            doc.update((campo, int(self.colunas[campo][i])) for campo in CAMPOS_NUMERICOS[2:])
+            docs.append(doc)
+        return docs
+
+# Abre o armazém de uma coleção no diretório padrão
+def abrir_armazem(colecao, diretorio=DIRETORIO_ARMAZEM):
+    return ArmazemColunar(os.path.join(diretorio, colecao))
+
+# Insere um arquivo de fluxos (.txt) no armazém; cada arquivo é confirmado ao terminar
+def ingerir_arquivo(escritor, caminho, permitir_ipv6=True):
+    linhas = 0
+    for colunas in ler_blocos(caminho, permitir_ipv6=permitir_ipv6):
+        escritor.adicionar(colunas)
+        linhas += len(colunas["start"])
+    escritor.confirmar()
+    return linhas
+
+# Copia uma coleção do MongoDB (qualquer formato de IP) para o armazém
+def exportar_colecao(collection, escritor, lote=LOTE_EXPORTACAO):
+    projecao = {"_id": 0, **{campo: 1 for campo in CAMPOS if campo != "af"}}
+    pendentes = []
+    total = 0
+
+    def gravar():
+        src = [ip_do_documento(doc["src"]) for doc in pendentes]
+        colunas = {campo: [doc[campo] for doc in pendentes] for campo in CAMPOS_NUMERICOS}
+        colunas.update(
+            af=[af for af, _ in src],
+            src=[ip for _, ip in src],
+            dst=[ip_do_documento(doc["dst"])[1] for doc in pendentes],
+        )
+        escritor.adicionar(colunas)
+
+    for doc in collection.find({}, projecao, batch_size=lote):
+        pendentes.append(doc)
+        if len(pendentes) >= lote:
+            gravar()
+            total += len(pendentes)
+            pendentes = []
+    if pendentes:
+        gravar()
+        total += len(pendentes)
+    escritor.confirmar()
+    return total
+
+# Uso: python ArmazemColunar.py exportar <coleção> [base]  → copia a coleção do MongoDB para o armazém
+#      python ArmazemColunar.py derivados <coleção>        → grava os campos derivados no armazém existente
+#      python ArmazemColunar.py info <coleção>
+if __name__ == "__main__":
+    if len(sys.argv) < 3 or sys.argv[1] not in ("exportar", "derivados", "info"):
+        print("Uso: python ArmazemColunar.py exportar <coleção> [base] | derivados <coleção> | info <coleção>")
+        sys.exit(1)
+
+    diretorio = os.path.join(DIRETORIO_ARMAZEM, sys.argv[2])
+    if sys.argv[1] == "exportar":
+        import pymongo
+        db_name = sys.argv[3] if len(sys.argv) > 3 else "fluxos_database"
+        inicio = time.time()
+        with pymongo.MongoClient("mongodb://localhost:27017/") as mongo_client, EscritorColunar(diretorio) as escritor:
+            total = exportar_colecao(mongo_client[db_name][sys.argv[2]], escritor)
+        print(f"{total} fluxos exportados para {diretorio} em {time.time() - inicio:.2f} s")
+    elif sys.argv[1] == "derivados":
+        inicio = time.time()
+        with EscritorColunar(diretorio, derivados=True) as escritor:
+            total = escritor.linhas
+        print(f"Campos derivados de {total} fluxos gravados em {diretorio} em {time.time() - inicio:.2f} s")
+    else:
+        armazem = ArmazemColunar(diretorio)
+        print(f"{diretorio}: {len(armazem)} fluxos em {len(armazem.meta['chunks'])} chunks")
+        for campo in armazem.colunas:
+            if campo not in CAMPOS_IP:
+                print(f"  {campo}: [{armazem.minimo(campo)}, {armazem.maximo(campo)}]")
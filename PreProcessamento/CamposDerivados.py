@@ -0,0 +1,68 @@
+import numpy as np
+
+# Campos calculados a partir dos campos gravados de cada fluxo. A mesma regra existe em NumPy
+# (calcular_*(colunas) → array), como expressão de agregação do MongoDB (EXPRESSAO_*) e por documento
+# (derivados_documento), para que a ingestão, a unificação e o Processamento gravem e calculem o mesmo valor.
+# Gravados na coleção (--derivados na ingestão, DERIVADOS na unificação ou o backfill do
+# Processamento/MaterializarDerivados.py), eles deixam de ser calculados em cada consulta e podem ser indexados.
+
+# Fluxos com menos pacotes são sempre "Normal" na classificação (Processamento/Classificacao.py) e ficam
+# num grupo à parte nos resumos incrementais (ResumosFluxos.py)
+MINIMO_PACOTES = 3
+
+# Taxa em B/s; 0 quando a duração é 0
+def calcular_taxa(colunas):
+    duration = np.asarray(colunas["duration"])
+    taxa = np.zeros(len(duration))
+    positivos = duration > 0
+    taxa[positivos] = np.asarray(colunas["nbytes_total"])[positivos] / (duration[positivos] / 1000)
+    return taxa
+
+EXPRESSAO_TAXA = {
+    "$cond": [
+        {"$gt": ["$duration", 0]},
+        {"$divide": ["$nbytes_total", {"$divide": ["$duration", 1000]}]},
+        0
+    ]
+}
+
+# Tamanho médio dos pacotes em bytes; 0 quando não há pacotes
+def calcular_tamanho_medio(colunas):
+    npackets = np.asarray(colunas["npackets_total"])
+    tamanho = np.zeros(len(npackets))
+    positivos = npackets > 0
+    tamanho[positivos] = np.asarray(colunas["nbytes_total"])[positivos] / npackets[positivos]
+    return tamanho
+
+EXPRESSAO_TAMANHO_MEDIO = {
+    "$cond": [
+        {"$gt": ["$npackets_total", 0]},
+        {"$divide": ["$nbytes_total", "$npackets_total"]},
+        0
+    ]
+}
+
+# Campos derivados que podem ser gravados: {campo: (função NumPy, expressão do MongoDB)}
+MATERIALIZAVEIS = {
+    "rate": (calcular_taxa, EXPRESSAO_TAXA),
+    "avg_pkt_size": (calcular_tamanho_medio, EXPRESSAO_TAMANHO_MEDIO),
+}
+
+# Atualização (pipeline) que grava os campos derivados a partir dos campos do próprio documento
+ATUALIZACAO_DERIVADOS = [{"$set": {campo: expressao for campo, (_, expressao) in MATERIALIZAVEIS.items()}}]
+
+# Acrescenta os campos derivados a um bloco de colunas {campo: array}
+def adicionar_derivados(colunas):
+    return dict(colunas, **{campo: funcao(colunas) for campo, (funcao, _) in MATERIALIZAVEIS.items()})
+
+# Campos derivados de um documento (mesmo valor que as colunas e as expressões)
+def derivados_documento(doc):
+    duration, npackets = doc["duration"], doc["npackets_total"]
+    return {
+        "rate": doc["nbytes_total"] / (duration / 1000) if duration > 0 else 0.0,
+        "avg_pkt_size": doc["nbytes_total"] / npackets if npackets > 0 else 0.0,
+    }
+
+# Índice descendente em cada campo (top-k lê o começo do índice; contagens por intervalo usam o índice)
+def criar_indices(collection, campos):
+    return [collection.create_index([(campo, -1)]) for campo in campos]
@@ -2,10 +2,10 @@ import pymongo
 import time
 import sys
 import io
-sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
+from VersaoColecao import marcar_escrita
 
-# Aqui faz a conexão com o banco de dados
-mongo_client = pymongo.MongoClient("mongodb://localhost:27017/")
+# Endereço do banco de dados
+MONGO_URI = "mongodb://localhost:27017/"
 
 # Data base name
 DATA_BASE_NAME = "fluxos_database"
@@ -15,15 +15,20 @@ COLLECTION_NAME = "caida_collection"
 # Collection copia name
 COLLECTION_NAME_COPY = "caida_collection_copy"
 
-start = time.time()
+def main(origem=COLLECTION_NAME, destino=COLLECTION_NAME_COPY, db=DATA_BASE_NAME, uri=MONGO_URI):
+    start = time.time()
 
-# Faz a copia da collection original para a collection copia
-mongo_client[DATA_BASE_NAME][COLLECTION_NAME].aggregate([
-    {"$out": COLLECTION_NAME_COPY}
-])
+    # Aqui faz a conexão com o banco de dados
+    with pymongo.MongoClient(uri) as mongo_client:
+        # Faz a copia da collection original para a collection copia
+        mongo_client[db][origem].aggregate([
+            {"$out": destino}
+        ])
+        marcar_escrita(mongo_client[db][destino])
 
-# Fecha a conexão com o banco de dados
-mongo_client.close()
+    # Tempo de execução
+    print("Tempo de execução:", time.time() - start)
 
-# Tempo de execução 
-print("Tempo de execução:", time.time() - start)
+if __name__ == "__main__":
+    sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
+    main()
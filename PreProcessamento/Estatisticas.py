@@ -0,0 +1,307 @@
+import math
+import numpy as np
+
+# Acumuladores de estatísticas que podem ser combinados (chunks, arquivos, shards ou processos),
+# para que tudo o que uma análise precisa saia de uma única passada pelos fluxos.
+
+# Valores inteiros abaixo de EXATOS têm uma faixa só para eles (thresholds fixos como 155 bytes ficam exatos);
+# valores não inteiros abaixo de EXATOS ficam em faixas de largura 1
+EXATOS = 1024
+# Acima de EXATOS cada faixa cobre [v, v * GAMMA): erro relativo máximo de ~0,4% no valor
+# (~7 mil faixas até 10^15)
+GAMMA = 1 + 1 / 256
+
+# Contagem, média, M2 (soma dos quadrados dos desvios), mínimo e máximo (Welford / Chan et al.)
+class Momentos:
+    def __init__(self, n=0, media=0.0, m2=0.0, minimo=None, maximo=None):
+        self.n = n
+        self.media = media
+        self.m2 = m2
+        self.minimo = minimo
+        self.maximo = maximo
+
+    # Acrescenta um array de valores (um chunk inteiro de uma vez)
+    def adicionar(self, valores):
+        if len(valores):
+            media = float(valores.mean())
+            self.combinar(Momentos(len(valores), media, float(((valores - media) ** 2).sum()),
+                                   valores.min().item(), valores.max().item()))
+        return self
+
+    def combinar(self, outro):
+        if outro.n == 0:
+            return self
+        n = self.n + outro.n
+        delta = outro.media - self.media
+        self.media += delta * outro.n / n
+        self.m2 += outro.m2 + delta * delta * self.n * outro.n / n
+        self.n = n
+        self.minimo = outro.minimo if self.minimo is None else min(self.minimo, outro.minimo)
+        self.maximo = outro.maximo if self.maximo is None else max(self.maximo, outro.maximo)
+        return self
+
+    # Retira valores que tinham sido combinados (o inverso de combinar). Mínimo e máximo não podem ser
+    # desfeitos e continuam como limites (podem ficar mais largos que os valores restantes).
+    def remover(self, outro):
+        if outro.n == 0:
+            return self
+        n = self.n - outro.n
+        if n <= 0:
+            self.n, self.media, self.m2 = 0, 0.0, 0.0
+            return self
+        media = (self.media * self.n - outro.media * outro.n) / n
+        delta = outro.media - media
+        self.m2 = max(self.m2 - outro.m2 - delta * delta * n * outro.n / self.n, 0.0)
+        self.media = media
+        self.n = n
+        return self
+
+    # Variância e desvio populacionais (mesmo critério do $stdDevPop)
+    @property
+    def variancia(self):
+        return self.m2 / self.n if self.n else None
+
+    @property
+    def desvio(self):
+        return math.sqrt(self.m2 / self.n) if self.n else None
+
+    def para_dict(self):
+        return {"n": self.n, "media": self.media, "m2": self.m2, "minimo": self.minimo, "maximo": self.maximo}
+
+    @classmethod
+    def de_dict(cls, dados):
+        return cls(dados["n"], dados["media"], dados["m2"], dados["minimo"], dados["maximo"])
+
+# Histograma em faixas logarítmicas que guarda, por faixa, a quantidade de fluxos e a soma de outros campos
+# (um sketch no estilo HDR/DDSketch: erro relativo limitado por GAMMA e combinável entre arquivos e shards).
+# Com ele, contagens e médias de qualquer intervalo de valores (por exemplo, "bytes ≥ threshold"),
+# quantis e histogramas com qualquer divisão em faixas (reagrupar) saem sem voltar aos fluxos;
+# só as faixas que cruzam um limite pedido ficam ambíguas.
+class SomasPorFaixa:
+    def __init__(self, campos_soma=(), inteiro=True, exatos=EXATOS, gamma=GAMMA):
+        self.campos_soma = list(campos_soma)
+        self.inteiro = inteiro  # valores inteiros: o maior valor possível de uma faixa é ceil(superior) - 1
+        # Valores não inteiros têm uma faixa só para o zero (como no DDSketch): taxa 0 não se mistura com (0, 1)
+        self.zero = 0 if inteiro else 1
+        self.exatos = exatos
+        self.gamma = gamma
+        self.count = np.zeros(0, dtype=np.int64)
+        self.somas = {campo: np.zeros(0) for campo in self.campos_soma}
+        self.minimo = None
+        self.maximo = None
+
+    def indice(self, valores):
+        valores = np.maximum(np.asarray(valores, dtype=np.float64), 0)
+        logaritmico = self.exatos + np.floor(np.log(np.maximum(valores, self.exatos) / self.exatos) / math.log(self.gamma))
+        indices = np.where(valores < self.exatos, np.floor(valores), logaritmico).astype(np.int64)
+        return np.where(valores > 0, indices + self.zero, 0) if self.zero else indices
+
+    def limite_inferior(self, indices):
+        indices = np.asarray(indices) - self.zero
+        return np.where(indices < self.exatos, np.maximum(indices, 0),
+                        self.exatos * self.gamma ** (indices - self.exatos).astype(np.float64))
+
+    # Menor e maior valor que pode cair em cada faixa
+    def extremos(self, indices):
+        inferior = self.limite_inferior(indices)
+        superior = self.limite_inferior(np.asarray(indices) + 1)
+        if self.inteiro:
+            return np.ceil(inferior), np.ceil(superior) - 1
+        return inferior, np.maximum(inferior, np.nextafter(superior, -np.inf))
+
+    def _crescer(self, tamanho):
+        if tamanho > len(self.count):
+            extra = tamanho - len(self.count)
+            self.count = np.concatenate([self.count, np.zeros(extra, dtype=np.int64)])
+            for campo in self.campos_soma:
+                self.somas[campo] = np.concatenate([self.somas[campo], np.zeros(extra)])
+
+    # valores: array do campo que define a faixa; somas: {campo: array} com os campos somados
+    def adicionar(self, valores, somas):
+        if not len(valores):
+            return self
+        indices = self.indice(valores)
+        tamanho = int(indices.max()) + 1
+        self._crescer(tamanho)
+        self.count[:tamanho] += np.bincount(indices, minlength=tamanho)
+        for campo in self.campos_soma:
+            self.somas[campo][:tamanho] += np.bincount(indices, weights=somas[campo], minlength=tamanho)
+        self._extremos(valores.min().item(), valores.max().item())
+        return self
+
+    # Acrescenta quantidades e somas já agrupadas por faixa (por exemplo, por um $group no MongoDB)
+    def adicionar_faixas(self, indices, contagens, somas, minimo, maximo):
+        indices = np.asarray(indices, dtype=np.int64)
+        if not len(indices):
+            return self
+        self._crescer(int(indices.max()) + 1)
+        np.add.at(self.count, indices, np.asarray(contagens, dtype=np.int64))
+        for campo in self.campos_soma:
+            np.add.at(self.somas[campo], indices, np.asarray(somas[campo], dtype=np.float64))
+        self._extremos(minimo, maximo)
+        return self
+
+    def _extremos(self, minimo, maximo):
+        if minimo is not None:
+            self.minimo = minimo if self.minimo is None else min(self.minimo, minimo)
+            self.maximo = maximo if self.maximo is None else max(self.maximo, maximo)
+
+    def combinar(self, outro):
+        self._crescer(len(outro.count))
+        self.count[:len(outro.count)] += outro.count
+        for campo in self.campos_soma:
+            self.somas[campo][:len(outro.count)] += outro.somas[campo]
+        self._extremos(outro.minimo, outro.maximo)
+        return self
+
+    # Retira fluxos que tinham sido acrescentados (o inverso de combinar). Como em Momentos.remover,
+    # mínimo e máximo continuam como limites.
+    def remover(self, outro):
+        self._crescer(len(outro.count))
+        self.count[:len(outro.count)] -= outro.count
+        for campo in self.campos_soma:
+            self.somas[campo][:len(outro.count)] -= outro.somas[campo]
+        return self
+
+    def __len__(self):
+        return len(self.count)
+
+    # Valor representativo de cada faixa: o ponto médio dos valores possíveis (o próprio valor nas faixas exatas)
+    def representantes(self):
+        menor, maior = self.extremos(np.arange(len(self)))
+        return (menor + maior) / 2
+
+    # Valor no quantil q (0 a 1), com o erro relativo de uma faixa
+    def quantil(self, q):
+        total = int(self.count.sum())
+        if total == 0:
+            return None
+        indice = int(np.searchsorted(np.cumsum(self.count), q * total, side="left"))
+        valor = self.representantes()[min(indice, len(self) - 1)].item()
+        return min(max(valor, self.minimo), self.maximo)
+
+    # Histograma com limites quaisquer. Dentro de cada faixa do sketch os valores são tratados como
+    # distribuídos uniformemente, então a faixa que cruza um limite é dividida proporcionalmente entre as
+    # faixas do histograma.
+    def reagrupar(self, limites):
+        histograma = Histograma(limites, self.campos_soma)
+        ocupadas = np.flatnonzero(self.count)
+        if not len(ocupadas):
+            return histograma
+        inferior, superior = self.limite_inferior(ocupadas), self.limite_inferior(ocupadas + 1)
+        if self.inteiro:
+            # nas faixas exatas o valor é um só (um ponto); nas logarítmicas, os inteiros de [inferior, superior)
+            inferior = np.ceil(inferior)
+            superior = np.where(ocupadas < self.exatos, inferior, np.ceil(superior))
+        teto = self.maximo + 1 if self.inteiro else self.maximo
+        inferior, superior = np.clip(inferior, self.minimo, teto), np.clip(superior, self.minimo, teto)
+
+        # Fração de cada faixa do sketch abaixo de cada limite (faixas de largura 0 são um ponto)
+        limites = histograma.limites[:, None]
+        largura = superior - inferior
+        with np.errstate(divide="ignore", invalid="ignore"):
+            fracao = np.where(largura > 0, np.clip((limites - inferior) / largura, 0, 1), limites > inferior)
+
+        acumulado = np.rint(fracao @ self.count[ocupadas].astype(np.float64)).astype(np.int64)
+        histograma.count = np.diff(acumulado)
+        histograma.fora = int(self.count.sum() - histograma.count.sum())
+        for campo in self.campos_soma:
+            histograma.somas[campo] = np.diff(fracao @ self.somas[campo][ocupadas])
+        return histograma
+
+    # Só as faixas ocupadas são gravadas
+    def para_dict(self):
+        ocupadas = np.flatnonzero(self.count)
+        return {
+            "campos_soma": self.campos_soma, "inteiro": self.inteiro, "exatos": self.exatos, "gamma": self.gamma,
+            "minimo": self.minimo, "maximo": self.maximo, "tamanho": len(self), "indices": ocupadas.tolist(),
+            "count": self.count[ocupadas].tolist(),
+            "somas": {campo: valores[ocupadas].tolist() for campo, valores in self.somas.items()},
+        }
+
+    @classmethod
+    def de_dict(cls, dados):
+        faixas = cls(dados["campos_soma"], dados["inteiro"], dados["exatos"], dados["gamma"])
+        faixas._crescer(dados["tamanho"])
+        faixas.count[dados["indices"]] = dados["count"]
+        for campo, valores in dados["somas"].items():
+            faixas.somas[campo][dados["indices"]] = valores
+        faixas.minimo, faixas.maximo = dados["minimo"], dados["maximo"]
+        return faixas
+
+# Histograma com limites fixos [l0, l1), [l1, l2), ...: quantidade e somas de outros campos por faixa.
+# "fora" conta os valores abaixo do primeiro ou a partir do último limite.
+class Histograma:
+    def __init__(self, limites, campos_soma=()):
+        self.limites = np.asarray(limites, dtype=np.float64)
+        self.campos_soma = list(campos_soma)
+        bins = len(self.limites) - 1
+        self.count = np.zeros(bins, dtype=np.int64)
+        self.somas = {campo: np.zeros(bins) for campo in self.campos_soma}
+        self.fora = 0
+
+    # valores: array do campo do histograma; somas: {campo: array} com os campos somados;
+    # pesos (opcional): quantos fluxos cada valor representa
+    def adicionar(self, valores, somas=None, pesos=None):
+        bins = len(self.count)
+        indices = np.searchsorted(self.limites, valores, side="right") - 1
+        dentro = (indices >= 0) & (indices < bins)
+        if pesos is None:
+            self.fora += int((~dentro).sum())
+            self.count += np.bincount(indices[dentro], minlength=bins)
+        else:
+            self.fora += int(pesos[~dentro].sum())
+            self.count += np.bincount(indices[dentro], weights=pesos[dentro], minlength=bins).astype(np.int64)
+        indices = indices[dentro]
+        for campo in self.campos_soma:
+            self.somas[campo] += np.bincount(indices, weights=somas[campo][dentro], minlength=bins)
+        return self
+
+    def combinar(self, outro):
+        self.count += outro.count
+        for campo in self.campos_soma:
+            self.somas[campo] += outro.somas[campo]
+        self.fora += outro.fora
+        return self
+
+    def para_dict(self):
+        return {
+            "limites": self.limites.tolist(), "count": self.count.tolist(), "fora": self.fora,
+            "somas": {campo: valores.tolist() for campo, valores in self.somas.items()},
+        }
+
+    @classmethod
+    def de_dict(cls, dados):
+        histograma = cls(dados["limites"], dados["somas"])
+        histograma.count = np.array(dados["count"], dtype=np.int64)
+        histograma.somas = {campo: np.array(valores, dtype=np.float64) for campo, valores in dados["somas"].items()}
+        histograma.fora = dados["fora"]
+        return histograma
+
+# Quantidade e somas de um grupo de fluxos (por exemplo, os que têm poucos pacotes)
+class Somas:
+    def __init__(self, campos_soma=()):
+        self.count = 0
+        self.somas = {campo: 0.0 for campo in campos_soma}
+
+    def adicionar(self, n, somas):
+        self.count += n
+        for campo in self.somas:
+            self.somas[campo] += float(somas[campo].sum())
+        return self
+
+    def combinar(self, outro):
+        self.count += outro.count
+        for campo in self.somas:
+            self.somas[campo] += outro.somas[campo]
+        return self
+
+    def para_dict(self):
+        return {"count": self.count, "somas": self.somas}
+
+    @classmethod
+    def de_dict(cls, dados):
+        somas = cls(dados["somas"])
+        somas.count = dados["count"]
+        somas.somas = dict(dados["somas"])
+        return somas
@@ -0,0 +1,225 @@
+import time
+import sys
+import re
+from itertools import compress
+import numpy as np
+from FluxoCompacto import ip_do_documento
+from FluxoFile import UNIDADES
+from CamposDerivados import MATERIALIZAVEIS, adicionar_derivados
+
+# Estrutura da linha (mesma do FluxoFile):
+# <IP1>:<Porta1> <-> <IP2>:<Porta2> <PacotesIP1> <BytesIP1> <sizeIP1> <PacotesIP2> <BytesIP2> <sizeIP2> <PacotesTotal3> <BytesTotal3> <sizeTotal3> <Inicio> <Duracao>
+CAMPOS_POR_LINHA = 14
+
+# Tamanho aproximado (em bytes) de cada bloco lido do arquivo
+TAMANHO_BLOCO = 64 * 1024 * 1024
+
+# ":<porta>" no fim de cada endereço (um endereço por linha)
+RE_PORTA = re.compile(r":(\d+)\n")
+RE_SEPARADOR_PORTA = re.compile(r":\d+\n")
+
+# Ordem das colunas, igual ao FluxoFile.to_dict()
+COLUNAS = [
+    "src", "src_port", "dst", "dst_port",
+    "npackets_src", "nbytes_src", "npackets_dst", "nbytes_dst",
+    "npackets_total", "nbytes_total", "start", "duration",
+]
+COLUNAS_COMPACTAS = ["af"] + COLUNAS
+
+# Separa as linhas em uma lista única de tokens (14 por linha)
+def tokenizar(linhas):
+    if linhas and isinstance(linhas[0], bytes):
+        texto = b"".join(linhas).decode("utf-8")
+    else:
+        texto = "".join(linhas)
+
+    tokens = texto.split()
+    n = len(linhas)
+    if n and len(tokens) == n * CAMPOS_POR_LINHA and tokens[1::CAMPOS_POR_LINHA].count("<->") == n:
+        # Caminho rápido: um único split para o bloco todo
+        return tokens
+
+    # Caminho lento: descarta linhas vazias ou mal formadas
+    tokens = []
+    for linha in texto.splitlines():
+        data = linha.split()
+        if len(data) == CAMPOS_POR_LINHA and data[1] == "<->":
+            tokens.extend(data)
+    return tokens
+
+# Converte uma coluna de tokens em vetor de inteiros (um único parse em C)
+def para_int(valores):
+    if not valores:
+        return np.empty(0, dtype=np.int64)
+    return np.fromstring(" ".join(valores), dtype=np.int64, sep=" ")
+
+# Converte os bytes para o tamanho correto (equivalente vetorizado do FluxoFile.adjust_bytes)
+def ajustar_bytes(valores, unidades):
+    # Troca cada unidade pelo seu multiplicador direto no texto e faz um único parse
+    texto = " ".join(unidades)
+    for nome, multiplicador in UNIDADES.items():
+        texto = texto.replace(nome, str(multiplicador))
+    try:
+        multiplicadores = np.fromstring(texto, dtype=np.int64, sep=" ") if unidades else np.empty(0, dtype=np.int64)
+    except ValueError:
+        # Alguma unidade desconhecida: resolve uma a uma
+        multiplicadores = np.array([UNIDADES.get(unidade, 1) for unidade in unidades], dtype=np.int64)
+    return para_int(valores) * multiplicadores
+
+# Converte o tempo em milissegundos (vírgula decimal, truncado como int(float(...)))
+def tempo_para_milissegundos(tempos):
+    if not tempos:
+        return np.empty(0, dtype=np.int64)
+    segundos = np.fromstring(" ".join(tempos).replace(",", "."), dtype=np.float64, sep=" ")
+    return (segundos * 1000).astype(np.int64)
+
+# Converte uma lista de IPv4 em string para inteiro
+def ips_para_int(ips):
+    if not ips:
+        return np.empty(0, dtype=np.int64)
+    octetos = np.fromstring(".".join(ips), dtype=np.int64, sep=".").reshape(-1, 4)
+    return (octetos[:, 0] << 24) | (octetos[:, 1] << 16) | (octetos[:, 2] << 8) | octetos[:, 3]
+
+# Separa "<ip>:<porta>" em listas de IPs e de portas (a porta é o que vem depois do último ":")
+def separar_enderecos(enderecos):
+    texto = "\n".join(enderecos) + "\n"
+    return RE_SEPARADOR_PORTA.split(texto)[:-1], RE_PORTA.findall(texto)
+
+# Converte um bloco de linhas em colunas NumPy, com os mesmos valores do FluxoFile
+def parse_bloco(linhas, permitir_ipv6=False):
+    tokens = tokenizar(linhas)
+    colunas = [tokens[i::CAMPOS_POR_LINHA] for i in range(CAMPOS_POR_LINHA)]
+
+    src, src_port = separar_enderecos(colunas[0])
+    dst, dst_port = separar_enderecos(colunas[2])
+
+    manter = None
+    if permitir_ipv6:
+        src = np.array(src)
+        dst = np.array(dst)
+    else:
+        # Assim como o FluxoFile, descarta as linhas cujo primeiro endereço é IPv6
+        manter = [endereco.count(":") <= 1 for endereco in colunas[0]]
+        if all(manter):
+            manter = None
+        else:
+            src = list(compress(src, manter))
+            dst = list(compress(dst, manter))
+            manter = np.array(manter)
+        src = ips_para_int(src)
+        dst = ips_para_int(dst)
+
+    resultado = {
+        "src_port": para_int(src_port),
+        "dst_port": para_int(dst_port),
+        "npackets_src": para_int(colunas[3]),
+        "nbytes_src": ajustar_bytes(colunas[4], colunas[5]),
+        "npackets_dst": para_int(colunas[6]),
+        "nbytes_dst": ajustar_bytes(colunas[7], colunas[8]),
+        "npackets_total": para_int(colunas[9]),
+        "nbytes_total": ajustar_bytes(colunas[10], colunas[11]),
+        "start": tempo_para_milissegundos(colunas[12]),
+        "duration": tempo_para_milissegundos(colunas[13]),
+    }
+    if manter is not None:
+        resultado = {coluna: valores[manter] for coluna, valores in resultado.items()}
+    resultado["src"] = src
+    resultado["dst"] = dst
+
+    return {coluna: resultado[coluna] for coluna in COLUNAS}
+
+# Lê as linhas da faixa [inicio, fim) do arquivo em blocos grandes.
+# A faixa deve começar e terminar em início de linha. Devolve (linhas, offset do fim do bloco).
+def ler_linhas(caminho, inicio=0, fim=None, tamanho_bloco=TAMANHO_BLOCO):
+    with open(caminho, "rb") as file:
+        file.seek(inicio)
+        posicao = inicio
+        while fim is None or posicao < fim:
+            linhas = file.readlines(tamanho_bloco)
+            if not linhas:
+                break
+            tamanho_lido = sum(len(linha) for linha in linhas)
+            if fim is not None and posicao + tamanho_lido > fim:
+                # Corta as linhas que já pertencem à próxima faixa
+                excesso = posicao + tamanho_lido - fim
+                while excesso > 0:
+                    excesso -= len(linhas.pop())
+                tamanho_lido = fim - posicao
+            posicao += tamanho_lido
+            yield linhas, posicao
+
+# Lê o arquivo (ou a faixa [inicio, fim)) em blocos grandes e devolve as colunas de cada bloco
+def ler_blocos(caminho, permitir_ipv6=False, tamanho_bloco=TAMANHO_BLOCO, inicio=0, fim=None):
+    for linhas, _ in ler_linhas(caminho, inicio, fim, tamanho_bloco):
+        yield parse_bloco(linhas, permitir_ipv6)
+
+# Lê o arquivo inteiro de uma vez
+def ler_arquivo(caminho, permitir_ipv6=False):
+    blocos = list(ler_blocos(caminho, permitir_ipv6))
+    if not blocos:
+        return parse_bloco([], permitir_ipv6)
+    return {coluna: np.concatenate([b[coluna] for b in blocos]) for coluna in COLUNAS}
+
+# Número de fluxos em um bloco de colunas
+def tamanho(colunas):
+    return len(colunas["start"])
+
+# Converte as colunas em uma lista de dicionários no mesmo formato do FluxoFile.to_dict()
+# (ou no formato compacto do FluxoCompacto, com IPs em bytes e a família em "af").
+# derivados=True acrescenta os campos derivados (CamposDerivados.MATERIALIZAVEIS) no fim de cada documento.
+def colunas_para_dicts(colunas, ip_binario=False, derivados=False):
+    nomes = COLUNAS + list(MATERIALIZAVEIS) if derivados else COLUNAS
+    if derivados:
+        colunas = adicionar_derivados(colunas)
+    valores = [colunas[coluna].tolist() for coluna in nomes]
+    if not ip_binario:
+        return [dict(zip(nomes, linha)) for linha in zip(*valores)]
+
+    src = [ip_do_documento(ip) for ip in valores[0]]
+    valores[0] = [ip for _, ip in src]
+    valores[2] = [ip_do_documento(ip)[1] for ip in valores[2]]
+    familias = [af for af, _ in src]
+    return [dict(zip(["af", *nomes], linha)) for linha in zip(familias, *valores)]
+
+# Compara o parser colunar com o FluxoFile no mesmo arquivo
+def validar(caminho, permitir_ipv6=False):
+    from FluxoFile import FluxoFile
+
+    inicio = time.time()
+    esperado = []
+    with open(caminho, "r") as file:
+        for line in file:
+            try:
+                fluxo = FluxoFile(line, permitir_ipv6=permitir_ipv6)
+            except (IndexError, ValueError):
+                continue  # Linha mal formada, também descartada pelo parser colunar
+            if not permitir_ipv6 and fluxo.ipv6:
+                continue
+            esperado.append(fluxo.to_dict())
+    tempo_fluxofile = time.time() - inicio
+
+    inicio = time.time()
+    obtido = []
+    for colunas in ler_blocos(caminho, permitir_ipv6):
+        obtido.extend(colunas_para_dicts(colunas))
+    tempo_colunar = time.time() - inicio
+
+    print(f"FluxoFile: {len(esperado)} fluxos em {tempo_fluxofile:.2f} s")
+    print(f"Colunar:   {len(obtido)} fluxos em {tempo_colunar:.2f} s")
+
+    if esperado == obtido:
+        print("Resultados idênticos.")
+        return True
+
+    print("Resultados diferentes!")
+    for i, (a, b) in enumerate(zip(esperado, obtido)):
+        if a != b:
+            print(f"Primeira diferença na linha {i}:\n  FluxoFile: {a}\n  Colunar:   {b}")
+            break
+    return False
+
+if __name__ == "__main__":
+    # Uso: python FluxoColunar.py <arquivo.txt> [ipv6]
+    caminho = sys.argv[1]
+    permitir_ipv6 = len(sys.argv) > 2 and sys.argv[2] == "ipv6"
+    sys.exit(0 if validar(caminho, permitir_ipv6) else 1)
@@ -0,0 +1,130 @@
+import socket
+from FluxoFile import UNIDADES
+from CamposDerivados import derivados_documento
+
+# Famílias de endereço (campo "af" dos documentos compactos)
+AF_IPV4 = 4
+AF_IPV6 = 6
+
+_SOCKET_AF = {AF_IPV4: socket.AF_INET, AF_IPV6: socket.AF_INET6}
+
+# Campos numéricos, na mesma ordem e com os mesmos nomes do FluxoFile.to_dict()
+CAMPOS_NUMERICOS = (
+    "npackets_src", "nbytes_src", "npackets_dst", "nbytes_dst",
+    "npackets_total", "nbytes_total", "start", "duration",
+)
+
+# Converte um IP em texto para (família, bytes empacotados): 4 bytes para IPv4, 16 para IPv6
+def empacotar_ip(ip):
+    if ":" in ip:
+        return AF_IPV6, socket.inet_pton(socket.AF_INET6, ip)
+    return AF_IPV4, socket.inet_pton(socket.AF_INET, ip)
+
+# Converte os bytes empacotados de volta para texto (IPv6 sai na forma canônica comprimida)
+def desempacotar_ip(af, dados):
+    return socket.inet_ntop(_SOCKET_AF[af], dados)
+
+# Converte um IP em qualquer formato do esquema antigo (texto ou inteiro IPv4) para bytes empacotados
+def ip_do_documento(valor):
+    if isinstance(valor, int):
+        return AF_IPV4, valor.to_bytes(4, "big")
+    if isinstance(valor, (bytes, bytearray)):
+        return (AF_IPV4 if len(valor) == 4 else AF_IPV6), bytes(valor)
+    return empacotar_ip(valor)
+
+class FluxoCompacto:
+    # Registro de fluxo sem __dict__: endereços como bytes de tamanho fixo e uma flag de família
+    __slots__ = ("af", "src", "src_port", "dst", "dst_port") + CAMPOS_NUMERICOS
+
+    def __init__(self, af, src, src_port, dst, dst_port, npackets_src, nbytes_src, npackets_dst,
+                 nbytes_dst, npackets_total, nbytes_total, start, duration):
+        self.af = af
+        self.src = src
+        self.src_port = src_port
+        self.dst = dst
+        self.dst_port = dst_port
+        self.npackets_src = npackets_src
+        self.nbytes_src = nbytes_src
+        self.npackets_dst = npackets_dst
+        self.nbytes_dst = nbytes_dst
+        self.npackets_total = npackets_total
+        self.nbytes_total = nbytes_total
+        self.start = start
+        self.duration = duration
+
+    # Cria o registro direto de uma linha do large-pcap-analyzer-2 (IPv4 e IPv6)
+    @classmethod
+    def from_linha(cls, line):
+        # 23.36.44.166:443 <-> 163.33.141.15:52079          0 0 bytes      36136 2385012 bytes      36136 2385012 bytes 0,000000  71,916941
+        data = line.split()
+        src, _, src_port = data[0].rpartition(":")
+        dst, _, dst_port = data[2].rpartition(":")
+        af, src = empacotar_ip(src)
+        _, dst = empacotar_ip(dst)
+        return cls(
+            af, src, int(src_port), dst, int(dst_port),
+            int(data[3]), int(data[4]) * UNIDADES.get(data[5], 1),
+            int(data[6]), int(data[7]) * UNIDADES.get(data[8], 1),
+            int(data[9]), int(data[10]) * UNIDADES.get(data[11], 1),
+            int(float(data[12].replace(",", ".")) * 1000),
+            int(float(data[13].replace(",", ".")) * 1000),
+        )
+
+    # Converte um FluxoFile (com ou sem IPv6) para o registro compacto
+    @classmethod
+    def from_fluxo_file(cls, fluxo):
+        af, src = ip_do_documento(fluxo.src)
+        _, dst = ip_do_documento(fluxo.dst)
+        return cls(af, src, fluxo.src_port, dst, fluxo.dst_port,
+                   *(getattr(fluxo, campo) for campo in CAMPOS_NUMERICOS))
+
+    # Aceita tanto o esquema antigo (IP em texto ou inteiro) quanto o compacto (bytes + "af")
+    @classmethod
+    def from_dict(cls, doc):
+        af, src = ip_do_documento(doc["src"])
+        _, dst = ip_do_documento(doc["dst"])
+        return cls(doc.get("af", af), src, doc["src_port"], dst, doc["dst_port"],
+                   *(doc[campo] for campo in CAMPOS_NUMERICOS))
+
+    # 5-tupla do fluxo (sem o protocolo, que não vem no arquivo), usada como chave de hash
+    def chave(self):
+        return (self.af, self.src, self.src_port, self.dst, self.dst_port)
+
+    # Filtro de busca pela 5-tupla na coleção compacta
+    def query(self):
+        return {"src": self.src, "src_port": self.src_port, "dst": self.dst, "dst_port": self.dst_port}
+
+    # Converte para o esquema antigo: IP em texto (permitir_ipv6=True) ou, com ip_inteiro, inteiro para IPv4.
+    # IPv6 sempre sai em texto: 128 bits não cabem no int64 do BSON.
+    # derivados=True acrescenta rate e avg_pkt_size (CamposDerivados.py), aqui e no to_dict_compacto.
+    def to_dict(self, ip_inteiro=False, derivados=False):
+        if ip_inteiro and self.af == AF_IPV4:
+            src = int.from_bytes(self.src, "big")
+            dst = int.from_bytes(self.dst, "big")
+        else:
+            src = desempacotar_ip(self.af, self.src)
+            dst = desempacotar_ip(self.af, self.dst)
+        doc = {"src": src, "src_port": self.src_port, "dst": dst, "dst_port": self.dst_port}
+        for campo in CAMPOS_NUMERICOS:
+            doc[campo] = getattr(self, campo)
+        if derivados:
+            doc.update(derivados_documento(doc))
+        return doc
+
+    # Converte para o documento compacto: IP em bytes (4 ou 16) e a família em "af"
+    def to_dict_compacto(self, derivados=False):
+        doc = {"af": self.af, "src": self.src, "src_port": self.src_port, "dst": self.dst, "dst_port": self.dst_port}
+        for campo in CAMPOS_NUMERICOS:
+            doc[campo] = getattr(self, campo)
+        if derivados:
+            doc.update(derivados_documento(doc))
+        return doc
+
+    def __eq__(self, other):
+        if not isinstance(other, FluxoCompacto):
+            return NotImplemented
+        return all(getattr(self, campo) == getattr(other, campo) for campo in self.__slots__)
+
+    def __str__(self):
+        # Printa cada atributo do objeto em uma linha
+        return "\n".join([f"{campo}: {getattr(self, campo)}" for campo in self.__slots__])
@@ -1,3 +1,15 @@
+from CamposDerivados import derivados_documento
+
+# Multiplicadores das unidades de tamanho (unidades desconhecidas valem 1); usados também pelo
+# FluxoCompacto e pelo FluxoColunar
+UNIDADES = {
+    "bytes": 1,
+    "kB": 1024,
+    "MB": 1024 * 1024,
+    "GB": 1024 * 1024 * 1024,
+    "TB": 1024 * 1024 * 1024 * 1024,
+}
+
 class FluxoFile:
     def __init__(self, line, permitir_ipv6=False):
         # Estrutura da linha:
@@ -36,18 +48,7 @@ class FluxoFile:
         self.nbytes_total = self.adjust_bytes(int(self.nbytes_total), self.size_total)
 
     def adjust_bytes(self, bytes, size):
-        if size == "bytes":
-            return bytes
-        if size == "kB":
-            return bytes * 1024
-        if size == "MB":
-            return bytes * 1024 * 1024
-        if size == "GB":
-            return bytes * 1024 * 1024 * 1024
-        if size == "TB":
-            return bytes * 1024 * 1024 * 1024 * 1024
-        
-        return bytes
+        return bytes * UNIDADES.get(size, 1)
     
     # Converte o tempo em milissegundos
     def time_to_milliseconds(self, time):
@@ -64,9 +65,9 @@ class FluxoFile:
         ip = data[:-len(port) - 1]
         return ip
     
-    # Converte o objeto para um dicionário
-    def to_dict(self):
-        return {
+    # Converte o objeto para um dicionário; derivados=True acrescenta rate e avg_pkt_size (CamposDerivados.py)
+    def to_dict(self, derivados=False):
+        doc = {
             "src": self.src,
             "src_port": self.src_port,
             "dst": self.dst,
@@ -80,6 +81,9 @@ class FluxoFile:
             "start": self.start,
             "duration": self.duration
         }
+        if derivados:
+            doc.update(derivados_documento(doc))
+        return doc
     
     def __str__(self):
         # Printa cada atributo do objeto em uma linha
@@ -0,0 +1,140 @@
+import argparse
+import time
+import sys
+import io
+import pymongo
+import os
+import shutil
+from datetime import datetime
+from IngestaoParalela import ingerir_paralelo, MONGO_URI
+from ManifestoIngestao import limpar
+from ArmazemColunar import EscritorColunar, ingerir_arquivo, DIRETORIO_ARMAZEM
+from CamposDerivados import MATERIALIZAVEIS, criar_indices
+from VersaoColecao import marcar_derivados, marcar_resumos
+from ResumosFluxos import apagar_resumos, compactar
+
+# Valores padrão de cada dataset (os mesmos que estavam fixos nos scripts antigos)
+DATASETS = {
+    "caida": {
+        "arquivos": ["./Datasets/Fluxos/CAIDA/caida01.txt"],
+        "colecao": "caida_collection",
+    },
+    "mawi": {
+        "arquivos": ["E:/mawi2019.txt"],
+        "colecao": "mawi2025_collection",
+    },
+}
+DB_NAME = "fluxos_database"
+LOTE_MB = 16
+
+def log(msg):
+    print(f"[{datetime.now().strftime('%H:%M:%S')}] {msg}", flush=True)
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Insere arquivos de fluxos (.txt do large-pcap-analyzer-2) no MongoDB, com retomada.")
+    parser.add_argument("--dataset", choices=sorted(DATASETS), help="Usa os arquivos e a coleção padrão do dataset")
+    parser.add_argument("--arquivos", nargs="+", help="Arquivos .txt a inserir (na ordem)")
+    parser.add_argument("--colecao", help="Coleção de destino")
+    parser.add_argument("--db", default=DB_NAME, help=f"Base de dados (padrão: {DB_NAME})")
+    parser.add_argument("--uri", default=MONGO_URI, help="URI do MongoDB")
+    parser.add_argument("--workers", type=int, default=1, help="Processos de ingestão por arquivo (padrão: 1)")
+    parser.add_argument("--lote-mb", type=float, default=LOTE_MB, help=f"Tamanho de cada lote em MB de BSON (padrão: {LOTE_MB})")
+    parser.add_argument("--ipv4", action="store_true", help="Descarta fluxos IPv6 e grava os IPs como inteiros")
+    parser.add_argument("--ip-binario", action="store_true", help="Grava os IPs em bytes com a família em \"af\" (FluxoCompacto)")
+    parser.add_argument("--limpar", action="store_true", help="Apaga a coleção e os checkpoints antes de inserir")
+    parser.add_argument("--sem-retomada", action="store_true", help="Não grava checkpoints nem _id determinísticos")
+    parser.add_argument("--derivados", action="store_true",
+                        help="Grava também rate e avg_pkt_size em cada fluxo e cria os índices desses campos")
+    parser.add_argument("--resumos", action="store_true",
+                        help="Mantém os resumos incrementais da coleção (Processamento/Resumos.py) a cada lote")
+    parser.add_argument("--armazem", metavar="DIRETORIO", nargs="?", const=DIRETORIO_ARMAZEM,
+                        help=f"Grava no armazém colunar local DIRETORIO/<coleção> em vez do MongoDB (padrão: {DIRETORIO_ARMAZEM})")
+    args = parser.parse_args(argv)
+
+    padrao = DATASETS.get(args.dataset, {})
+    args.arquivos = args.arquivos or padrao.get("arquivos")
+    args.colecao = args.colecao or padrao.get("colecao")
+    if not args.arquivos or not args.colecao:
+        parser.error("informe --dataset ou então --arquivos e --colecao")
+    return args
+
+# Insere os arquivos no armazém colunar; cada arquivo é confirmado (meta.json) ao terminar
+def main_armazem(args):
+    diretorio = os.path.join(args.armazem, args.colecao)
+    log("Armazém colunar: " + diretorio)
+    if args.limpar and os.path.isdir(diretorio):
+        shutil.rmtree(diretorio)
+        log("Armazém limpo.")
+
+    start_time = time.time()
+    with EscritorColunar(diretorio, derivados=args.derivados) as escritor:
+        for arquivo in args.arquivos:
+            log(f"Arquivo: {arquivo}")
+            inicio = time.time()
+            linhas = ingerir_arquivo(escritor, arquivo, permitir_ipv6=not args.ipv4)
+            tempo = time.time() - inicio
+            log(f"  {linhas} fluxos em {tempo:.2f} s → {linhas / (tempo or 1e-9):,.0f} linhas/s")
+        total = escritor.linhas
+
+    log(f"Tempo de execução: {time.time() - start_time} segundos")
+    log(f"Tamanho do armazém: {total} fluxos")
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.armazem:
+        return main_armazem(args)
+    retomavel = not args.sem_retomada
+
+    with pymongo.MongoClient(args.uri) as mongo_client:
+        db = mongo_client[args.db]
+        collection = db[args.colecao]
+
+        log("Base de dados: " + db.name)
+        log("Coleção: " + collection.name)
+
+        if args.limpar:
+            collection.drop()
+            limpar(db, args.colecao)
+            apagar_resumos(collection)
+            log("Coleção, checkpoints e resumos limpos.")
+        elif not retomavel and collection.estimated_document_count() > 0:
+            log("A coleção já possui dados; os fluxos serão adicionados aos existentes.")
+
+        # Coleção vazia: com --derivados todos os documentos terão os campos derivados
+        if args.derivados and collection.estimated_document_count() == 0:
+            marcar_derivados(collection, MATERIALIZAVEIS)
+        # Coleção vazia: com --resumos os deltas de cada lote cobrem a coleção toda
+        if args.resumos and collection.estimated_document_count() == 0:
+            apagar_resumos(collection)
+            marcar_resumos(collection)
+        elif args.resumos:
+            log("A coleção já possui dados: os resumos só valem se já estavam válidos (senão, Resumos.py construir).")
+
+    start_time = time.time()
+    log("Inserindo os fluxos no banco de dados...")
+
+    for arquivo in args.arquivos:
+        log(f"Arquivo: {arquivo}")
+        ingerir_paralelo(arquivo, args.db, args.colecao, workers=args.workers, uri=args.uri,
+                         permitir_ipv6=not args.ipv4, ip_binario=args.ip_binario,
+                         lote_bytes=int(args.lote_mb * 1024 * 1024), retomavel=retomavel,
+                         derivados=args.derivados, resumos=args.resumos)
+
+    execution_time = time.time() - start_time
+    with pymongo.MongoClient(args.uri) as mongo_client:
+        collection = mongo_client[args.db][args.colecao]
+        if args.derivados:
+            # Índices criados depois da carga (mais rápido que mantê-los durante os inserts)
+            log(f"Índices: {', '.join(criar_indices(collection, MATERIALIZAVEIS))}")
+        if args.resumos:
+            antigos, novos = compactar(collection)
+            log(f"Resumos: {antigos} deltas compactados em {novos} fatias")
+        total = collection.count_documents({})
+
+    log(f"Tempo de execução: {execution_time} segundos")
+    log(f"Tamanho da coleção: {total} documentos")
+
+if __name__ == "__main__":
+    sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
+    main()
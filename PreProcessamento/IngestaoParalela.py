@@ -0,0 +1,124 @@
+import os
+import time
+import multiprocessing
+import pymongo
+from datetime import datetime
+from PipelineIngestao import ingerir_pipeline
+from ManifestoIngestao import preparar_faixas, registrar_lote, marcar_concluida, prefixo_id
+from VersaoColecao import marcar_escrita
+
+# Parâmetros padrão
+MONGO_URI = "mongodb://localhost:27017/"
+WORKERS = max(1, (os.cpu_count() or 1) - 1)
+LOTE_BYTES = 8 * 1024 * 1024  # BSON por insert_many em cada worker (a memória de cada worker é limitada por isso)
+
+def log(msg):
+    print(f"[{datetime.now().strftime('%H:%M:%S')}] {msg}", flush=True)
+
+# Divide o arquivo em faixas de bytes [inicio, fim) alinhadas no início das linhas
+def dividir_arquivo(caminho, partes):
+    tamanho_arquivo = os.path.getsize(caminho)
+    limites = [0]
+    with open(caminho, "rb") as file:
+        for i in range(1, partes):
+            file.seek(tamanho_arquivo * i // partes)
+            file.readline()  # Avança até o fim da linha atual
+            posicao = file.tell()
+            if limites[-1] < posicao < tamanho_arquivo:
+                limites.append(posicao)
+    limites.append(tamanho_arquivo)
+    return list(zip(limites[:-1], limites[1:]))
+
+# Worker: insere uma faixa do arquivo pelo pipeline parser → fila → escrita, na sua própria conexão.
+# Com "id_faixa" grava um checkpoint no manifesto a cada lote confirmado.
+def processar_faixa(tarefa):
+    with pymongo.MongoClient(tarefa["uri"]) as mongo_client:
+        db = mongo_client[tarefa["db"]]
+        collection = db[tarefa["colecao"]]
+
+        ao_confirmar = None
+        if tarefa.get("id_faixa"):
+            ao_confirmar = lambda lote: registrar_lote(db, tarefa["id_faixa"], lote, tarefa["fim"])
+
+        resultado = ingerir_pipeline(
+            collection, tarefa["arquivo"], tarefa["inicio"], tarefa["fim"],
+            permitir_ipv6=tarefa["permitir_ipv6"], ip_binario=tarefa["ip_binario"],
+            lote_bytes=tarefa["lote_bytes"], ao_confirmar=ao_confirmar, prefixo_id=tarefa.get("prefixo_id"),
+            derivados=tarefa.get("derivados", False), resumos=tarefa.get("resumos", False),
+        )
+
+        if tarefa.get("id_faixa"):
+            marcar_concluida(db, tarefa["id_faixa"])
+
+    resultado.update({"worker": tarefa["worker"], "inicio": tarefa["inicio"], "fim": tarefa["fim"]})
+    return resultado
+
+# Insere o arquivo usando vários processos, cada um com uma faixa do arquivo.
+# Com retomavel=True as faixas e o progresso ficam no manifesto e uma nova execução continua de onde parou.
+# Com derivados=True os documentos são gravados com os campos derivados (CamposDerivados.py) e com
+# resumos=True cada lote grava o delta dos resumos incrementais (ResumosFluxos.py).
+def ingerir_paralelo(arquivo, db_name, colecao, workers=WORKERS, uri=MONGO_URI,
+                     permitir_ipv6=True, ip_binario=False, lote_bytes=LOTE_BYTES, retomavel=False,
+                     derivados=False, resumos=False):
+    faixas = [{"inicio": inicio, "fim": fim, "offset": inicio} for inicio, fim in dividir_arquivo(arquivo, workers)]
+    if retomavel:
+        with pymongo.MongoClient(uri) as mongo_client:
+            faixas = preparar_faixas(mongo_client[db_name], colecao, arquivo,
+                                     [(f["inicio"], f["fim"]) for f in faixas])
+        pendentes = [f for f in faixas if not f["concluido"]]
+        if len(pendentes) < len(faixas):
+            log(f"Retomando: {len(faixas) - len(pendentes)} de {len(faixas)} faixas já concluídas")
+        faixas = pendentes
+
+    tarefas = [
+        {
+            "worker": i, "arquivo": arquivo, "inicio": faixa["offset"], "fim": faixa["fim"],
+            "uri": uri, "db": db_name, "colecao": colecao,
+            "permitir_ipv6": permitir_ipv6, "ip_binario": ip_binario, "lote_bytes": lote_bytes,
+            "id_faixa": faixa.get("_id"), "prefixo_id": prefixo_id(colecao, arquivo) if retomavel else None,
+            "derivados": derivados, "resumos": resumos,
+        }
+        for i, faixa in enumerate(faixas)
+    ]
+    if not tarefas:
+        log(f"Nada a inserir: {arquivo} já foi totalmente ingerido")
+        return []
+
+    log(f"Ingestão: {len(tarefas)} worker(s), {os.path.getsize(arquivo) / 1024 ** 2:.1f} MB")
+    inicio = time.time()
+    resultados = []
+    if len(tarefas) == 1:
+        # Um único worker roda no próprio processo
+        resultados.append(processar_faixa(tarefas[0]))
+    else:
+        with multiprocessing.Pool(len(tarefas)) as pool:
+            for resultado in pool.imap_unordered(processar_faixa, tarefas):
+                resultados.append(resultado)
+                log(f"Worker {resultado['worker']} concluído: {resultado['documentos']} documentos")
+    tempo_total = time.time() - inicio
+    with pymongo.MongoClient(uri) as mongo_client:
+        if resumos and not all(r["resumos"] for r in resultados):
+            resumos = False
+            log("Lotes com documentos já existentes: os resumos incrementais ficaram inválidos (Resumos.py construir)")
+        marcar_escrita(mongo_client[db_name][colecao], derivados=derivados, resumos=resumos)
+
+    relatorio(resultados, tempo_total)
+    return resultados
+
+# Mostra as taxas de cada worker e do total
+def relatorio(resultados, tempo_total):
+    log("Resumo por worker:")
+    for r in sorted(resultados, key=lambda r: r["worker"]):
+        tempo = r["tempo"] or 1e-9
+        log(f"  Worker {r['worker']:>2} [{r['inicio']}, {r['fim']}): "
+            f"{r['linhas']} linhas, {r['documentos']} documentos em {r['tempo']:.2f} s "
+            f"→ {r['linhas'] / tempo:,.0f} linhas/s, {r['documentos'] / tempo:,.0f} docs/s")
+
+    linhas = sum(r["linhas"] for r in resultados)
+    documentos = sum(r["documentos"] for r in resultados)
+    tempo_total = tempo_total or 1e-9
+    duplicados = sum(r.get("duplicados", 0) for r in resultados)
+    if duplicados:
+        log(f"Documentos já existentes ignorados (retomada): {duplicados}")
+    log(f"Total: {linhas} linhas, {documentos} documentos em {tempo_total:.2f} s "
+        f"→ {linhas / tempo_total:,.0f} linhas/s, {documentos / tempo_total:,.0f} docs/s")
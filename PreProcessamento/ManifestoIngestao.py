@@ -0,0 +1,53 @@
+import os
+import zlib
+from datetime import datetime
+
+# Coleção (na mesma base dos fluxos) onde ficam os checkpoints da ingestão
+COLECAO_MANIFESTO = "ingestao_manifesto"
+
+# Identificador estável de um arquivo (o caminho pode mudar entre máquinas, o nome não)
+def nome_arquivo(arquivo):
+    return os.path.basename(arquivo)
+
+# Prefixo de 4 bytes dos _id determinísticos de um arquivo em uma coleção
+def prefixo_id(colecao, arquivo):
+    return zlib.crc32(f"{colecao}|{nome_arquivo(arquivo)}".encode()).to_bytes(4, "big")
+
+def id_faixa(colecao, arquivo, inicio):
+    return f"{colecao}|{nome_arquivo(arquivo)}|{inicio}"
+
+# Carrega as faixas já registradas do arquivo ou registra novas.
+# As faixas ficam fixas entre execuções para a retomada usar os mesmos offsets.
+def preparar_faixas(db, colecao, arquivo, faixas_novas):
+    manifesto = db[COLECAO_MANIFESTO]
+    filtro = {"colecao": colecao, "arquivo": nome_arquivo(arquivo)}
+    existentes = sorted(manifesto.find(filtro), key=lambda f: f["inicio"])
+    if existentes:
+        if existentes[-1]["fim"] != os.path.getsize(arquivo):
+            raise ValueError(f"O arquivo {arquivo} mudou de tamanho desde a última ingestão; use --limpar.")
+        return existentes
+
+    faixas = []
+    for inicio, fim in faixas_novas:
+        faixa = dict(filtro, _id=id_faixa(colecao, arquivo, inicio), inicio=inicio, fim=fim,
+                     offset=inicio, linhas=0, documentos=0, concluido=False, atualizado=datetime.now())
+        manifesto.insert_one(faixa)
+        faixas.append(faixa)
+    return faixas
+
+# Checkpoint: grava o offset e as linhas já confirmadas pelo MongoDB
+def registrar_lote(db, id, lote, fim):
+    db[COLECAO_MANIFESTO].update_one(
+        {"_id": id},
+        {
+            "$set": {"offset": lote["offset"], "concluido": lote["offset"] >= fim, "atualizado": datetime.now()},
+            "$inc": {"linhas": lote["linhas"], "documentos": lote["documentos"]},
+        },
+    )
+
+def marcar_concluida(db, id):
+    db[COLECAO_MANIFESTO].update_one({"_id": id}, {"$set": {"concluido": True, "atualizado": datetime.now()}})
+
+# Remove os checkpoints da coleção (usado junto com o drop da coleção)
+def limpar(db, colecao):
+    db[COLECAO_MANIFESTO].delete_many({"colecao": colecao})
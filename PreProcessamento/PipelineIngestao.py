@@ -0,0 +1,140 @@
+import time
+import queue
+import threading
+import bson
+import pymongo
+from bson.objectid import ObjectId
+from bson.raw_bson import RawBSONDocument
+from FluxoColunar import ler_linhas, parse_bloco, colunas_para_dicts
+from ResumosFluxos import DeltaResumos
+
+# Tamanho máximo de cada lote, medido em BSON já codificado (não em número de documentos)
+LOTE_BYTES = 16 * 1024 * 1024
+# Lotes prontos esperando escrita; o parser bloqueia quando a fila enche (backpressure)
+FILA_MAX = 2
+# Texto lido por vez; os lotes sempre terminam no fim de um bloco para o offset ficar exato
+TAMANHO_BLOCO = 4 * 1024 * 1024
+
+# Memória de pico aproximada: (FILA_MAX + 2) lotes (fila, lote sendo escrito e lote sendo montado)
+def memoria_estimada(lote_bytes=LOTE_BYTES, fila_max=FILA_MAX):
+    return (fila_max + 2) * lote_bytes
+
+# _id determinístico: prefixo (4 bytes) + offset do início do bloco (5 bytes) + posição no bloco (3 bytes).
+# Reprocessar o mesmo trecho gera os mesmos _id, então o MongoDB recusa duplicatas.
+def gerar_id(prefixo_id, offset_bloco, indice):
+    return ObjectId(prefixo_id + offset_bloco.to_bytes(5, "big") + indice.to_bytes(3, "big"))
+
+# Estágio do parser: lê a faixa do arquivo e monta lotes de documentos BSON já codificados.
+# Com resumos=True cada lote leva também o delta dos resumos incrementais dos seus fluxos ("resumo").
+def gerar_lotes(caminho, inicio=0, fim=None, permitir_ipv6=True, ip_binario=False,
+                lote_bytes=LOTE_BYTES, tamanho_bloco=TAMANHO_BLOCO, prefixo_id=None, derivados=False,
+                resumos=False):
+    novo_lote = lambda offset: {"documentos": [], "bytes": 0, "linhas": 0, "offset": offset,
+                                "resumo": DeltaResumos() if resumos else None}
+    lote = novo_lote(inicio)
+    offset_bloco = inicio
+    for linhas, offset in ler_linhas(caminho, inicio, fim, tamanho_bloco):
+        colunas = parse_bloco(linhas, permitir_ipv6)
+        if resumos:
+            lote["resumo"].adicionar(colunas)
+        for indice, doc in enumerate(colunas_para_dicts(colunas, ip_binario=ip_binario, derivados=derivados)):
+            if prefixo_id is not None:
+                doc = {"_id": gerar_id(prefixo_id, offset_bloco, indice), **doc}
+            # Codifica uma única vez; o insert_many envia os bytes sem recodificar
+            raw = RawBSONDocument(bson.encode(doc))
+            lote["documentos"].append(raw)
+            lote["bytes"] += len(raw.raw)
+        lote["linhas"] += len(linhas)
+        lote["offset"] = offset
+        offset_bloco = offset
+
+        if lote["bytes"] >= lote_bytes:
+            yield lote
+            lote = novo_lote(offset)
+
+    if lote["linhas"]:
+        yield lote
+
+# Insere o lote sem ordem; duplicatas de _id (lote já gravado antes de uma queda) não são erro
+def inserir_lote(collection, documentos):
+    if not documentos:
+        return 0, 0
+    try:
+        collection.insert_many(documentos, ordered=False)
+        return len(documentos), 0
+    except pymongo.errors.BulkWriteError as e:
+        erros = e.details.get("writeErrors", [])
+        if not erros or any(erro.get("code") != 11000 for erro in erros):
+            raise
+        return len(documentos) - len(erros), len(erros)
+
+# Estágio de escrita: consome a fila e insere cada lote (sem ordem) enquanto o parser monta o próximo.
+# O delta dos resumos só é gravado se o lote entrou inteiro; com duplicatas (retomada) não dá para saber
+# quais fluxos são novos e os resumos ficam inválidos (estado["resumos"] = False).
+def escritor(collection, fila, estado, ao_confirmar):
+    while True:
+        lote = fila.get()
+        if lote is None:
+            return
+        if estado["erro"] is not None:
+            continue  # Só esvazia a fila para o parser não travar
+        try:
+            inseridos, duplicados = inserir_lote(collection, lote["documentos"])
+            estado["documentos"] += inseridos
+            estado["duplicados"] += duplicados
+            if lote["resumo"] is not None:
+                if duplicados:
+                    estado["resumos"] = False
+                elif estado["resumos"]:
+                    lote["resumo"].gravar(collection)
+            estado["bytes"] += lote["bytes"]
+            estado["lotes"] += 1
+            if ao_confirmar:
+                ao_confirmar({
+                    "documentos": inseridos,
+                    "duplicados": duplicados,
+                    "bytes": lote["bytes"],
+                    "linhas": lote["linhas"],
+                    "offset": lote["offset"],
+                })
+        except Exception as e:
+            estado["erro"] = e
+
+# Insere a faixa [inicio, fim) do arquivo com parser e escrita em paralelo, ligados por uma fila limitada.
+# ao_confirmar(lote) é chamado depois que o MongoDB confirma cada lote (na ordem do arquivo).
+# Com prefixo_id os documentos recebem _id determinístico (ver gerar_id) e a ingestão pode ser retomada.
+# Com derivados=True os documentos já saem com rate e avg_pkt_size (CamposDerivados.py) e com resumos=True
+# cada lote grava o seu delta dos resumos incrementais (ResumosFluxos.py).
+def ingerir_pipeline(collection, caminho, inicio=0, fim=None, permitir_ipv6=True, ip_binario=False,
+                     lote_bytes=LOTE_BYTES, fila_max=FILA_MAX, ao_confirmar=None, prefixo_id=None,
+                     derivados=False, resumos=False):
+    inicio_tempo = time.time()
+    fila = queue.Queue(maxsize=fila_max)
+    estado = {"erro": None, "documentos": 0, "duplicados": 0, "bytes": 0, "lotes": 0, "resumos": resumos}
+    thread = threading.Thread(target=escritor, args=(collection, fila, estado, ao_confirmar), daemon=True)
+    thread.start()
+
+    linhas = 0
+    try:
+        for lote in gerar_lotes(caminho, inicio, fim, permitir_ipv6, ip_binario, lote_bytes,
+                                prefixo_id=prefixo_id, derivados=derivados, resumos=resumos):
+            if estado["erro"] is not None:
+                break
+            linhas += lote["linhas"]
+            fila.put(lote)  # Bloqueia enquanto a fila estiver cheia
+    finally:
+        fila.put(None)
+        thread.join()
+
+    if estado["erro"] is not None:
+        raise estado["erro"]
+
+    return {
+        "linhas": linhas,
+        "documentos": estado["documentos"],
+        "duplicados": estado["duplicados"],
+        "bytes": estado["bytes"],
+        "lotes": estado["lotes"],
+        "resumos": estado["resumos"],
+        "tempo": time.time() - inicio_tempo,
+    }
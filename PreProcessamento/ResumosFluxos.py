@@ -0,0 +1,197 @@
+from datetime import datetime, timezone
+import numpy as np
+from Estatisticas import Momentos, SomasPorFaixa, Somas
+from CamposDerivados import MINIMO_PACOTES, MATERIALIZAVEIS, adicionar_derivados
+
+# Resumos incrementais de uma coleção do MongoDB: por fatia de tempo (start // LARGURA_RESUMO), a quantidade
+# de fluxos e, para cada campo de CAMPOS_RESUMO, os momentos e as somas por faixa (Estatisticas.py), separados
+# entre fluxos com pelo menos MINIMO_PACOTES pacotes e os demais. É o que as análises precisam para os
+# thresholds, as proporções (Proporcoes.py) e os histogramas por fatia (Relacoes.py).
+#
+# Cada escrita grava um delta por fatia na coleção COLECAO_RESUMOS:
+#   { colecao: <coleção>, fatia: <n>, largura: LARGURA_RESUMO, acrescentados: <Resumo>, removidos: <Resumo>, criado: <data> }
+# A ingestão grava os fluxos de cada lote em "acrescentados"; a unificação grava os fluxos inseridos e, nos
+# fluxos unidos, retira a duração antiga ("removidos") e acrescenta a nova. O resumo de uma fatia é a soma
+# dos acrescentados menos a dos removidos, então atualizar os resumos custa proporcional aos fluxos novos
+# e as análises (Processamento/Resumos.py) leem os resumos em vez de percorrer a coleção. compactar junta os deltas de cada fatia num só.
+# VersaoColecao registra a versão em que os resumos cobrem a coleção: uma escrita que não grava deltas
+# (CopiaBanco, UnificadorParalelo, uma retomada com duplicatas...) os invalida até o próximo "construir".
+# Mínimo e máximo depois de remoções são limites (podem ser mais largos que os valores restantes).
+
+COLECAO_RESUMOS = "resumos_fluxos"
+LARGURA_RESUMO = 60000  # ms: uma fatia por minuto (um arquivo da CAIDA), a mesma de Histogramas.LARGURA_FATIA
+CAMPOS_RESUMO = ("duration", "nbytes_total", "npackets_total", "rate", "avg_pkt_size")
+CAMPOS_SOMA = ("duration", "nbytes_total", "npackets_total", "rate")
+GRUPOS = ("suficientes", "poucos")  # npackets_total ≥ MINIMO_PACOTES e os demais
+CAMPOS_FLUXO = ("start", "duration", "nbytes_total", "npackets_total")
+
+# Resumo de um conjunto de fluxos (uma fatia, um delta ou a coleção toda)
+class Resumo:
+    def __init__(self):
+        self.n = 0
+        self.momentos = {campo: Momentos() for campo in CAMPOS_RESUMO}
+        self.faixas = {
+            campo: {grupo: SomasPorFaixa(CAMPOS_SOMA, inteiro=campo not in MATERIALIZAVEIS) for grupo in GRUPOS}
+            for campo in CAMPOS_RESUMO
+        }
+
+    # colunas: {campo: array} com os campos de CAMPOS_FLUXO (os derivados são calculados aqui)
+    def adicionar(self, colunas):
+        colunas = adicionar_derivados({campo: np.asarray(colunas[campo]) for campo in CAMPOS_FLUXO})
+        self.n += len(colunas["start"])
+        suficientes = colunas["npackets_total"] >= MINIMO_PACOTES
+        for grupo, selecionados in (("suficientes", suficientes), ("poucos", ~suficientes)):
+            somas = {campo: colunas[campo][selecionados] for campo in CAMPOS_SOMA}
+            for campo in CAMPOS_RESUMO:
+                self.faixas[campo][grupo].adicionar(colunas[campo][selecionados], somas)
+        for campo in CAMPOS_RESUMO:
+            self.momentos[campo].adicionar(colunas[campo])
+        return self
+
+    def combinar(self, outro):
+        self.n += outro.n
+        for campo in CAMPOS_RESUMO:
+            self.momentos[campo].combinar(outro.momentos[campo])
+            for grupo in GRUPOS:
+                self.faixas[campo][grupo].combinar(outro.faixas[campo][grupo])
+        return self
+
+    def remover(self, outro):
+        self.n -= outro.n
+        for campo in CAMPOS_RESUMO:
+            self.momentos[campo].remover(outro.momentos[campo])
+            for grupo in GRUPOS:
+                self.faixas[campo][grupo].remover(outro.faixas[campo][grupo])
+        return self
+
+    # Distribuição de todos os valores do campo (mesmo formato de CacheEstatisticas.nova_distribuicao)
+    def distribuicao(self, campo):
+        distribuicao = SomasPorFaixa(inteiro=campo not in MATERIALIZAVEIS)
+        for grupo in GRUPOS:
+            faixas = self.faixas[campo][grupo]
+            distribuicao._crescer(len(faixas))
+            distribuicao.count[:len(faixas)] += faixas.count
+            distribuicao._extremos(faixas.minimo, faixas.maximo)
+        return distribuicao
+
+    # Somas por faixa do campo com as somas renomeadas: somas = {nome: campo de CAMPOS_SOMA}.
+    # grupo=None junta os dois grupos.
+    def sketch(self, campo, somas, grupo=None):
+        sketch = SomasPorFaixa(somas, inteiro=campo not in MATERIALIZAVEIS)
+        for g in GRUPOS if grupo is None else (grupo,):
+            faixas = self.faixas[campo][g]
+            sketch._crescer(len(faixas))
+            sketch.count[:len(faixas)] += faixas.count
+            for nome, c in somas.items():
+                sketch.somas[nome][:len(faixas)] += faixas.somas[c]
+            sketch._extremos(faixas.minimo, faixas.maximo)
+        return sketch
+
+    # Quantidade e somas dos fluxos de um grupo; somas = {nome: campo de CAMPOS_SOMA}
+    def somas(self, grupo, somas):
+        faixas = self.faixas["npackets_total"][grupo]
+        resultado = Somas(somas)
+        resultado.count = int(faixas.count.sum())
+        resultado.somas = {nome: float(faixas.somas[c].sum()) for nome, c in somas.items()}
+        return resultado
+
+    def para_dict(self):
+        return {
+            "n": self.n,
+            "momentos": {campo: m.para_dict() for campo, m in self.momentos.items()},
+            "faixas": {campo: {grupo: f.para_dict() for grupo, f in grupos.items()} for campo, grupos in self.faixas.items()},
+        }
+
+    @classmethod
+    def de_dict(cls, dados):
+        resumo = cls()
+        resumo.n = dados["n"]
+        resumo.momentos = {campo: Momentos.de_dict(m) for campo, m in dados["momentos"].items()}
+        resumo.faixas = {campo: {grupo: SomasPorFaixa.de_dict(f) for grupo, f in grupos.items()}
+                         for campo, grupos in dados["faixas"].items()}
+        return resumo
+
+# Acrescenta os fluxos de colunas ({campo: array} com CAMPOS_FLUXO) ao resumo da fatia de cada um
+def resumir(colunas, resumos):
+    fatias = np.asarray(colunas["start"]) // LARGURA_RESUMO
+    for fatia in np.unique(fatias).tolist():
+        selecionados = fatias == fatia
+        resumos.setdefault(int(fatia), Resumo()).adicionar(
+            {campo: np.asarray(colunas[campo])[selecionados] for campo in CAMPOS_FLUXO})
+    return resumos
+
+# Delta dos resumos de uma escrita (um lote da ingestão ou um bloco da unificação)
+class DeltaResumos:
+    def __init__(self):
+        self.acrescentados = {}  # {fatia: Resumo} dos blocos de colunas
+        self.inseridos = []  # (start, duration, nbytes, npackets) dos fluxos inseridos um a um
+        self.atualizados = {}  # _id: [start, duração antiga, duração nova, nbytes, npackets]
+
+    # colunas: {campo: array} com os campos de CAMPOS_FLUXO
+    def adicionar(self, colunas):
+        resumir(colunas, self.acrescentados)
+
+    def inserir(self, start, duration, nbytes_total, npackets_total):
+        self.inseridos.append((start, duration, nbytes_total, npackets_total))
+
+    # Fluxo unido: a duração antiga sai e a nova entra. Várias uniões do mesmo documento no bloco
+    # partem da mesma duração gravada e a última é a que fica (como no bulk_write).
+    def atualizar(self, doc_id, start, antiga, nova, nbytes_total, npackets_total):
+        if doc_id in self.atualizados:
+            self.atualizados[doc_id][2] = nova
+        else:
+            self.atualizados[doc_id] = [start, antiga, nova, nbytes_total, npackets_total]
+
+    # ({fatia: Resumo} acrescentados, {fatia: Resumo} removidos)
+    def resumos(self):
+        inseridos = np.array(self.inseridos, dtype=np.float64).reshape(-1, 4)
+        atualizados = np.array([a for a in self.atualizados.values() if a[1] != a[2]], dtype=np.float64).reshape(-1, 5)
+        acrescentados = resumir({campo: inseridos[:, coluna] for coluna, campo in enumerate(CAMPOS_FLUXO)},
+                                dict(self.acrescentados))
+        resumir({campo: atualizados[:, coluna] for campo, coluna in zip(CAMPOS_FLUXO, (0, 2, 3, 4))}, acrescentados)
+        removidos = resumir({campo: atualizados[:, coluna] for campo, coluna in zip(CAMPOS_FLUXO, (0, 1, 3, 4))}, {})
+        return acrescentados, removidos
+
+    def gravar(self, collection):
+        return gravar_resumos(collection, *self.resumos())
+
+# Um documento por fatia com os resumos acrescentados e removidos
+def gravar_resumos(collection, acrescentados, removidos=None):
+    removidos = removidos or {}
+    vazio = Resumo()
+    documentos = [
+        {"colecao": collection.name, "fatia": fatia, "largura": LARGURA_RESUMO,
+         "acrescentados": acrescentados.get(fatia, vazio).para_dict(),
+         "removidos": removidos.get(fatia, vazio).para_dict(),
+         "criado": datetime.now(timezone.utc)}
+        for fatia in sorted(set(acrescentados) | set(removidos))
+    ]
+    if documentos:
+        collection.database[COLECAO_RESUMOS].insert_many(documentos)
+    return len(documentos)
+
+# {fatia: Resumo} com todos os deltas da coleção
+def ler_resumos(collection):
+    resumos = {}
+    removidos = {}
+    for doc in collection.database[COLECAO_RESUMOS].find({"colecao": collection.name, "largura": LARGURA_RESUMO}):
+        resumos.setdefault(doc["fatia"], Resumo()).combinar(Resumo.de_dict(doc["acrescentados"]))
+        removidos.setdefault(doc["fatia"], Resumo()).combinar(Resumo.de_dict(doc["removidos"]))
+    # Remoções só depois de todas as somas: cada fluxo removido já foi acrescentado em algum delta
+    for fatia, resumo in removidos.items():
+        resumos.setdefault(fatia, Resumo()).remover(resumo)
+    return resumos
+
+def apagar_resumos(collection):
+    return collection.database[COLECAO_RESUMOS].delete_many({"colecao": collection.name}).deleted_count
+
+# Junta os deltas de cada fatia num único documento (a leitura fica proporcional ao número de fatias)
+def compactar(collection):
+    resumos_fluxos = collection.database[COLECAO_RESUMOS]
+    filtro = {"colecao": collection.name, "largura": LARGURA_RESUMO}
+    antigos = [doc["_id"] for doc in resumos_fluxos.find(filtro, {"_id": 1})]
+    if not antigos:
+        return 0, 0
+    novos = gravar_resumos(collection, ler_resumos(collection))
+    resumos_fluxos.delete_many({"_id": {"$in": antigos}})
+    return len(antigos), novos
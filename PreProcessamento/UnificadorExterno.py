@@ -0,0 +1,294 @@
+import pymongo
+import numpy as np
+import tempfile
+import time
+import os
+import sys
+import io
+from FluxoColunar import ler_blocos, TAMANHO_BLOCO
+from FluxoCompacto import empacotar_ip, desempacotar_ip, AF_IPV4
+from UnificadorMemoria import EscritorLotes, ARQUIVOS, ARQUIVOS_BRUTOS, DIRETORIO
+from VersaoColecao import marcar_escrita
+from UnificadorFluxos import REAL_OFFSETS, DATA_BASE_NAME, IP_BINARIO, TIMEOUT_LIMIT, log
+
+# Unificação fora da memória: os fluxos de todos os arquivos são gravados em "runs" ordenados
+# por (5-tupla, start absoluto) no disco local e depois intercalados (k-way merge em blocos de
+# registros NumPy) numa passada sequencial que aplica a mesma regra de timeout, vetorizada por bloco.
+# Com runs demais para o orçamento, eles são antes intercalados em grupos (merge em várias passadas).
+# Os fluxos do caida01 não são unificados entre si (ARQUIVOS_BRUTOS, como no UnificadorMemoria).
+# Os IPs são comparados empacotados, então IPv6 escrito de formas diferentes é o mesmo endereço e sai na
+# forma canônica (o UnificadorParalelo guarda o texto original para ficar igual ao UnificadorMemoria).
+
+# Parâmetros
+COLLECTION_NAME = "caida_unificada_collection"
+ORCAMENTO_MB = 1024  # Memória máxima dos registros em cada fase (buffers, cópias ordenadas e índices)
+DIRETORIO_TEMPORARIO = None  # None usa o diretório temporário do sistema
+MINIMO_POR_RUN = 8192  # Menor buffer de leitura por run no merge; abaixo disso o merge é feito em várias passadas
+REGISTROS_POR_GRAVACAO = 65536  # Registros copiados por vez para o arquivo de um run
+REGISTROS_POR_CONVERSAO = 8192  # Registros convertidos em documentos por vez (fora do orçamento, como o lote do escritor)
+
+# Registro de tamanho fixo. A ordem dos campos é a ordem de ordenação, então o registro (no
+# searchsorted do merge) já compara na ordem certa: 5-tupla, start e a posição de leitura (desempate).
+DTYPE_REGISTRO = np.dtype([
+    ("af", "u1"), ("src", "S16"), ("src_port", "u2"), ("dst", "S16"), ("dst_port", "u2"),
+    ("start", "i8"), ("ordem", "i8"), ("duration", "i8"),
+    ("npackets_src", "i8"), ("nbytes_src", "i8"), ("npackets_dst", "i8"), ("nbytes_dst", "i8"),
+    ("npackets_total", "i8"), ("nbytes_total", "i8"),
+])
+CAMPOS_ORDENACAO = ["af", "src", "src_port", "dst", "dst_port", "start", "ordem"]
+CAMPOS_NUMERICOS = [
+    "npackets_src", "nbytes_src", "npackets_dst", "nbytes_dst", "npackets_total", "nbytes_total",
+]
+# Memória por registro: na fase 1, o registro no buffer mais o índice e as chaves temporárias do lexsort;
+# no merge, o registro no buffer do run, no bloco intercalado, na cópia ordenada e os vetores da unificação
+BYTES_POR_REGISTRO_RUN = DTYPE_REGISTRO.itemsize + 32
+BYTES_POR_BYTE_LIDO = 16  # Memória usada ao converter cada byte de texto de um bloco lido em registros
+BYTES_POR_REGISTRO_MERGE = 4 * DTYPE_REGISTRO.itemsize
+
+# Converte as colunas de um bloco (IPs em texto, start já absoluto) em registros de tamanho fixo
+def colunas_para_registros(colunas, ordem_inicial):
+    n = len(colunas["start"])
+    registros = np.empty(n, dtype=DTYPE_REGISTRO)
+    src = [empacotar_ip(ip) for ip in colunas["src"].tolist()]
+    registros["af"] = [af for af, _ in src]
+    registros["src"] = [ip for _, ip in src]
+    registros["dst"] = [empacotar_ip(ip)[1] for ip in colunas["dst"].tolist()]
+    for campo in ("src_port", "dst_port", "start", "duration", *CAMPOS_NUMERICOS):
+        registros[campo] = colunas[campo]
+    registros["ordem"] = np.arange(ordem_inicial, ordem_inicial + n)
+    return registros
+
+# Índices que ordenam os registros (lexsort usa a última chave como principal)
+def indices_ordenados(registros):
+    return np.lexsort([registros[campo] for campo in reversed(CAMPOS_ORDENACAO)])
+
+def ordenar(registros):
+    return registros[indices_ordenados(registros)]
+
+# Grava os registros ordenados num .npy aos poucos, sem uma segunda cópia de todos em memória
+def gravar_ordenado(registros, caminho):
+    indices = indices_ordenados(registros)
+    saida = np.lib.format.open_memmap(caminho, mode="w+", dtype=DTYPE_REGISTRO, shape=(len(registros),))
+    for i in range(0, len(indices), REGISTROS_POR_GRAVACAO):
+        saida[i:i + REGISTROS_POR_GRAVACAO] = registros[indices[i:i + REGISTROS_POR_GRAVACAO]]
+    saida.flush()
+    del saida
+
+# Fase 1: lê os arquivos e grava runs ordenados que cabem em orcamento_mb: 1/4 do orçamento para converter
+# o bloco de texto lido e 3/4 para um buffer fixo de registros (reaproveitado em todos os runs), com o
+# índice e as chaves temporárias da ordenação.
+# Devolve os runs e os intervalos de "ordem" [início, fim) dos registros de ARQUIVOS_BRUTOS.
+def gerar_runs(arquivos, diretorio, diretorio_runs, orcamento_mb=ORCAMENTO_MB):
+    orcamento = int(orcamento_mb * 1024 * 1024)
+    tamanho_bloco = max(64 * 1024, min(TAMANHO_BLOCO, orcamento // (4 * BYTES_POR_BYTE_LIDO)))
+    limite = max(1, orcamento * 3 // (4 * BYTES_POR_REGISTRO_RUN))
+    buffer = np.empty(limite, dtype=DTYPE_REGISTRO)
+    n_buffer = 0
+    runs = []
+    brutos = []
+    ordem = 0
+
+    def gravar_run():
+        caminho = os.path.join(diretorio_runs, f"run_{len(runs):05d}.npy")
+        gravar_ordenado(buffer[:n_buffer], caminho)
+        runs.append(caminho)
+        log(f"Run {len(runs)} gravado: {n_buffer} fluxos")
+
+    for file_name in sorted(arquivos, key=REAL_OFFSETS.get):
+        full_path = os.path.join(diretorio, file_name)
+        if not os.path.isfile(full_path):
+            log(f"Arquivo não encontrado: {full_path}. Pulando...")
+            continue
+        log(f"Lendo {file_name} com offset real de {REAL_OFFSETS[file_name]}ms")
+        inicio_arquivo = ordem
+
+        for colunas in ler_blocos(full_path, permitir_ipv6=True, tamanho_bloco=tamanho_bloco):
+            colunas["start"] += REAL_OFFSETS[file_name]
+            registros = colunas_para_registros(colunas, ordem)
+            ordem += len(registros)
+            while len(registros):
+                k = min(len(registros), limite - n_buffer)
+                buffer[n_buffer:n_buffer + k] = registros[:k]
+                n_buffer += k
+                registros = registros[k:]
+                if n_buffer == limite:
+                    gravar_run()
+                    n_buffer = 0
+        if file_name in ARQUIVOS_BRUTOS:
+            brutos.append((inicio_arquivo, ordem))
+
+    if n_buffer:
+        gravar_run()
+    return runs, brutos
+
+# Intercala runs ordenados em blocos ordenados de registros. Cada run tem um buffer de por_run registros;
+# a cada rodada saem, de todos os buffers, os registros até a menor das últimas chaves dos buffers
+# (nenhum registro ainda não lido vem antes dela), localizados com searchsorted. O buffer que terminou
+# nessa chave se esvazia e é lido de novo.
+def intercalar_blocos(caminhos, por_run):
+    runs = [np.load(caminho, mmap_mode="r") for caminho in caminhos]
+    lidos = [0] * len(runs)
+    buffers = [None] * len(runs)
+
+    def ler(i):
+        buffers[i] = np.array(runs[i][lidos[i]:lidos[i] + por_run])
+        lidos[i] += len(buffers[i])
+
+    for i in range(len(runs)):
+        ler(i)
+    ativos = [i for i in range(len(runs)) if len(buffers[i])]
+    while ativos:
+        limite = ordenar(np.concatenate([buffers[i][-1:] for i in ativos]))[:1]
+        partes = []
+        for i in ativos:
+            k = int(np.searchsorted(buffers[i], limite, side="right")[0])
+            partes.append(buffers[i][:k])
+            buffers[i] = buffers[i][k:]
+        bloco = np.concatenate(partes)
+        del partes
+        for i in ativos:
+            if not len(buffers[i]):
+                ler(i)
+        ativos = [i for i in ativos if len(buffers[i])]
+        yield ordenar(bloco)
+
+# Intercala os runs num único run (uma passada do merge em várias passadas) e apaga os originais
+def intercalar_em_run(caminhos, caminho, por_run):
+    total = sum(len(np.load(c, mmap_mode="r")) for c in caminhos)
+    saida = np.lib.format.open_memmap(caminho, mode="w+", dtype=DTYPE_REGISTRO, shape=(total,))
+    posicao = 0
+    for bloco in intercalar_blocos(caminhos, por_run):
+        saida[posicao:posicao + len(bloco)] = bloco
+        posicao += len(bloco)
+    saida.flush()
+    del saida
+    for c in caminhos:
+        os.remove(c)
+
+# Reduz o número de runs até que cada um tenha um buffer de pelo menos MINIMO_POR_RUN registros no orçamento
+def reduzir_runs(runs, diretorio_runs, orcamento_mb=ORCAMENTO_MB):
+    maximo = max(2, int(orcamento_mb * 1024 * 1024) // (BYTES_POR_REGISTRO_MERGE * MINIMO_POR_RUN))
+    passada = 0
+    while len(runs) > maximo:
+        passada += 1
+        grupos = [runs[i:i + maximo] for i in range(0, len(runs), maximo)]
+        novos = []
+        for g, grupo in enumerate(grupos):
+            caminho = os.path.join(diretorio_runs, f"merge_{passada:02d}_{g:05d}.npy")
+            if len(grupo) == 1:
+                novos.append(grupo[0])
+                continue
+            intercalar_em_run(grupo, caminho, registros_por_run(len(grupo), orcamento_mb))
+            novos.append(caminho)
+        log(f"Passada {passada} do merge: {len(runs)} runs → {len(novos)}")
+        runs = novos
+    return runs
+
+def registros_por_run(n_runs, orcamento_mb=ORCAMENTO_MB):
+    return max(1, int(orcamento_mb * 1024 * 1024) // (BYTES_POR_REGISTRO_MERGE * max(1, n_runs)))
+
+# Converte um registro de volta para o documento (IP em texto, ou em bytes com IP_BINARIO)
+def registro_para_documento(registro):
+    af, src, src_port, dst, dst_port, start, _, duration, *numericos = registro
+    tamanho_ip = 4 if af == AF_IPV4 else 16
+    # O NumPy remove os zeros do fim de campos "S", então o IP é completado de volta
+    src = src.ljust(tamanho_ip, b"\0")
+    dst = dst.ljust(tamanho_ip, b"\0")
+    if IP_BINARIO:
+        doc = {"af": af, "src": src, "src_port": src_port, "dst": dst, "dst_port": dst_port}
+    else:
+        doc = {"src": desempacotar_ip(af, src), "src_port": src_port,
+               "dst": desempacotar_ip(af, dst), "dst_port": dst_port}
+    doc.update(zip(CAMPOS_NUMERICOS, numericos))
+    doc["start"] = start
+    doc["duration"] = duration
+    return doc
+
+# Aplica a regra de timeout a um bloco ordenado. "aberto" é o último documento do bloco anterior (1 registro,
+# duração já estendida), que ainda pode ser estendido. Em cada 5-tupla, ordenada por start, um registro começa
+# um documento novo quando começa mais de TIMEOUT_LIMIT depois do maior fim anterior da 5-tupla (a duração
+# unificada vai até esse maior fim); um registro bruto sempre começa um documento novo.
+# Devolve os documentos encerrados (registros), o novo aberto e as contagens de inseridos e atualizados.
+def unificar_bloco(bloco, aberto, brutos):
+    if aberto is not None:
+        bloco = np.concatenate([aberto, bloco])
+    start = bloco["start"]
+    fim = start + bloco["duration"]
+    novo = np.ones(len(bloco), dtype=bool)
+    for campo in CAMPOS_ORDENACAO[:5]:
+        novo[1:] &= bloco[campo][1:] == bloco[campo][:-1]
+    novo[1:] = ~novo[1:]
+    for inicio, final in brutos:
+        novo |= (bloco["ordem"] >= inicio) & (bloco["ordem"] < final)
+
+    # Maior fim até cada registro dentro do grupo (5-tupla, a partir do último bruto): máximo acumulado
+    # das posições dos fins ordenados por (grupo, fim), que não se misturam entre grupos
+    grupo = np.cumsum(novo)
+    por_fim = np.lexsort((fim, grupo))
+    posicao = np.empty(len(bloco), dtype=np.int64)
+    posicao[por_fim] = np.arange(len(bloco))
+    maior_fim = fim[por_fim][np.maximum.accumulate(posicao)]
+    novo[1:] |= start[1:] - maior_fim[:-1] > TIMEOUT_LIMIT
+
+    inicios = np.flatnonzero(novo)
+    documentos = bloco[inicios]
+    documentos["duration"] = np.maximum.reduceat(fim, inicios) - documentos["start"]
+    inseridos = len(inicios) - (aberto is not None)
+    return documentos[:-1], documentos[-1:], inseridos, len(bloco) - len(inicios)
+
+# Fase 2: intercala os runs em blocos e aplica a regra de timeout em cada 5-tupla, em ordem de start
+def intercalar(runs, escritor, brutos=(), orcamento_mb=ORCAMENTO_MB):
+    inseridos = 0
+    atualizados = 0
+    aberto = None
+
+    for bloco in intercalar_blocos(runs, registros_por_run(len(runs), orcamento_mb)):
+        encerrados, aberto, novos, estendidos = unificar_bloco(bloco, aberto, brutos)
+        del bloco
+        for i in range(0, len(encerrados), REGISTROS_POR_CONVERSAO):
+            escritor.adicionar([registro_para_documento(r) for r in encerrados[i:i + REGISTROS_POR_CONVERSAO].tolist()])
+        inseridos += novos
+        atualizados += estendidos
+
+    if aberto is not None:
+        escritor.adicionar([registro_para_documento(registro) for registro in aberto.tolist()])
+    escritor.gravar()
+    return inseridos, atualizados
+
+def unificar(collection, arquivos=ARQUIVOS, diretorio=DIRETORIO, orcamento_mb=ORCAMENTO_MB,
+             diretorio_temporario=DIRETORIO_TEMPORARIO):
+    with tempfile.TemporaryDirectory(prefix="runs_", dir=diretorio_temporario) as diretorio_runs:
+        start_time = time.time()
+        runs, brutos = gerar_runs(arquivos, diretorio, diretorio_runs, orcamento_mb)
+        log(f"{len(runs)} runs gerados em {time.time() - start_time:.2f} s")
+        runs = reduzir_runs(runs, diretorio_runs, orcamento_mb)
+
+        start_time = time.time()
+        escritor = EscritorLotes(collection)
+        inseridos, atualizados = intercalar(runs, escritor, brutos, orcamento_mb)
+        marcar_escrita(collection)
+        log(f"Merge concluído em {time.time() - start_time:.2f} s")
+
+    log(f"→ Fluxos inseridos: {inseridos}")
+    log(f"→ Fluxos atualizados: {atualizados}")
+    return inseridos, atualizados
+
+def main():
+    with pymongo.MongoClient("mongodb://localhost:27017/") as mongo_client:
+        db = mongo_client[DATA_BASE_NAME]
+        collection = db[COLLECTION_NAME]
+        if collection.estimated_document_count() > 0:
+            log(f"A coleção {collection.name} já possui dados; ela será substituída.")
+            collection.drop()
+
+        log(f"Conectado à base: {db.name}, coleção: {collection.name}")
+        log(f"Orçamento de memória: {ORCAMENTO_MB} MB")
+        start_time = time.time()
+        unificar(collection)
+        log(f"Tempo total: {time.time() - start_time:.2f} s")
+
+    log("Unificação de fluxos concluída.")
+
+if __name__ == "__main__":
+    sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
+    main()
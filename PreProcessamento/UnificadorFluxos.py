@@ -5,8 +5,11 @@ import subprocess
 import sys
 import io
 from FluxoFile import FluxoFile
+from FluxoCompacto import FluxoCompacto
+from VersaoColecao import marcar_escrita
+from CamposDerivados import ATUALIZACAO_DERIVADOS
+from ResumosFluxos import DeltaResumos, compactar
 from datetime import datetime
-sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
 
 # Lista de arquivos a serem processados (caida01 já está no banco)
 FILES_FLUXOS = [
@@ -50,7 +53,11 @@ REAL_OFFSETS = {
 DATA_BASE_NAME = "fluxos_database"
 COLLECTION_NAME = "caida_collection"
 TIMEOUT_LIMIT = 20 * 1000  # 20s em milissegundos
-BATCH_SIZE = 500000
+BATCH_SIZE = 500000  # Fluxos por bloco: as buscas do bloco são feitas juntas e as operações enviadas juntas
+CHAVES_POR_CONSULTA = 1000  # 5-tuplas resolvidas em cada agregação
+IP_BINARIO = False  # True se a coleção guarda os IPs em bytes (FluxoCompacto)
+DERIVADOS = False  # True para gravar rate e avg_pkt_size nos fluxos inseridos e atualizados (CamposDerivados.py)
+RESUMOS = False  # True para manter os resumos incrementais (ResumosFluxos.py) a cada bloco
 
 # Log formatado
 def log(message):
@@ -58,8 +65,11 @@ def log(message):
 
 # Atualiza ou insere um novo fluxo
 def atualizar_ou_inserir_fluxo(flow, result, offset):
-    flow_start_abs = offset + flow.start
-    flow_end_abs = flow_start_abs + flow.duration
+    return decidir_unificacao(offset + flow.start, flow.duration, result)
+
+# Mesma regra, a partir do início absoluto e da duração do novo fluxo
+def decidir_unificacao(flow_start_abs, flow_duration, result):
+    flow_end_abs = flow_start_abs + flow_duration
     final = result['start'] + result['duration']
     time_to_end = flow_start_abs - final
 
@@ -70,87 +80,152 @@ def atualizar_ou_inserir_fluxo(flow, result, offset):
         new_duration = novo_fim - result['start']
         return "update", new_duration
 
-# Conecta ao MongoDB
-with pymongo.MongoClient("mongodb://localhost:27017/") as mongo_client:
-    db = mongo_client[DATA_BASE_NAME]
-    collection = db[COLLECTION_NAME]
-
-    # Índices
-    collection.create_index([
-        ("src", pymongo.ASCENDING),
-        ("src_port", pymongo.ASCENDING),
-        ("dst", pymongo.ASCENDING),
-        ("dst_port", pymongo.ASCENDING),
-        ("start", pymongo.DESCENDING),
-    ])
-
-    log(f"Conectado à base: {db.name}, coleção: {collection.name}")
-
-    for file_name in FILES_FLUXOS:
-        full_path = f"./Datasets/Fluxos/CAIDA/{file_name}"
-        if not os.path.isfile(full_path):
-            log(f"Arquivo não encontrado: {full_path}. Pulando...")
-            continue
-
-        actual_offset = REAL_OFFSETS[file_name]
-        log(f'--' * 30)
-        log(f"Processando {file_name} com offset real de {actual_offset}ms")
-        start_time = time.time()
-
-        total_inserted = 0
-        total_updated = 0
-        bulk_operations = []
-
-        with open(full_path, "r") as file:
-            for line in file:
-                try:
-                    flow = FluxoFile(line, True)
-                except Exception as e:
-                    log(f"Erro ao processar linha: {e}")
-                    continue
-
-                query = {
-                    "src": flow.src,
-                    "src_port": flow.src_port,
-                    "dst": flow.dst,
-                    "dst_port": flow.dst_port,
-                }
-
-                result = collection.find_one(query, sort=[("start", pymongo.DESCENDING)])
-
-                if result:
-                    action, new_duration = atualizar_ou_inserir_fluxo(flow, result, actual_offset)
-                    if action == "update":
-                        total_updated += 1
-                        bulk_operations.append(
-                            pymongo.UpdateOne(
-                                {"_id": result["_id"]},
-                                {"$set": {"duration": new_duration}}
-                            )
-                        )
-                    else:
-                        total_inserted += 1
-                        flow.start += actual_offset
-                        bulk_operations.append(pymongo.InsertOne(flow.to_dict()))
-                else:
-                    total_inserted += 1
-                    flow.start += actual_offset
-                    bulk_operations.append(pymongo.InsertOne(flow.to_dict()))
-
-                if len(bulk_operations) % 50000 == 0:
-                    log(f"{len(bulk_operations)} operações acumuladas, enviando ao MongoDB...")
-
-                if len(bulk_operations) >= BATCH_SIZE:
-                    collection.bulk_write(bulk_operations)
-                    bulk_operations = []
-                    log(f"{BATCH_SIZE} operações enviadas ao MongoDB")
-
-            if bulk_operations:
-                collection.bulk_write(bulk_operations)
-
-        duration = time.time() - start_time
-        log(f"Arquivo {file_name} processado em {duration:.2f} s")
-        log(f"→ Fluxos inseridos: {total_inserted}")
-        log(f"→ Fluxos atualizados: {total_updated}")
-
-log("Unificação de fluxos concluída.")
+# 5-tupla do fluxo usada na busca (mesmos campos da query)
+def chave_do_fluxo(flow):
+    return (flow.src, flow.src_port, flow.dst, flow.dst_port)
+
+# Busca, para cada 5-tupla, o fluxo mais recente (maior start) já gravado na coleção.
+# Substitui um find_one por linha por uma agregação a cada CHAVES_POR_CONSULTA chaves.
+def buscar_mais_recentes(collection, chaves):
+    chaves = list(chaves)
+    recentes = {}
+    for i in range(0, len(chaves), CHAVES_POR_CONSULTA):
+        parte = chaves[i:i + CHAVES_POR_CONSULTA]
+        pipeline = [
+            {"$match": {"$or": [
+                {"src": src, "src_port": src_port, "dst": dst, "dst_port": dst_port}
+                for src, src_port, dst, dst_port in parte
+            ]}},
+            {"$sort": {"start": pymongo.DESCENDING}},
+            {"$group": {
+                "_id": {"src": "$src", "src_port": "$src_port", "dst": "$dst", "dst_port": "$dst_port"},
+                "doc_id": {"$first": "$_id"},
+                "start": {"$first": "$start"},
+                "duration": {"$first": "$duration"},
+                "nbytes_total": {"$first": "$nbytes_total"},
+                "npackets_total": {"$first": "$npackets_total"},
+            }},
+        ]
+        for r in collection.aggregate(pipeline, allowDiskUse=True):
+            chave = (r["_id"]["src"], r["_id"]["src_port"], r["_id"]["dst"], r["_id"]["dst_port"])
+            recentes[chave] = {"_id": r["doc_id"], "start": r["start"], "duration": r["duration"],
+                               "nbytes_total": r["nbytes_total"], "npackets_total": r["npackets_total"]}
+    return recentes
+
+# Decide inserir ou atualizar cada fluxo do bloco a partir dos fluxos mais recentes já buscados.
+# Todas as buscas do bloco veem a coleção antes das escritas do bloco, como acontecia com o
+# find_one por linha (as operações só eram enviadas a cada BATCH_SIZE).
+# Com "delta" (ResumosFluxos.DeltaResumos) registra também a mudança de cada fluxo para os resumos incrementais.
+def decidir_bloco(fluxos, recentes, offset, delta=None):
+    operacoes = []
+    inseridos = 0
+    atualizados = 0
+    for flow in fluxos:
+        result = recentes.get(chave_do_fluxo(flow))
+
+        if result:
+            action, new_duration = atualizar_ou_inserir_fluxo(flow, result, offset)
+            if action == "update":
+                atualizados += 1
+                atualizacao = {"$set": {"duration": new_duration}}
+                if DERIVADOS:
+                    # A taxa é recalculada no servidor com a nova duração (update com pipeline)
+                    atualizacao = [atualizacao, *ATUALIZACAO_DERIVADOS]
+                operacoes.append(pymongo.UpdateOne({"_id": result["_id"]}, atualizacao))
+                if delta is not None:
+                    delta.atualizar(result["_id"], result["start"], result["duration"], new_duration,
+                                    result["nbytes_total"], result["npackets_total"])
+                continue
+
+        inseridos += 1
+        flow.start += offset
+        doc = flow.to_dict_compacto(derivados=DERIVADOS) if IP_BINARIO else flow.to_dict(derivados=DERIVADOS)
+        operacoes.append(pymongo.InsertOne(doc))
+        if delta is not None:
+            delta.inserir(flow.start, flow.duration, flow.nbytes_total, flow.npackets_total)
+
+    return operacoes, inseridos, atualizados
+
+# Resolve o bloco com buscas agrupadas e envia todas as operações de uma vez
+def processar_bloco(collection, fluxos, offset):
+    recentes = buscar_mais_recentes(collection, {chave_do_fluxo(flow) for flow in fluxos})
+    delta = DeltaResumos() if RESUMOS else None
+    operacoes, inseridos, atualizados = decidir_bloco(fluxos, recentes, offset, delta)
+    if operacoes:
+        collection.bulk_write(operacoes)
+    if delta is not None:
+        delta.gravar(collection)
+    log(f"{len(operacoes)} operações enviadas ao MongoDB ({len(recentes)} 5-tuplas já existentes)")
+    return inseridos, atualizados
+
+# Unifica um arquivo com a coleção, um bloco de BATCH_SIZE fluxos por vez
+def processar_arquivo(collection, full_path, offset):
+    total_inserted = 0
+    total_updated = 0
+    bloco = []
+
+    with open(full_path, "r") as file:
+        for line in file:
+            try:
+                flow = FluxoCompacto.from_linha(line) if IP_BINARIO else FluxoFile(line, True)
+            except Exception as e:
+                log(f"Erro ao processar linha: {e}")
+                continue
+
+            bloco.append(flow)
+            if len(bloco) >= BATCH_SIZE:
+                inseridos, atualizados = processar_bloco(collection, bloco, offset)
+                total_inserted += inseridos
+                total_updated += atualizados
+                bloco = []
+
+        if bloco:
+            inseridos, atualizados = processar_bloco(collection, bloco, offset)
+            total_inserted += inseridos
+            total_updated += atualizados
+
+    return total_inserted, total_updated
+
+def main():
+    # Conecta ao MongoDB
+    with pymongo.MongoClient("mongodb://localhost:27017/") as mongo_client:
+        db = mongo_client[DATA_BASE_NAME]
+        collection = db[COLLECTION_NAME]
+
+        # Índices
+        collection.create_index([
+            ("src", pymongo.ASCENDING),
+            ("src_port", pymongo.ASCENDING),
+            ("dst", pymongo.ASCENDING),
+            ("dst_port", pymongo.ASCENDING),
+            ("start", pymongo.DESCENDING),
+        ])
+
+        log(f"Conectado à base: {db.name}, coleção: {collection.name}")
+
+        for file_name in FILES_FLUXOS:
+            full_path = f"./Datasets/Fluxos/CAIDA/{file_name}"
+            if not os.path.isfile(full_path):
+                log(f"Arquivo não encontrado: {full_path}. Pulando...")
+                continue
+
+            actual_offset = REAL_OFFSETS[file_name]
+            log(f'--' * 30)
+            log(f"Processando {file_name} com offset real de {actual_offset}ms")
+            start_time = time.time()
+
+            total_inserted, total_updated = processar_arquivo(collection, full_path, actual_offset)
+            marcar_escrita(collection, derivados=DERIVADOS, resumos=RESUMOS)
+            if RESUMOS:
+                compactar(collection)
+
+            duration = time.time() - start_time
+            log(f"Arquivo {file_name} processado em {duration:.2f} s")
+            log(f"→ Fluxos inseridos: {total_inserted}")
+            log(f"→ Fluxos atualizados: {total_updated}")
+
+    log("Unificação de fluxos concluída.")
+
+if __name__ == "__main__":
+    sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
+    main()
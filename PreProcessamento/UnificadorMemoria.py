@@ -0,0 +1,187 @@
+import pymongo
+import time
+import os
+import sys
+import io
+from FluxoColunar import ler_blocos, colunas_para_dicts
+from VersaoColecao import marcar_escrita
+from UnificadorFluxos import (
+    PCAP_TIMESTAMPS, REAL_OFFSETS, TIMEOUT_LIMIT, DATA_BASE_NAME, IP_BINARIO,
+    decidir_unificacao, log,
+)
+
+# Unificação em memória: os fluxos ativos ficam numa tabela hash por 5-tupla e só os fluxos
+# encerrados (sem atividade há mais que TIMEOUT_LIMIT) são gravados, sempre com inserções em lote.
+# A cada INTERVALO_EXPIRACAO fluxos lidos saem da tabela os que nenhum fluxo seguinte consegue estender, também
+# no meio de um arquivo: com os arquivos ordenados por start, a tabela guarda os fluxos ativos nos últimos
+# TIMEOUT_LIMIT ms mais os lidos desde a última expiração, não o arquivo inteiro. Fluxos que começam mais de
+# DESORDEM_MS antes do maior start já lido podem não encontrar o fluxo que deveriam estender; eles são
+# contados (atrasados) e avisados no fim: aumente DESORDEM_MS para arquivos fora de ordem.
+# Os fluxos do caida01 entram como o InsertCaidaMongo.py os grava, sem unificar entre si (ARQUIVOS_BRUTOS).
+# Diferença para o UnificadorFluxos.py: lá as buscas de um bloco de BATCH_SIZE fluxos veem a coleção antes das
+# escritas do bloco, então linhas da mesma 5-tupla no mesmo bloco de um caidaNN viram documentos separados;
+# aqui cada linha vê as anteriores (o resultado é o do UnificadorFluxos com BATCH_SIZE = 1). Por isso a coleção
+# pode ter menos documentos: nos 20.000 primeiros fluxos do caida01 ao caida04 são 64.508 documentos
+# (15.492 atualizações) contra 79.998 do UnificadorFluxos. Sem 5-tuplas repetidas num bloco, são iguais.
+
+# Parâmetros
+DIRETORIO = "./Datasets/Fluxos/CAIDA"
+ARQUIVOS = list(PCAP_TIMESTAMPS)  # Todos os arquivos, inclusive o caida01 (processados em ordem de offset)
+ARQUIVOS_BRUTOS = {"caida01.txt"}  # Gravados sem unificar os próprios fluxos (os arquivos seguintes ainda os estendem)
+COLLECTION_NAME = "caida_unificada_collection"
+LOTE_INSERCAO = 100000  # Fluxos encerrados por insert_many
+INTERVALO_EXPIRACAO = 50000  # Fluxos lidos entre duas expirações dentro de um arquivo
+DESORDEM_MS = 0  # Quanto um fluxo pode começar antes do maior start já lido do arquivo (0: ordenado por start)
+
+def chave_do_documento(doc):
+    return (doc["src"], doc["src_port"], doc["dst"], doc["dst_port"])
+
+class TabelaFluxosAtivos:
+    # Fluxos ativos por 5-tupla; cada entrada é o documento (com start absoluto) que será gravado
+
+    def __init__(self):
+        self.ativos = {}
+        self.inseridos = 0
+        self.atualizados = 0
+        self.marca_dagua = float("-inf")  # Maior marca d'água já expirada
+        self.atrasados = 0  # Fluxos que começaram antes dela (a unificação deles pode ter perdido um fluxo expirado)
+
+    # Aplica a regra de unificação ao novo fluxo (start já absoluto).
+    # Devolve o fluxo anterior da mesma 5-tupla quando ele se encerra, ou None.
+    # Com unificar=False (arquivo bruto) o fluxo sempre vira um documento; fica ativo o de maior start,
+    # que é o que o UnificadorFluxos encontra ao buscar o fluxo mais recente da 5-tupla.
+    def processar(self, doc, unificar=True):
+        if doc["start"] < self.marca_dagua:
+            self.atrasados += 1
+        chave = chave_do_documento(doc)
+        atual = self.ativos.get(chave)
+        if atual is not None and not unificar and doc["start"] < atual["start"]:
+            self.inseridos += 1
+            return doc
+        if atual is not None and unificar:
+            action, new_duration = decidir_unificacao(doc["start"], doc["duration"], atual)
+            if action == "update":
+                atual["duration"] = new_duration
+                self.atualizados += 1
+                return None
+
+        # Um fluxo novo só é inserido depois do fim do anterior + timeout, então ele passa a ser o mais recente
+        self.ativos[chave] = doc
+        self.inseridos += 1
+        return atual
+
+    # Remove e devolve os fluxos que nenhum fluxo com início >= marca_dagua consegue mais estender
+    def expirar(self, marca_dagua):
+        self.marca_dagua = max(self.marca_dagua, marca_dagua)
+        expirados = [
+            chave for chave, doc in self.ativos.items()
+            if marca_dagua - (doc["start"] + doc["duration"]) > TIMEOUT_LIMIT
+        ]
+        return [self.ativos.pop(chave) for chave in expirados]
+
+    # Remove e devolve todos os fluxos (fim da entrada)
+    def esvaziar(self):
+        docs = list(self.ativos.values())
+        self.ativos.clear()
+        return docs
+
+    def __len__(self):
+        return len(self.ativos)
+
+# Acumula os fluxos encerrados e grava em lotes (somente inserções)
+class EscritorLotes:
+    def __init__(self, collection, lote=LOTE_INSERCAO):
+        self.collection = collection
+        self.lote = lote
+        self.pendentes = []
+        self.gravados = 0
+
+    def adicionar(self, docs):
+        self.pendentes.extend(docs)
+        if len(self.pendentes) >= self.lote:
+            self.gravar()
+
+    def gravar(self):
+        if self.pendentes:
+            self.collection.insert_many(self.pendentes, ordered=False)
+            self.gravados += len(self.pendentes)
+            self.pendentes = []
+
+# Lê os arquivos em ordem de tempo e devolve os fluxos já com o start absoluto
+def ler_fluxos_arquivo(caminho, offset):
+    for colunas in ler_blocos(caminho, permitir_ipv6=True):
+        colunas["start"] += offset
+        yield from colunas_para_dicts(colunas, ip_binario=IP_BINARIO)
+
+# Aplica os fluxos de um arquivo à tabela e grava os encerrados. A cada INTERVALO_EXPIRACAO fluxos expira
+# os que nenhum fluxo seguinte estende: os do arquivo começam depois do maior start lido - DESORDEM_MS e os
+# dos próximos arquivos depois de "limite" (menor offset restante; None no último arquivo).
+def processar_arquivo(tabela, escritor, docs, unificar=True, limite=None):
+    maior_start = float("-inf")
+    for n, doc in enumerate(docs, 1):
+        encerrado = tabela.processar(doc, unificar)
+        if encerrado is not None:
+            escritor.adicionar([encerrado])
+        maior_start = max(maior_start, doc["start"])
+        if n % INTERVALO_EXPIRACAO == 0:
+            marca_dagua = maior_start - DESORDEM_MS
+            escritor.adicionar(tabela.expirar(marca_dagua if limite is None else min(marca_dagua, limite)))
+    if limite is not None:
+        escritor.adicionar(tabela.expirar(limite))
+
+# Unifica os arquivos; a memória acompanha o número de fluxos ativos, não o tamanho do dataset
+def unificar(collection, arquivos=ARQUIVOS, diretorio=DIRETORIO):
+    arquivos = sorted(arquivos, key=REAL_OFFSETS.get)
+    tabela = TabelaFluxosAtivos()
+    escritor = EscritorLotes(collection)
+
+    for i, file_name in enumerate(arquivos):
+        full_path = os.path.join(diretorio, file_name)
+        if not os.path.isfile(full_path):
+            log(f"Arquivo não encontrado: {full_path}. Pulando...")
+            continue
+
+        actual_offset = REAL_OFFSETS[file_name]
+        log(f'--' * 30)
+        log(f"Processando {file_name} com offset real de {actual_offset}ms")
+        start_time = time.time()
+
+        # Todo fluxo dos próximos arquivos começa depois do menor offset restante
+        proximos = [REAL_OFFSETS[a] for a in arquivos[i + 1:]]
+        gravados = escritor.gravados + len(escritor.pendentes)
+        processar_arquivo(tabela, escritor, ler_fluxos_arquivo(full_path, actual_offset),
+                          file_name not in ARQUIVOS_BRUTOS, min(proximos) if proximos else None)
+        log(f"→ Fluxos encerrados: {escritor.gravados + len(escritor.pendentes) - gravados}")
+
+        log(f"Arquivo {file_name} processado em {time.time() - start_time:.2f} s")
+        log(f"→ Fluxos ativos na tabela: {len(tabela)}")
+
+    escritor.adicionar(tabela.esvaziar())
+    escritor.gravar()
+    marcar_escrita(collection)
+
+    log(f"→ Fluxos inseridos: {tabela.inseridos}")
+    log(f"→ Fluxos atualizados: {tabela.atualizados}")
+    log(f"→ Documentos gravados: {escritor.gravados}")
+    if tabela.atrasados:
+        log(f"Aviso: {tabela.atrasados} fluxo(s) começaram antes da marca d'água; aumente DESORDEM_MS")
+    return tabela.inseridos, tabela.atualizados
+
+def main():
+    with pymongo.MongoClient("mongodb://localhost:27017/") as mongo_client:
+        db = mongo_client[DATA_BASE_NAME]
+        collection = db[COLLECTION_NAME]
+        if collection.estimated_document_count() > 0:
+            log(f"A coleção {collection.name} já possui dados; ela será substituída.")
+            collection.drop()
+
+        log(f"Conectado à base: {db.name}, coleção: {collection.name}")
+        start_time = time.time()
+        unificar(collection)
+        log(f"Tempo total: {time.time() - start_time:.2f} s")
+
+    log("Unificação de fluxos concluída.")
+
+if __name__ == "__main__":
+    sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
+    main()
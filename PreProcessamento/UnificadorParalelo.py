@@ -0,0 +1,171 @@
+import pymongo
+import numpy as np
+import multiprocessing
+import tempfile
+import time
+import os
+import sys
+import io
+from FluxoColunar import ler_blocos
+from IngestaoParalela import MONGO_URI, WORKERS
+from UnificadorMemoria import TabelaFluxosAtivos, EscritorLotes, processar_arquivo, ARQUIVOS, ARQUIVOS_BRUTOS, DIRETORIO
+from UnificadorExterno import DTYPE_REGISTRO, colunas_para_registros, registro_para_documento
+from UnificadorFluxos import REAL_OFFSETS, DATA_BASE_NAME, IP_BINARIO, log
+from VersaoColecao import marcar_escrita
+
+# Unificação paralela: fluxos de 5-tuplas diferentes nunca interagem, então os fluxos são
+# particionados por hash da 5-tupla e cada processo unifica a sua partição de forma independente,
+# com a mesma tabela de fluxos ativos do UnificadorMemoria e a sua própria conexão de escrita.
+#   Fase 1: cada arquivo é lido por um processo e os fluxos vão para um arquivo por partição (em ordem de linha)
+#   Fase 2: cada partição é unificada por um processo, lendo os arquivos em ordem de offset
+
+# Parâmetros
+COLLECTION_NAME = "caida_unificada_collection"
+PARTICOES = WORKERS
+DIRETORIO_TEMPORARIO = None  # None usa o diretório temporário do sistema
+
+# Com IPs em texto, o registro da partição leva também o texto original de cada IP: a 5-tupla e os documentos
+# ficam iguais aos do UnificadorMemoria (os bytes empacotados voltariam como IPv6 na forma canônica)
+DTYPE_PARTICAO = DTYPE_REGISTRO if IP_BINARIO else np.dtype(
+    DTYPE_REGISTRO.descr + [("src_texto", "S45"), ("dst_texto", "S45")])
+
+# Hash estável da 5-tupla (o hash() do Python muda entre processos); devolve a partição de cada registro
+def particao_dos_registros(registros, particoes):
+    src = np.frombuffer(registros["src"].tobytes(), dtype="<u8").reshape(-1, 2)
+    dst = np.frombuffer(registros["dst"].tobytes(), dtype="<u8").reshape(-1, 2)
+    portas = (registros["src_port"].astype(np.uint64) << np.uint64(16)) | registros["dst_port"].astype(np.uint64)
+    primo = np.uint64(0x100000001B3)
+    h = registros["af"].astype(np.uint64)
+    for parte in (src[:, 0], src[:, 1], dst[:, 0], dst[:, 1], portas):
+        h = (h ^ parte) * primo
+    h ^= h >> np.uint64(29)
+    return (h % np.uint64(particoes)).astype(np.int64)
+
+def registros_particao(colunas, ordem_inicial):
+    registros = colunas_para_registros(colunas, ordem_inicial)
+    if IP_BINARIO:
+        return registros
+    particao = np.empty(len(registros), dtype=DTYPE_PARTICAO)
+    for campo in DTYPE_REGISTRO.names:
+        particao[campo] = registros[campo]
+    particao["src_texto"] = colunas["src"]
+    particao["dst_texto"] = colunas["dst"]
+    return particao
+
+def documento_particao(registro):
+    if IP_BINARIO:
+        return registro_para_documento(registro)
+    doc = registro_para_documento(registro[:-2])
+    doc["src"] = registro[-2].decode("ascii")
+    doc["dst"] = registro[-1].decode("ascii")
+    return doc
+
+def caminho_particao(diretorio_particoes, file_name, particao):
+    return os.path.join(diretorio_particoes, f"{file_name}.p{particao:03d}.bin")
+
+# Fase 1 (worker): lê um arquivo e acrescenta cada fluxo ao arquivo da sua partição
+def particionar_arquivo(tarefa):
+    inicio = time.time()
+    linhas = 0
+    for colunas in ler_blocos(tarefa["caminho"], permitir_ipv6=True):
+        colunas["start"] += tarefa["offset"]
+        registros = registros_particao(colunas, linhas)
+        linhas += len(registros)
+        particoes = particao_dos_registros(registros, tarefa["particoes"])
+        for particao in np.unique(particoes):
+            with open(caminho_particao(tarefa["diretorio"], tarefa["arquivo"], particao), "ab") as file:
+                registros[particoes == particao].tofile(file)
+    return {"arquivo": tarefa["arquivo"], "linhas": linhas, "tempo": time.time() - inicio}
+
+# Fase 2 (worker): unifica uma partição lendo os arquivos em ordem de offset, como o UnificadorMemoria
+def unificar_particao(tarefa):
+    inicio = time.time()
+    arquivos = tarefa["arquivos"]
+    tabela = TabelaFluxosAtivos()
+    with pymongo.MongoClient(tarefa["uri"]) as mongo_client:
+        escritor = EscritorLotes(mongo_client[tarefa["db"]][tarefa["colecao"]])
+
+        for i, file_name in enumerate(arquivos):
+            caminho = caminho_particao(tarefa["diretorio"], file_name, tarefa["particao"])
+            registros = np.fromfile(caminho, dtype=DTYPE_PARTICAO).tolist() if os.path.isfile(caminho) else []
+            # Todo fluxo dos próximos arquivos começa depois do menor offset restante
+            proximos = [REAL_OFFSETS[a] for a in arquivos[i + 1:]]
+            processar_arquivo(tabela, escritor, map(documento_particao, registros), file_name not in ARQUIVOS_BRUTOS,
+                              min(proximos) if proximos else None)
+
+        escritor.adicionar(tabela.esvaziar())
+        escritor.gravar()
+
+    return {
+        "particao": tarefa["particao"], "inseridos": tabela.inseridos, "atualizados": tabela.atualizados,
+        "gravados": escritor.gravados, "atrasados": tabela.atrasados, "tempo": time.time() - inicio,
+    }
+
+# Executa as tarefas no próprio processo (um worker) ou num pool de processos
+def executar(funcao, tarefas, workers):
+    if workers == 1:
+        return [funcao(tarefa) for tarefa in tarefas]
+    with multiprocessing.Pool(workers) as pool:
+        return list(pool.imap_unordered(funcao, tarefas))
+
+def unificar(db_name, colecao, arquivos=ARQUIVOS, diretorio=DIRETORIO, particoes=PARTICOES,
+             uri=MONGO_URI, diretorio_temporario=DIRETORIO_TEMPORARIO):
+    arquivos = sorted(arquivos, key=REAL_OFFSETS.get)
+    with tempfile.TemporaryDirectory(prefix="particoes_", dir=diretorio_temporario) as diretorio_particoes:
+        tarefas = []
+        for file_name in arquivos:
+            full_path = os.path.join(diretorio, file_name)
+            if not os.path.isfile(full_path):
+                log(f"Arquivo não encontrado: {full_path}. Pulando...")
+                continue
+            tarefas.append({"arquivo": file_name, "caminho": full_path, "offset": REAL_OFFSETS[file_name],
+                            "particoes": particoes, "diretorio": diretorio_particoes})
+
+        start_time = time.time()
+        lidos = executar(particionar_arquivo, tarefas, min(particoes, len(tarefas)) or 1)
+        linhas = sum(r["linhas"] for r in lidos)
+        tempo = time.time() - start_time
+        log(f"Fase 1: {len(lidos)} arquivos, {linhas} fluxos particionados em {tempo:.2f} s "
+            f"→ {linhas / (tempo or 1e-9):,.0f} fluxos/s")
+
+        tarefas = [
+            {"particao": particao, "arquivos": arquivos, "diretorio": diretorio_particoes,
+             "uri": uri, "db": db_name, "colecao": colecao}
+            for particao in range(particoes)
+        ]
+        start_time = time.time()
+        resultados = executar(unificar_particao, tarefas, particoes)
+        tempo = time.time() - start_time
+        with pymongo.MongoClient(uri) as mongo_client:
+            marcar_escrita(mongo_client[db_name][colecao])
+
+    for r in sorted(resultados, key=lambda r: r["particao"]):
+        log(f"  Partição {r['particao']:>2}: {r['inseridos']} inseridos, {r['atualizados']} atualizados "
+            f"em {r['tempo']:.2f} s")
+    inseridos = sum(r["inseridos"] for r in resultados)
+    atualizados = sum(r["atualizados"] for r in resultados)
+    log(f"Fase 2: {particoes} partições em {tempo:.2f} s → {linhas / (tempo or 1e-9):,.0f} fluxos/s")
+    log(f"→ Fluxos inseridos: {inseridos}")
+    log(f"→ Fluxos atualizados: {atualizados}")
+    atrasados = sum(r["atrasados"] for r in resultados)
+    if atrasados:
+        log(f"Aviso: {atrasados} fluxo(s) começaram antes da marca d'água; aumente DESORDEM_MS (UnificadorMemoria.py)")
+    return inseridos, atualizados
+
+def main():
+    with pymongo.MongoClient(MONGO_URI) as mongo_client:
+        collection = mongo_client[DATA_BASE_NAME][COLLECTION_NAME]
+        if collection.estimated_document_count() > 0:
+            log(f"A coleção {collection.name} já possui dados; ela será substituída.")
+            collection.drop()
+
+    log(f"Conectado à base: {DATA_BASE_NAME}, coleção: {COLLECTION_NAME}")
+    log(f"Partições (processos): {PARTICOES}")
+    start_time = time.time()
+    unificar(DATA_BASE_NAME, COLLECTION_NAME)
+    log(f"Tempo total: {time.time() - start_time:.2f} s")
+    log("Unificação de fluxos concluída.")
+
+if __name__ == "__main__":
+    sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
+    main()
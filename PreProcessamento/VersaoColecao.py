@@ -0,0 +1,81 @@
+from datetime import datetime, timezone
+
+# Versão dos dados de cada coleção: um contador incrementado sempre que a ingestão ou a unificação
+# termina de escrever na coleção. Junto com o número de documentos, identifica o conteúdo da coleção
+# para os caches do Processamento (Processamento/CacheEstatisticas.py).
+# Também registra em que versão os campos derivados (CamposDerivados.py) e as classes foram gravados em
+# todos os documentos, e em que versão os resumos incrementais (Processamento/Resumos.py) cobriam a coleção;
+# eles só são usados enquanto essa versão for a atual.
+#   { _id: <coleção>, versao: <n>, atualizado: <data>,
+#     derivados: { campos: [...], versao: <n> },
+#     classes: { campos: [...], versao: <n>, modo: <modo>, thresholds: {...} },
+#     resumos: { versao: <n> } }
+
+COLECAO_VERSOES = "versoes_colecoes"
+
+def marcador_colecao(collection):
+    return collection.database[COLECAO_VERSOES].find_one({"_id": collection.name}) or {}
+
+# Registra que a coleção foi alterada (chamar ao final de cada escrita). derivados=True indica que todos
+# os documentos escritos já tinham os campos derivados, e resumos=True que a escrita também atualizou os
+# resumos incrementais: o que estava completo continua completo.
+def marcar_escrita(collection, derivados=False, resumos=False):
+    marcador = marcador_colecao(collection)
+    incremento = {"versao": 1}
+    for nome, mantido in (("derivados", derivados), ("resumos", resumos)):
+        if mantido and nome in marcador and marcador[nome]["versao"] == marcador.get("versao"):
+            incremento[f"{nome}.versao"] = 1
+    collection.database[COLECAO_VERSOES].update_one(
+        {"_id": collection.name},
+        {"$inc": incremento, "$set": {"atualizado": datetime.now(timezone.utc)}},
+        upsert=True,
+    )
+
+# Registra que todos os documentos da versão atual têm os campos derivados
+def marcar_derivados(collection, campos):
+    versao = marcador_colecao(collection).get("versao", 0)
+    collection.database[COLECAO_VERSOES].update_one(
+        {"_id": collection.name},
+        {"$set": {"versao": versao, "derivados": {"campos": list(campos), "versao": versao}}},
+        upsert=True,
+    )
+
+# Registra que todos os documentos da versão atual têm as classes calculadas com esses thresholds
+def marcar_classes(collection, campos, modo, thresholds):
+    versao = marcador_colecao(collection).get("versao", 0)
+    collection.database[COLECAO_VERSOES].update_one(
+        {"_id": collection.name},
+        {"$set": {"versao": versao, "classes": {"campos": list(campos), "versao": versao,
+                                                 "modo": modo, "thresholds": thresholds}}},
+        upsert=True,
+    )
+
+# Registra que os resumos incrementais cobrem a versão atual
+def marcar_resumos(collection):
+    versao = marcador_colecao(collection).get("versao", 0)
+    collection.database[COLECAO_VERSOES].update_one(
+        {"_id": collection.name},
+        {"$set": {"versao": versao, "resumos": {"versao": versao}}},
+        upsert=True,
+    )
+
+def resumos_atualizados(collection):
+    marcador = marcador_colecao(collection)
+    return "resumos" in marcador and marcador["resumos"]["versao"] == marcador.get("versao", 0)
+
+# Campos gravados ainda válidos na versão atual: ({campos derivados}, informações das classes ou None)
+def campos_gravados(collection):
+    marcador = marcador_colecao(collection)
+    versao = marcador.get("versao", 0)
+    derivados = marcador.get("derivados")
+    classes = marcador.get("classes")
+    return (
+        set(derivados["campos"]) if derivados and derivados["versao"] == versao else set(),
+        classes if classes and classes["versao"] == versao else None,
+    )
+
+def versao_colecao(collection):
+    return {
+        "documentos": collection.estimated_document_count(),
+        "versao": marcador_colecao(collection).get("versao", 0),
+    }
@@ -0,0 +1,179 @@
+import math
+from collections import namedtuple
+from statistics import NormalDist
+import numpy as np
+from FlowStore import FlowStore, Expressao, CAMPOS_DERIVADOS, expressao_mongo
+from Estatisticas import Momentos, SomasPorFaixa
+from Classificacao import CLASSIFICACOES, MINIMO_PACOTES, classificar, categorias, expressao_classificacao
+
+# Amostras dos fluxos para prévias rápidas (por exemplo, ajustar thresholds em 0,1% dos fluxos em segundos
+# e deixar a passada completa só para o relatório final):
+#   amostra_aleatoria      amostra uniforme: uma fração (Bernoulli) ou um tamanho fixo (reservoir numa
+#                          passada nos backends NumPy, $sample no MongoDB), via FlowStore.amostrar
+#   amostra_estratificada  até "tamanho" fluxos de cada estrato (fatia de tempo ou classe) e a quantidade de
+#                          fluxos de cada estrato, via FlowStore.amostrar_por_estrato (uma passada nos backends
+#                          NumPy; no MongoDB $group + $match/$sample por estrato, tudo no servidor)
+#   AmostraFlowStore       store que devolve só uma amostra do store original (qualquer análise como prévia)
+# As estimativas (Amostra) levam o peso de cada fluxo (fluxos da população que ele representa) e vêm com
+# intervalos de confiança normais de nível NIVEL, com correção de população finita.
+
+NIVEL = 0.95  # nível de confiança dos intervalos
+SEMENTE = None  # None: uma amostra diferente a cada execução
+
+# valor estimado, limites do intervalo de confiança e erro padrão
+Estimativa = namedtuple("Estimativa", ["valor", "inferior", "superior", "erro_padrao"])
+
+# codigo: Expressao com o código inteiro do estrato de cada fluxo (NumPy e MongoDB); rotulo(código) → nome do estrato
+Estrato = namedtuple("Estrato", ["codigo", "rotulo"])
+
+# Fatias de "start" com a largura pedida (ms); o rótulo é o início da fatia
+def estrato_tempo(largura):
+    return Estrato(
+        Expressao(("start",), lambda chunk: chunk["start"] // largura, {"$floor": {"$divide": ["$start", largura]}}),
+        lambda codigo: codigo * largura,
+    )
+
+# Categoria da classificação com os thresholds dados (classes raras, como Chita, entram com o mesmo
+# número de fluxos que Normal)
+def estrato_classe(selecao, thresholds, minimo_pacotes=MINIMO_PACOTES):
+    campo = CLASSIFICACOES[selecao]["campo"]
+    return Estrato(
+        Expressao((campo, "npackets_total"),
+                  lambda chunk: classificar(selecao, chunk[campo], thresholds, chunk["npackets_total"], minimo_pacotes),
+                  expressao_classificacao(selecao, thresholds, expressao_mongo(campo), minimo_pacotes, codigos=True)),
+        lambda codigo: categorias(selecao)[codigo],
+    )
+
+def intervalo(valor, variancia, minimo=None):
+    erro = math.sqrt(max(variancia, 0.0))
+    z = NormalDist().inv_cdf(0.5 + NIVEL / 2)
+    inferior = valor - z * erro
+    return Estimativa(valor, inferior if minimo is None else max(inferior, minimo), valor + z * erro, erro)
+
+# Fluxos amostrados com o desenho da amostra: cada estrato h tem N_h fluxos na população e n_h na amostra.
+#   colunas    {campo: array} dos fluxos amostrados
+#   estratos   índice do estrato de cada fluxo (0 a H-1)
+#   populacao  N_h de cada estrato
+#   fracao     probabilidade de inclusão de uma amostra Bernoulli (aí N é estimado por n / fracao);
+#              None quando cada estrato é uma amostra aleatória simples de tamanho fixo
+#   rotulos    nome de cada estrato
+class Amostra:
+    def __init__(self, colunas, estratos, populacao, fracao=None, rotulos=None):
+        self.colunas = colunas
+        self.estratos = np.asarray(estratos, dtype=np.int64)
+        self.populacao = np.asarray(populacao, dtype=np.float64)
+        self.fracao = fracao
+        self.rotulos = rotulos
+        self.tamanhos = np.bincount(self.estratos, minlength=len(self.populacao))
+        pesos = np.divide(self.populacao, self.tamanhos, out=np.zeros(len(self.populacao)), where=self.tamanhos > 0)
+        self.pesos = pesos[self.estratos]  # fluxos da população representados por cada fluxo amostrado
+
+    def __len__(self):
+        return len(self.estratos)
+
+    def __getitem__(self, campo):
+        return self.colunas[campo]
+
+    # Variância do total estimado Σ peso·z. Bernoulli: (1 - p) / p² · Σ z²; estratificada:
+    # Σ_h N_h² (1 - n_h / N_h) s²_h / n_h (estratos com um só fluxo amostrado não contribuem)
+    def _variancia_total(self, z):
+        if self.fracao is not None:
+            return (1 - self.fracao) / self.fracao ** 2 * float((z * z).sum())
+        n = self.tamanhos.astype(np.float64)
+        soma = np.bincount(self.estratos, weights=z, minlength=len(n))
+        quadrados = np.bincount(self.estratos, weights=z * z, minlength=len(n))
+        with np.errstate(divide="ignore", invalid="ignore"):
+            s2 = np.where(n > 1, (quadrados - soma * soma / n) / (n - 1), 0.0)
+            parcelas = np.where(n > 1, self.populacao ** 2 * (1 - n / self.populacao) * s2 / n, 0.0)
+        return float(parcelas.sum())
+
+    def _mascara(self, mascara):
+        return np.ones(len(self), dtype=bool) if mascara is None else np.asarray(mascara, dtype=bool)
+
+    # Fluxos da população que satisfazem a máscara (todos, sem máscara)
+    def contagem(self, mascara=None):
+        d = self._mascara(mascara).astype(np.float64)
+        return intervalo(float((self.pesos * d).sum()), self._variancia_total(d), minimo=0.0)
+
+    # Fração da população que satisfaz a máscara (estimador de razão, variância linearizada)
+    def proporcao(self, mascara):
+        d = self._mascara(mascara).astype(np.float64)
+        total = float(self.pesos.sum())
+        if total == 0:
+            return Estimativa(0.0, 0.0, 0.0, 0.0)
+        razao = float((self.pesos * d).sum()) / total
+        return intervalo(razao, self._variancia_total(d - razao) / total ** 2, minimo=0.0)
+
+    # Média do campo nos fluxos que satisfazem a máscara (estimador de razão, variância linearizada).
+    # Os campos dos fluxos não são negativos, então o limite inferior fica em 0.
+    def media(self, campo, mascara=None):
+        d = self._mascara(mascara)
+        valores = self.colunas[campo].astype(np.float64)
+        total = float(self.pesos[d].sum())
+        if total == 0:
+            return Estimativa(None, None, None, None)
+        media = float((self.pesos[d] * valores[d]).sum()) / total
+        return intervalo(media, self._variancia_total(np.where(d, valores - media, 0.0)) / total ** 2, minimo=0.0)
+
+    # Momentos ponderados (n é a população estimada), no mesmo formato das passadas completas
+    def momentos(self, campo):
+        valores = self.colunas[campo].astype(np.float64)
+        total = float(self.pesos.sum())
+        if total == 0:
+            return Momentos()
+        media = float((self.pesos * valores).sum()) / total
+        return Momentos(round(total), media, float((self.pesos * (valores - media) ** 2).sum()),
+                        valores.min().item(), valores.max().item())
+
+    # Distribuição (sketch logarítmico) em que cada fluxo conta como o seu peso, para quantis
+    def distribuicao(self, campo):
+        valores = self.colunas[campo]
+        distribuicao = SomasPorFaixa(inteiro=campo not in CAMPOS_DERIVADOS).adicionar(valores, {})
+        if len(valores):
+            indices = distribuicao.indice(valores)
+            distribuicao.count = np.rint(np.bincount(indices, weights=self.pesos, minlength=len(distribuicao))).astype(np.int64)
+        return distribuicao
+
+def _juntar(chunks, nomes):
+    return {nome: np.concatenate([chunk[nome] for chunk in chunks]) if chunks else np.empty(0) for nome in nomes}
+
+# Amostra uniforme (fracao ou tamanho, ver FlowStore.amostrar). Com tamanho, a população vem de store.contar
+# (metadados, sem filtro).
+def amostra_aleatoria(store, campos, fracao=None, tamanho=None, filtro=None, semente=SEMENTE, expressoes=None):
+    nomes = list(dict.fromkeys([*campos, *(expressoes or {})]))
+    colunas = _juntar(list(store.amostrar(campos, fracao, tamanho, filtro, semente, expressoes)), nomes)
+    n = len(colunas[nomes[0]])
+    if fracao is not None:
+        return Amostra(colunas, np.zeros(n, dtype=np.int64), [n / fracao], fracao)
+    return Amostra(colunas, np.zeros(n, dtype=np.int64), [max(store.contar(filtro), n)])
+
+# Amostra estratificada: até "tamanho" fluxos de cada estrato, com a quantidade de fluxos de cada estrato
+# (FlowStore.amostrar_por_estrato)
+def amostra_estratificada(store, campos, estrato, tamanho, filtro=None, semente=SEMENTE, expressoes=None):
+    nomes = list(dict.fromkeys([*campos, *(expressoes or {})]))
+    colunas, populacao = store.amostrar_por_estrato(campos, estrato.codigo, tamanho, filtro, semente, expressoes)
+    codigos = sorted(populacao)
+    return Amostra({nome: colunas[nome] for nome in nomes}, np.searchsorted(codigos, colunas["_estrato"]),
+                   [populacao[codigo] for codigo in codigos], rotulos=[estrato.rotulo(codigo) for codigo in codigos])
+
+# Store com só uma amostra Bernoulli (fracao) do store original: qualquer análise roda como prévia.
+# Contagens e somas saem na escala da amostra (multiplique por fator = 1 / fracao). Nada vai para o cache
+# (identificador None). Nos backends NumPy todas as passadas veem a mesma amostra (mesma semente);
+# no MongoDB ($rand) cada passada sorteia de novo.
+class AmostraFlowStore(FlowStore):
+    nome = "amostra"
+
+    def __init__(self, store, fracao, semente=SEMENTE):
+        self.store = store
+        self.fracao = fracao
+        self.fator = 1 / fracao
+        self.semente = semente if semente is not None else np.random.SeedSequence().entropy
+
+    def materializados(self):
+        return self.store.materializados()
+
+    def classes(self):
+        return self.store.classes()
+
+    def _chunks(self, campos, filtro):
+        return self.store.amostrar(campos, fracao=self.fracao, filtro=filtro, semente=self.semente)
@@ -0,0 +1,135 @@
+import contextlib
+import json
+import os
+import time
+from FlowStore import CAMPOS_DERIVADOS
+from Estatisticas import Momentos, SomasPorFaixa
+from Resumos import obter_resumos, resumo_total, CAMPOS_RESUMO
+
+# Cache persistente de estatísticas por coleção: um arquivo JSON por coleção/backend com a versão
+# dos dados (FlowStore.versao()) e as entradas calculadas. Quando a ingestão ou a unificação
+# escrevem na coleção a versão muda e as entradas antigas são descartadas na próxima leitura.
+#   { "formato": FORMATO_CACHE, "versao": {...}, "entradas": { <nome>: <valor JSON> } }
+# FORMATO_CACHE muda quando o formato das entradas muda (caches antigos são descartados).
+
+DIRETORIO_CACHE = "Saida/Cache"
+FORMATO_CACHE = 2
+ESPERA_TRAVA = 30  # s: trava mais antiga que isso é de um processo que caiu e é descartada
+
+class CacheEstatisticas:
+    def __init__(self, store, diretorio=DIRETORIO_CACHE):
+        self.versao = store.versao()
+        self.caminho = None
+        self.entradas = {}
+        if self.versao is None or store.identificador is None:
+            return  # dados sem versão: nada é guardado
+
+        self.caminho = os.path.join(diretorio, f"{store.identificador}.json")
+        self.entradas = self._ler()
+
+    def __contains__(self, nome):
+        return nome in self.entradas
+
+    def __getitem__(self, nome):
+        return self.entradas[nome]
+
+    def __setitem__(self, nome, valor):
+        self.entradas[nome] = valor
+        self.gravar()
+
+    # Devolve a entrada; se ela não existir, calcula com calcular() e guarda
+    def obter(self, nome, calcular):
+        if nome not in self.entradas:
+            self[nome] = calcular()
+        return self.entradas[nome]
+
+    # Lê as entradas gravadas no arquivo se forem da mesma versão dos dados
+    def _ler(self):
+        if not os.path.isfile(self.caminho):
+            return {}
+        try:
+            with open(self.caminho, "r", encoding="utf-8") as file:
+                dados = json.load(file)
+        except ValueError:
+            return {}
+        if dados.get("formato") == FORMATO_CACHE and dados.get("versao") == self.versao:
+            return dados.get("entradas", {})
+        return {}
+
+    # Trava entre processos (arquivo criado com O_EXCL, funciona em qualquer sistema)
+    @contextlib.contextmanager
+    def _trava(self):
+        trava = self.caminho + ".lock"
+        while True:
+            try:
+                os.close(os.open(trava, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+                break
+            except FileExistsError:
+                try:
+                    if time.time() - os.path.getmtime(trava) > ESPERA_TRAVA:
+                        os.remove(trava)
+                except OSError:
+                    pass
+                time.sleep(0.05)
+        try:
+            yield
+        finally:
+            os.remove(trava)
+
+    # Junta com o que outros processos gravaram desde a leitura (análises do Lote.py rodando ao mesmo
+    # tempo na mesma coleção) antes de gravar
+    def gravar(self, juntar=True):
+        if self.caminho is None:
+            return
+        os.makedirs(os.path.dirname(self.caminho), exist_ok=True)
+        with self._trava():
+            if juntar:
+                self.entradas = {**self._ler(), **self.entradas}
+            temporario = self.caminho + ".tmp"
+            with open(temporario, "w", encoding="utf-8") as file:
+                json.dump({"formato": FORMATO_CACHE, "versao": self.versao, "entradas": self.entradas}, file)
+            os.replace(temporario, self.caminho)
+
+    def limpar(self):
+        self.entradas = {}
+        self.gravar(juntar=False)
+
+def chave_momentos(campo):
+    return f"momentos/{campo}"
+
+# Distribuição de todos os valores do campo (sketch logarítmico, para quantis)
+def chave_distribuicao(campo):
+    return f"distribuicao/{campo}"
+
+def nova_distribuicao(campo):
+    return SomasPorFaixa(inteiro=campo not in CAMPOS_DERIVADOS)
+
+# Momentos e distribuição de cada campo pedido ({campo: Momentos}, {campo: SomasPorFaixa});
+# os que não estão no cache saem dos resumos incrementais (Resumos.py), se estiverem válidos,
+# ou de uma única passada
+def obter_estatisticas(store, campos, cache):
+    faltando = [campo for campo in campos
+                if chave_momentos(campo) not in cache or chave_distribuicao(campo) not in cache]
+    resumos = obter_resumos(store) if faltando and set(faltando) <= set(CAMPOS_RESUMO) else None
+    if resumos is not None:
+        total = resumo_total(resumos)
+        for campo in faltando:
+            cache.entradas[chave_momentos(campo)] = total.momentos[campo].para_dict()
+            cache.entradas[chave_distribuicao(campo)] = total.distribuicao(campo).para_dict()
+        cache.gravar()
+    elif faltando:
+        momentos = {campo: Momentos() for campo in faltando}
+        distribuicoes = {campo: nova_distribuicao(campo) for campo in faltando}
+        for chunk in store.scan(faltando):
+            for campo in faltando:
+                momentos[campo].adicionar(chunk[campo])
+                distribuicoes[campo].adicionar(chunk[campo], {})
+        for campo in faltando:
+            cache.entradas[chave_momentos(campo)] = momentos[campo].para_dict()
+            cache.entradas[chave_distribuicao(campo)] = distribuicoes[campo].para_dict()
+        cache.gravar()
+    return ({campo: Momentos.de_dict(cache[chave_momentos(campo)]) for campo in campos},
+            {campo: SomasPorFaixa.de_dict(cache[chave_distribuicao(campo)]) for campo in campos})
+
+def obter_momentos(store, campos, cache):
+    return obter_estatisticas(store, campos, cache)[0]
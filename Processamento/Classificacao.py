@@ -0,0 +1,148 @@
+import numpy as np
+from FlowStore import Expressao, expressao_mongo
+from CamposDerivados import MINIMO_PACOTES
+
+# Regras de classificação dos fluxos. Em cada classificação a primeira regra satisfeita define a
+# categoria; fluxos com menos de MINIMO_PACOTES pacotes e os que não satisfazem nenhuma regra são "Normal".
+# Cada regra é (categoria, operador, nome do threshold).
+
+NORMAL = "Normal"
+
+# Thresholds fixos; os demais vêm da distribuição de cada campo (calcular_thresholds), em um de dois modos:
+#   "sigma"     Elefante/Tartaruga/Chita ≥ média + K_SIGMA·desvio, Caracol < média - desvio
+#   "percentil" Elefante/Tartaruga/Chita ≥ quantil PERCENTIL_ALTO, Caracol < quantil PERCENTIL_BAIXO
+#               (quantis do sketch logarítmico: erro relativo no valor de até (GAMMA - 1) / 2)
+RATO_THRESHOLD = 155  # bytes
+LIBELULA_THRESHOLD = 330  # ms
+CARACOL_FALLBACK = 20  # B/s, usado quando média - desvio da taxa é negativo
+MODO_THRESHOLD = "sigma"
+MODOS_THRESHOLD = ("sigma", "percentil")
+K_SIGMA = 3
+PERCENTIL_ALTO = 0.99
+PERCENTIL_BAIXO = 0.10
+
+CLASSIFICACOES = {
+    "volume": {
+        "campo": "nbytes_total",
+        "regras": [("Elefante", ">=", "elefante"), ("Rato", "<", "rato")],
+    },
+    "duracao": {
+        "campo": "duration",
+        "regras": [("Libélula", "<", "libelula"), ("Tartaruga", ">=", "tartaruga")],
+    },
+    "taxa": {
+        "campo": "rate",
+        "regras": [("Caracol", "<", "caracol"), ("Chita", ">=", "chita")],
+    },
+}
+
+# Campo de onde sai cada threshold dinâmico
+CAMPOS_THRESHOLDS = {"elefante": "nbytes_total", "tartaruga": "duration", "chita": "rate", "caracol": "rate"}
+
+# Thresholds a partir dos Momentos ({campo: Momentos}) ou, no modo "percentil", das distribuições
+# ({campo: SomasPorFaixa}) de cada campo; campos ausentes contam como média, desvio e quantis 0
+def calcular_thresholds(momentos, distribuicoes=None, modo=MODO_THRESHOLD):
+    if modo not in MODOS_THRESHOLD:
+        raise ValueError(f"Modo de threshold inválido: {modo}. Use {', '.join(MODOS_THRESHOLD)}.")
+
+    def media(campo):
+        return momentos[campo].media if campo in momentos and momentos[campo].n else 0
+
+    def desvio(campo):
+        return momentos[campo].desvio if campo in momentos and momentos[campo].n else 0
+
+    def quantil(campo, q):
+        distribuicao = (distribuicoes or {}).get(campo)
+        valor = distribuicao.quantil(q) if distribuicao is not None else None
+        return valor if valor is not None else 0
+
+    if modo == "percentil":
+        alto = {campo: quantil(campo, PERCENTIL_ALTO) for campo in ("nbytes_total", "duration", "rate")}
+        caracol = quantil("rate", PERCENTIL_BAIXO)
+    else:
+        alto = {campo: media(campo) + K_SIGMA * desvio(campo) for campo in ("nbytes_total", "duration", "rate")}
+        caracol = media("rate") - desvio("rate")
+    return {
+        "elefante": alto["nbytes_total"],
+        "rato": RATO_THRESHOLD,
+        "tartaruga": alto["duration"],
+        "libelula": LIBELULA_THRESHOLD,
+        "caracol": caracol if caracol >= 0 else CARACOL_FALLBACK,
+        "chita": alto["rate"],
+    }
+
+# Texto curto do critério usado (legendas dos gráficos)
+def descricao_modo(modo=MODO_THRESHOLD):
+    if modo == "percentil":
+        return f"p{PERCENTIL_ALTO * 100:g} / p{PERCENTIL_BAIXO * 100:g}"
+    return f"média + {K_SIGMA}σ"
+
+OPERADORES = {
+    "<": np.less,
+    ">=": np.greater_equal,
+}
+OPERADORES_MONGO = {
+    "<": "$lt",
+    ">=": "$gte",
+}
+
+# Categorias na ordem dos códigos devolvidos por classificar (0 é sempre Normal)
+def categorias(selecao):
+    return [NORMAL] + [categoria for categoria, _, _ in CLASSIFICACOES[selecao]["regras"]]
+
+# Código da categoria de cada valor. npackets (opcional) força Normal abaixo de minimo_pacotes.
+def classificar(selecao, valores, thresholds, npackets=None, minimo_pacotes=MINIMO_PACOTES):
+    regras = CLASSIFICACOES[selecao]["regras"]
+    condicoes = [OPERADORES[operador](valores, thresholds[nome]) for _, operador, nome in regras]
+    codigos = list(range(1, len(regras) + 1))
+    if npackets is not None:
+        condicoes.insert(0, npackets < minimo_pacotes)
+        codigos.insert(0, 0)
+    return np.select(condicoes, codigos, default=0)
+
+def rotulos(selecao, codigos):
+    return np.array(categorias(selecao))[codigos]
+
+# Campo onde a categoria de cada classificação é gravada (MaterializarDerivados.py --classes)
+def campo_classe(selecao):
+    return f"classe_{selecao}"
+
+# Categoria (rótulo) como expressão de agregação do MongoDB, com as mesmas regras do classificar;
+# "valor" é a expressão do campo classificado (por exemplo "$rate"). Com codigos, o código do classificar.
+def expressao_classificacao(selecao, thresholds, valor, minimo_pacotes=MINIMO_PACOTES, codigos=False):
+    nomes = list(range(len(categorias(selecao)))) if codigos else categorias(selecao)
+    ramos = [{"case": {"$lt": ["$npackets_total", minimo_pacotes]}, "then": nomes[0]}]
+    ramos += [
+        {"case": {OPERADORES_MONGO[operador]: [valor, thresholds[nome]]}, "then": nomes[codigo]}
+        for codigo, (_, operador, nome) in enumerate(CLASSIFICACOES[selecao]["regras"], 1)
+    ]
+    return {"$switch": {"branches": ramos, "default": nomes[0]}}
+
+# A classificação como Expressao do FlowStore, com o rótulo da categoria como valor: a mesma definição
+# (as regras de CLASSIFICACOES) roda vetorizada em NumPy nos chunks e gera a expressão do MongoDB
+def expressao_rotulo(selecao, thresholds, minimo_pacotes=MINIMO_PACOTES):
+    campo = CLASSIFICACOES[selecao]["campo"]
+    return Expressao(
+        (campo, "npackets_total"),
+        lambda chunk: rotulos(selecao, classificar(selecao, chunk[campo], thresholds, chunk["npackets_total"], minimo_pacotes)),
+        expressao_classificacao(selecao, thresholds, expressao_mongo(campo), minimo_pacotes),
+    )
+
+# Contagens e somas por categoria a partir de um SomasPorFaixa (fluxos com pacotes suficientes).
+# Cada faixa vai para a categoria do seu ponto médio; "incerteza" é o número de fluxos em faixas
+# cujos extremos caem em categorias diferentes (o erro máximo de cada contagem).
+def resolver_faixas(selecao, faixas, thresholds):
+    indices = np.arange(len(faixas))
+    menor, maior = faixas.extremos(indices)
+    codigos = classificar(selecao, (menor + maior) / 2, thresholds)
+    incertos = classificar(selecao, menor, thresholds) != classificar(selecao, maior, thresholds)
+
+    grupos = {}
+    for codigo, categoria in enumerate(categorias(selecao)):
+        selecionadas = codigos == codigo
+        grupos[categoria] = {
+            "count": int(faixas.count[selecionadas].sum()),
+            **{campo: float(valores[selecionadas].sum()) for campo, valores in faixas.somas.items()},
+        }
+    incerteza = int(faixas.count[incertos].sum())
+    return grupos, incerteza
@@ -0,0 +1,37 @@
+# Datasets conhecidos (substitui as cadeias "DATABASE = 1/2/3" dos scripts) e backends. Sem dependências,
+# para o nbig.py validar --dataset e --backend sem importar o FlowStore (e o numpy); o FlowStore os reexporta.
+
+DATASETS = {
+    "caida": {
+        "nome": "CAIDA 2019",
+        "db": "fluxos_database",
+        "colecao": "caida_collection",
+        "graficos": "Saida/Graficos/AnaliseCaida",
+    },
+    # Saída do UnificadorMemoria, UnificadorExterno e UnificadorParalelo (nbig.py unify --engine ...)
+    "caida_unificada": {
+        "nome": "CAIDA 2019 (unificado)",
+        "db": "fluxos_database",
+        "colecao": "caida_unificada_collection",
+        "graficos": "Saida/Graficos/AnaliseCaidaUnificada",
+    },
+    "mawi": {
+        "nome": "MAWI 2019",
+        "db": "fluxos_database",
+        "colecao": "mawi_collection",
+        "graficos": "Saida/Graficos/AnaliseMAWI",
+    },
+    "mawi2025": {
+        "nome": "MAWI 2025",
+        "db": "fluxos_database",
+        "colecao": "mawi2025_collection",
+        "graficos": "Saida/Graficos/AnaliseMAWI2025",
+    },
+}
+BACKENDS = ("mongo", "colunar")
+DATASETS_LOTE = ("caida", "mawi", "mawi2025")  # Os do Lote.py sem --datasets (caida_unificada só existe depois da unificação)
+
+def obter_dataset(nome):
+    if nome not in DATASETS:
+        raise ValueError(f"Dataset inválido: {nome}. Use {', '.join(DATASETS)}.")
+    return DATASETS[nome]
@@ -0,0 +1,751 @@
+import math
+import os
+import sys
+from collections import namedtuple
+import numpy as np
+
+# Módulos compartilhados com a ingestão (Estatisticas, CamposDerivados, VersaoColecao, ResumosFluxos) ficam
+# no PreProcessamento; o PreProcessamento nunca importa do Processamento
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "PreProcessamento"))
+from Estatisticas import Momentos, Histograma, SomasPorFaixa, Somas
+from VersaoColecao import versao_colecao, campos_gravados
+from CamposDerivados import calcular_taxa, EXPRESSAO_TAXA, calcular_tamanho_medio, EXPRESSAO_TAMANHO_MEDIO
+from Datasets import DATASETS, BACKENDS, obter_dataset
+
+# Acesso aos fluxos independente de onde eles estão guardados. Todos os backends oferecem as mesmas
+# operações (scan, agregação por chave, histograma, top-k, intervalo de tempo e estatísticas):
+#   MongoFlowStore    coleção do MongoDB; as agregações rodam no servidor
+#   ColunarFlowStore  armazém colunar local (PreProcessamento/ArmazemColunar.py), varrido com NumPy
+#   MemoriaFlowStore  colunas NumPy em memória (testes e comparações entre backends)
+# O scan devolve os fluxos em chunks {campo: array}. Filtros são {campo: (minimo, maximo)}, com os
+# limites inclusivos e None para um lado aberto.
+# Campos derivados (rate, avg_pkt_size) são calculados em cada consulta, a menos que estejam gravados no
+# backend (materializados(): ver PreProcessamento/CamposDerivados.py e MaterializarDerivados.py).
+
+MONGO_URI = "mongodb://localhost:27017/"
+LINHAS_POR_CHUNK = 1 << 20  # Fluxos por chunk nos backends em memória
+LOTE_MONGO = 100000  # Documentos por chunk no scan do MongoDB
+
+# Valor calculado a partir dos campos do fluxo: a mesma regra em NumPy (funcao(chunk) → array)
+# e como expressão de agregação do MongoDB. "campos" são os campos que a função lê.
+Expressao = namedtuple("Expressao", ["campos", "funcao", "expressao"])
+
+# Campos que podem ser pedidos em qualquer operação; calculados (taxa em B/s e tamanho médio dos pacotes,
+# 0 quando a duração ou os pacotes são 0) quando o backend não os tem gravados
+CAMPOS_DERIVADOS = {
+    "rate": Expressao(("nbytes_total", "duration"), calcular_taxa, EXPRESSAO_TAXA),
+    "avg_pkt_size": Expressao(("nbytes_total", "npackets_total"), calcular_tamanho_medio, EXPRESSAO_TAMANHO_MEDIO),
+}
+
+def como_expressao(campo):
+    if isinstance(campo, Expressao):
+        return campo
+    if campo in CAMPOS_DERIVADOS:
+        return CAMPOS_DERIVADOS[campo]
+    return None
+
+def expressao_mongo(campo):
+    expressao = como_expressao(campo)
+    return expressao.expressao if expressao else f"${campo}"
+
+# Avalia em NumPy, sobre um chunk {campo: array}, uma expressão de agregação do MongoDB com os operadores
+# usados pelos campos derivados e pelas classificações ($cond, $switch, comparações e $divide). Nos backends
+# locais a própria expressão enviada ao servidor pode assim ser conferida contra a função NumPy.
+COMPARACOES_MONGO = {"$lt": np.less, "$lte": np.less_equal, "$gt": np.greater, "$gte": np.greater_equal, "$eq": np.equal}
+
+def avaliar_expressao(expressao, chunk):
+    tamanho = len(next(iter(chunk.values())))
+    if isinstance(expressao, str) and expressao.startswith("$"):
+        return np.asarray(chunk[expressao[1:]])
+    if not isinstance(expressao, dict):
+        return np.full(tamanho, expressao, dtype=object if isinstance(expressao, str) else None)
+    (operador, argumentos), = expressao.items()
+    if operador in COMPARACOES_MONGO:
+        a, b = (avaliar_expressao(argumento, chunk) for argumento in argumentos)
+        return COMPARACOES_MONGO[operador](a, b)
+    if operador == "$divide":
+        a, b = (avaliar_expressao(argumento, chunk) for argumento in argumentos)
+        with np.errstate(divide="ignore", invalid="ignore"):  # os dois ramos do $cond são calculados
+            return np.true_divide(a, b)
+    if operador == "$cond":
+        condicao, sim, nao = (avaliar_expressao(argumento, chunk) for argumento in argumentos)
+        return np.where(condicao, sim, nao)
+    if operador == "$switch":
+        resultado = avaliar_expressao(argumentos.get("default"), chunk)
+        for ramo in reversed(argumentos["branches"]):
+            resultado = np.where(avaliar_expressao(ramo["case"], chunk), avaliar_expressao(ramo["then"], chunk), resultado)
+        return resultado
+    raise ValueError(f"Operador não suportado: {operador}")
+
+# Campos ("$campo") lidos por uma expressão de agregação
+def campos_expressao(expressao):
+    if isinstance(expressao, str):
+        return {expressao[1:]} if expressao.startswith("$") else set()
+    if isinstance(expressao, dict):
+        return set().union(*(campos_expressao(valor) for valor in expressao.values()))
+    if isinstance(expressao, list):
+        return set().union(*(campos_expressao(valor) for valor in expressao))
+    return set()
+
+def filtro_mongo(filtro):
+    consulta = {}
+    for campo, (minimo, maximo) in (filtro or {}).items():
+        condicao = {}
+        if minimo is not None:
+            condicao["$gte"] = minimo
+        if maximo is not None:
+            condicao["$lte"] = maximo
+        consulta[campo] = condicao
+    return consulta
+
+def mascara_filtro(chunk, filtro):
+    mascara = None
+    for campo, (minimo, maximo) in filtro.items():
+        for condicao in (
+            chunk[campo] >= minimo if minimo is not None else None,
+            chunk[campo] <= maximo if maximo is not None else None,
+        ):
+            if condicao is not None:
+                mascara = condicao if mascara is None else mascara & condicao
+    return mascara
+
+# Só os k fluxos com maior "campo" de um chunk {campo: array} (sem ordenar)
+def maiores(chunk, campo, k):
+    valores = chunk[campo]
+    if len(valores) <= k:
+        return chunk
+    indices = np.argpartition(-valores, k - 1)[:k]
+    return {c: v[indices] for c, v in chunk.items()}
+
+def concatenar(a, b):
+    return {campo: np.concatenate([a[campo], b[campo]]) for campo in a}
+
+# Em cada "_estrato" do chunk ficam os "tamanho" fluxos de maior "_chave" aleatória
+def maiores_por_estrato(chunk, tamanho):
+    if not len(chunk["_estrato"]):
+        return chunk
+    ordem = np.lexsort((-chunk["_chave"], chunk["_estrato"]))
+    estratos = chunk["_estrato"][ordem]
+    inicios = np.flatnonzero(np.r_[True, estratos[1:] != estratos[:-1]])
+    posicao = np.arange(len(ordem)) - np.repeat(inicios, np.diff(np.r_[inicios, len(ordem)]))
+    manter = ordem[posicao < tamanho]
+    return {campo: valores[manter] for campo, valores in chunk.items()}
+
+# Documentos do maior para o menor "campo"
+def documentos_ordenados(chunk, campo):
+    if chunk is None:
+        return []
+    ordem = np.argsort(-chunk[campo], kind="stable")
+    colunas = {c: v[ordem].tolist() for c, v in chunk.items()}
+    return [dict(zip(colunas, valores)) for valores in zip(*colunas.values())]
+
+class FlowStore:
+    nome = "base"
+
+    # Identificação dos dados para os caches (CacheEstatisticas): "identificador" nomeia a coleção e
+    # versao() muda sempre que ela é alterada. None desativa o cache (dados sem versão, como em memória).
+    identificador = None
+
+    def versao(self):
+        return None
+
+    # Campos derivados gravados e válidos no backend (lidos em vez de calculados)
+    def materializados(self):
+        return set()
+
+    def calculado(self, campo):
+        return campo in CAMPOS_DERIVADOS and campo not in self.materializados()
+
+    # Classes gravadas em cada fluxo ({campos, modo, thresholds}) ou None
+    def classes(self):
+        return None
+
+    # Backends NumPy: devolvem chunks {campo: array} só com os campos gravados pedidos, já filtrados.
+    # O campo "_id" identifica o fluxo no backend.
+    def _chunks(self, campos, filtro):
+        raise NotImplementedError
+
+    # Percorre os fluxos em chunks {campo: array}. "campos" e o filtro podem ter campos derivados
+    # (CAMPOS_DERIVADOS) e "expressoes" = {nome: Expressao} acrescenta valores calculados por fluxo.
+    def scan(self, campos, filtro=None, limite=None, expressoes=None):
+        expressoes = expressoes or {}
+        filtro = filtro or {}
+        # Filtros em campos calculados só podem ser aplicados depois do cálculo
+        filtro_calculado = {campo: limites for campo, limites in filtro.items() if self.calculado(campo)}
+        derivados = [campo for campo in CAMPOS_DERIVADOS if self.calculado(campo) and (
+            campo in campos or campo in filtro_calculado or any(campo in e.campos for e in expressoes.values()))]
+        gravados = {campo for campo in filtro if campo not in filtro_calculado}
+        gravados.update(campo for campo in campos if not self.calculado(campo) and campo not in expressoes)
+        for campo in derivados:
+            gravados.update(CAMPOS_DERIVADOS[campo].campos)
+        for expressao in expressoes.values():
+            gravados.update(campo for campo in expressao.campos if not self.calculado(campo))
+
+        restantes = limite
+        filtro_gravado = {campo: limites for campo, limites in filtro.items() if campo not in filtro_calculado}
+        for chunk in self._chunks(sorted(gravados), filtro_gravado):
+            if restantes is not None and restantes <= 0:
+                return
+            for campo in derivados:
+                chunk[campo] = CAMPOS_DERIVADOS[campo].funcao(chunk)
+            mascara = mascara_filtro(chunk, filtro_calculado)
+            if mascara is not None:
+                chunk = {campo: valores[mascara] for campo, valores in chunk.items()}
+            if restantes is not None:
+                chunk = {campo: valores[:restantes] for campo, valores in chunk.items()}
+                restantes -= len(next(iter(chunk.values())))
+            for nome, expressao in expressoes.items():
+                chunk[nome] = expressao.funcao(chunk)
+            yield {campo: chunk[campo] for campo in dict.fromkeys([*campos, *expressoes])}
+
+    # Amostra aleatória uniforme dos fluxos, em chunks como o scan (ver Amostragem.py para estimativas):
+    #   fracao   cada fluxo entra com essa probabilidade (Bernoulli), decidido chunk a chunk
+    #   tamanho  exatamente esse número de fluxos (ou todos, se houver menos), numa passada: cada fluxo recebe
+    #            uma chave aleatória e ficam os "tamanho" de maior chave (reservoir, no máximo 2·tamanho em memória)
+    # semente torna a amostra reprodutível nos backends NumPy.
+    def amostrar(self, campos, fracao=None, tamanho=None, filtro=None, semente=None, expressoes=None):
+        if (fracao is None) == (tamanho is None):
+            raise ValueError("Informe fracao ou tamanho.")
+        rng = np.random.default_rng(semente)
+        if fracao is not None:
+            for chunk in self.scan(campos, filtro, expressoes=expressoes):
+                mascara = rng.random(len(next(iter(chunk.values())))) < fracao
+                yield {campo: valores[mascara] for campo, valores in chunk.items()}
+            return
+        melhores = None
+        for chunk in self.scan(campos, filtro, expressoes=expressoes):
+            chunk = maiores(dict(chunk, _chave=rng.random(len(next(iter(chunk.values()))))), "_chave", tamanho)
+            melhores = chunk if melhores is None else maiores(concatenar(melhores, chunk), "_chave", tamanho)
+        if melhores is not None:
+            yield {campo: valores for campo, valores in melhores.items() if campo != "_chave"}
+
+    # Amostra estratificada (ver Amostragem.py): até "tamanho" fluxos de cada estrato, sem reposição, e a
+    # quantidade de fluxos de cada estrato. "estrato" é a Expressao com o código inteiro do estrato do fluxo.
+    # Aqui numa passada (reservoir por estrato, no máximo 2·tamanho fluxos de cada estrato em memória).
+    # Devolve ({campo: array}, com o código de cada fluxo em "_estrato", {código: fluxos no estrato})
+    def amostrar_por_estrato(self, campos, estrato, tamanho, filtro=None, semente=None, expressoes=None):
+        rng = np.random.default_rng(semente)
+        nomes = list(dict.fromkeys([*campos, *(expressoes or {}), "_estrato"]))
+        populacao = {}
+        guardados = None
+        for chunk in self.scan(campos, filtro, expressoes=dict(expressoes or {}, _estrato=estrato)):
+            codigos = chunk["_estrato"] = np.asarray(chunk["_estrato"], dtype=np.int64)
+            for codigo, n in zip(*(valores.tolist() for valores in np.unique(codigos, return_counts=True))):
+                populacao[codigo] = populacao.get(codigo, 0) + n
+            chunk["_chave"] = rng.random(len(codigos))
+            guardados = maiores_por_estrato(chunk if guardados is None else concatenar(guardados, chunk), tamanho)
+        if guardados is None:
+            return {nome: np.empty(0) for nome in nomes}, populacao
+        return {nome: guardados[nome] for nome in nomes}, populacao
+
+    def contar(self, filtro=None):
+        return sum(len(chunk["duration"]) for chunk in self.scan(["duration"], filtro))
+
+    def minimo_maximo(self, campo, filtro=None):
+        minimo = maximo = None
+        for chunk in self.scan([campo], filtro):
+            if len(chunk[campo]):
+                menor, maior = chunk[campo].min().item(), chunk[campo].max().item()
+                minimo = menor if minimo is None else min(minimo, menor)
+                maximo = maior if maximo is None else max(maximo, maior)
+        return minimo, maximo
+
+    # {campo: {"count", "media", "desvio" (populacional), "min", "max"}} em uma única passada
+    def estatisticas(self, campos, filtro=None):
+        momentos = {campo: Momentos() for campo in campos}
+        for chunk in self.scan(campos, filtro):
+            for campo in campos:
+                momentos[campo].adicionar(chunk[campo])
+        return {
+            campo: {"count": m.n, "media": m.media if m.n else None, "desvio": m.desvio, "min": m.minimo, "max": m.maximo}
+            for campo, m in momentos.items()
+        }
+
+    # Agrupa por uma ou mais chaves na mesma passada. chaves = {nome: campo ou Expressao},
+    # somas = {nome: campo}. Devolve {nome da chave: {valor: {"count": n, <nome da soma>: total}}}.
+    def agregar_por_chave(self, chaves, somas=None, filtro=None):
+        somas = somas or {}
+        calculadas = {nome: chave for nome, chave in chaves.items()
+                      if isinstance(chave, Expressao) or self.calculado(chave)}
+        expressoes = {f"_chave_{nome}": como_expressao(chave) for nome, chave in calculadas.items()}
+        campos_chave = {nome: f"_chave_{nome}" if nome in calculadas else chave for nome, chave in chaves.items()}
+        campos = sorted({c for c in [*campos_chave.values(), *somas.values()] if c not in expressoes})
+        grupos = {nome: {} for nome in chaves}
+        for chunk in self.scan(campos, filtro, expressoes=expressoes):
+            for nome, campo_chave in campos_chave.items():
+                valores, indices = np.unique(chunk[campo_chave], return_inverse=True)
+                totais = {"count": np.bincount(indices, minlength=len(valores))}
+                for nome_soma, campo in somas.items():
+                    total = np.bincount(indices, weights=chunk[campo], minlength=len(valores))
+                    # Somas de campos inteiros continuam inteiras, como no MongoDB
+                    totais[nome_soma] = np.rint(total).astype(np.int64) if chunk[campo].dtype.kind in "iu" else total
+                for i, valor in enumerate(valores.tolist()):
+                    grupo = grupos[nome].setdefault(valor, dict.fromkeys(["count", *somas], 0))
+                    for nome_total, total in totais.items():
+                        grupo[nome_total] += total[i].item()
+        return grupos
+
+    # Numa passada, para cada campo: os momentos e a distribuição (SomasPorFaixa) de todos os fluxos e,
+    # só dos fluxos com condicao = (campo, minimo) satisfeita, as somas ({nome: campo}) por faixa.
+    # Dos fluxos sem a condição saem a quantidade e as somas (Somas).
+    # Devolve (total de fluxos, {campo: Momentos}, {campo: distribuição}, {campo: SomasPorFaixa}, Somas)
+    def faixas_por_condicao(self, campos, somas, condicao, filtro=None):
+        campo_condicao, minimo = condicao
+        momentos = {campo: Momentos() for campo in campos}
+        distribuicoes = {campo: SomasPorFaixa(inteiro=campo not in CAMPOS_DERIVADOS) for campo in campos}
+        faixas = {campo: SomasPorFaixa(somas, inteiro=campo not in CAMPOS_DERIVADOS) for campo in campos}
+        fora = Somas(somas)
+        total = 0
+        for chunk in self.scan(sorted({campo_condicao, *somas.values(), *campos}), filtro):
+            total += len(chunk[campo_condicao])
+            dentro = chunk[campo_condicao] >= minimo
+            fora.adicionar(int((~dentro).sum()), {nome: chunk[campo][~dentro] for nome, campo in somas.items()})
+            somas_dentro = {nome: chunk[campo][dentro] for nome, campo in somas.items()}
+            for campo in campos:
+                valores = chunk[campo]
+                momentos[campo].adicionar(valores)
+                distribuicoes[campo].adicionar(valores, {})
+                faixas[campo].adicionar(valores[dentro], somas_dentro)
+        return total, momentos, distribuicoes, faixas, fora
+
+    # Histograma com limites [l0, l1), [l1, l2), ...: {"count": array, <nome da soma>: array, "fora": n}
+    def histograma(self, campo, limites, somas=None, filtro=None):
+        somas = somas or {}
+        histograma = Histograma(limites, somas)
+        for chunk in self.scan(sorted({campo, *somas.values()}), filtro):
+            histograma.adicionar(chunk[campo], {nome: chunk[campo_soma] for nome, campo_soma in somas.items()})
+        return {
+            "count": histograma.count,
+            **{nome: np.rint(valores).astype(np.int64) for nome, valores in histograma.somas.items()},
+            "fora": histograma.fora,
+        }
+
+    # Os k fluxos com maior valor em "campo" (do maior para o menor), com os campos pedidos
+    # Uma passada guardando no máximo 2k candidatos
+    def top_k(self, campo, k, campos=(), filtro=None):
+        campos = list(dict.fromkeys([*campos, campo]))
+        melhores = None
+        for chunk in self.scan(campos, filtro):
+            chunk = maiores(chunk, campo, k)
+            melhores = chunk if melhores is None else maiores(concatenar(melhores, chunk), campo, k)
+        return documentos_ordenados(melhores, campo)
+
+    # Top-k de cada janela de tempo (largura em ms) numa única passada: {início da janela: [documentos]}
+    def top_k_por_janela(self, campo, k, largura, campos=(), filtro=None):
+        campos = list(dict.fromkeys([*campos, campo, "start"]))
+        melhores = {}
+        for chunk in self.scan(campos, filtro):
+            janelas = chunk["start"] // largura
+            for janela in np.unique(janelas).tolist():
+                selecionados = maiores({c: v[janelas == janela] for c, v in chunk.items()}, campo, k)
+                if janela in melhores:
+                    selecionados = maiores(concatenar(melhores[janela], selecionados), campo, k)
+                melhores[janela] = selecionados
+        return {janela * largura: documentos_ordenados(m, campo) for janela, m in sorted(melhores.items())}
+
+    # Fluxos que começam em [inicio, fim) (ms)
+    def intervalo_tempo(self, inicio, fim, campos, filtro=None):
+        return self.scan(campos, dict(filtro or {}, start=(inicio, fim - 1)))
+
+class MongoFlowStore(FlowStore):
+    nome = "mongo"
+
+    def __init__(self, collection, lote=LOTE_MONGO):
+        self.collection = collection
+        self.lote = lote
+        self.identificador = f"mongo_{collection.database.name}_{collection.name}"
+        self._gravados = None
+
+    def versao(self):
+        return versao_colecao(self.collection)
+
+    # Campos derivados e classes gravados numa versão que ainda é a atual (VersaoColecao.campos_gravados),
+    # lidos uma vez por store
+    def _campos_gravados(self):
+        if self._gravados is None:
+            self._gravados = campos_gravados(self.collection)
+        return self._gravados
+
+    def materializados(self):
+        derivados, classes = self._campos_gravados()
+        return derivados | set(classes["campos"] if classes else ())
+
+    def classes(self):
+        return self._campos_gravados()[1]
+
+    # Valor do campo numa expressão de agregação: o campo gravado ou a expressão que o calcula
+    def _expressao(self, campo):
+        return expressao_mongo(campo) if isinstance(campo, Expressao) or self.calculado(campo) else f"${campo}"
+
+    # Filtro da consulta; limites em campos calculados viram um $expr (sem índice)
+    def _filtro(self, filtro):
+        filtro = filtro or {}
+        consulta = filtro_mongo({campo: limites for campo, limites in filtro.items() if not self.calculado(campo)})
+        condicoes = []
+        for campo, (minimo, maximo) in filtro.items():
+            if self.calculado(campo):
+                if minimo is not None:
+                    condicoes.append({"$gte": [expressao_mongo(campo), minimo]})
+                if maximo is not None:
+                    condicoes.append({"$lte": [expressao_mongo(campo), maximo]})
+        if condicoes:
+            consulta["$expr"] = {"$and": condicoes}
+        return consulta
+
+    # Projeção com os campos derivados (quando não estão gravados) e expressões calculados no servidor
+    def _projecao(self, campos, expressoes):
+        projecao = {"_id": 1 if "_id" in campos else 0}
+        for campo in campos:
+            if campo != "_id":
+                projecao[campo] = self._expressao(campo) if self.calculado(campo) else 1
+        for nome, expressao in (expressoes or {}).items():
+            projecao[nome] = expressao.expressao
+        return projecao
+
+    def scan(self, campos, filtro=None, limite=None, expressoes=None):
+        selecao = [{"$limit": limite}] if limite is not None else []
+        return self._agregar(campos, filtro, selecao, expressoes)
+
+    # No servidor: tamanho usa o $sample (sem filtro e abaixo de 5% da coleção ele lê documentos aleatórios
+    # sem varrer a coleção) e fracao compara um $rand por documento (MongoDB 4.4.2+). A semente não é usada.
+    def amostrar(self, campos, fracao=None, tamanho=None, filtro=None, semente=None, expressoes=None):
+        if (fracao is None) == (tamanho is None):
+            raise ValueError("Informe fracao ou tamanho.")
+        if tamanho is not None:
+            selecao = [{"$sample": {"size": tamanho}}]
+        else:
+            selecao = [{"$match": {"$expr": {"$lt": [{"$rand": {}}, fracao]}}}]
+        return self._agregar(campos, filtro, selecao, expressoes)
+
+    # No servidor: a quantidade de cada estrato num $group (agregar_por_chave) e, em cada estrato, $match no
+    # código + $sample. Só os fluxos amostrados chegam ao cliente; cada estrato é uma leitura da coleção no
+    # servidor (o $match no código não usa índice). A semente não é usada.
+    def amostrar_por_estrato(self, campos, estrato, tamanho, filtro=None, semente=None, expressoes=None):
+        nomes = list(dict.fromkeys([*campos, *(expressoes or {})]))
+        grupos = self.agregar_por_chave({"estrato": estrato}, filtro=filtro)["estrato"]
+        populacao = {int(codigo): grupo["count"] for codigo, grupo in grupos.items()}
+        chunks = []
+        for codigo in sorted(populacao):
+            selecao = [{"$match": {"$expr": {"$eq": [estrato.expressao, codigo]}}}, {"$sample": {"size": tamanho}}]
+            for chunk in self._agregar(campos, filtro, selecao, expressoes):
+                chunks.append(dict(chunk, _estrato=np.full(len(chunk[nomes[0]]), codigo, dtype=np.int64)))
+        if not chunks:
+            return {nome: np.empty(0) for nome in [*nomes, "_estrato"]}, populacao
+        return {nome: np.concatenate([chunk[nome] for chunk in chunks]) for nome in [*nomes, "_estrato"]}, populacao
+
+    # Pipeline $match (filtro) → estágios de seleção → $project, devolvido em chunks
+    def _agregar(self, campos, filtro, selecao, expressoes):
+        pipeline = []
+        if filtro:
+            pipeline.append({"$match": self._filtro(filtro)})
+        pipeline += selecao
+        pipeline.append({"$project": self._projecao(campos, expressoes)})
+        nomes = [*campos, *(expressoes or {})]
+
+        docs = []
+        for doc in self.collection.aggregate(pipeline, batchSize=self.lote, allowDiskUse=True):
+            docs.append(doc)
+            if len(docs) >= self.lote:
+                yield self._para_chunk(docs, nomes)
+                docs = []
+        if docs:
+            yield self._para_chunk(docs, nomes)
+
+    def _para_chunk(self, docs, nomes):
+        chunk = {}
+        for nome in nomes:
+            valores = [doc.get(nome) for doc in docs]
+            chunk[nome] = np.array(valores, dtype=object if nome == "_id" else None)
+        return chunk
+
+    # Com os campos gravados e indexados, contagens por intervalo são respondidas pelo índice;
+    # sem filtro, a contagem vem dos metadados da coleção
+    def contar(self, filtro=None):
+        if not filtro:
+            return self.collection.estimated_document_count()
+        return self.collection.count_documents(self._filtro(filtro))
+
+    # Com índice no campo, o find_one ordenado não varre a coleção
+    def minimo_maximo(self, campo, filtro=None):
+        if self.calculado(campo):
+            resultado = self.estatisticas([campo], filtro)[campo]
+            return resultado["min"], resultado["max"]
+        extremos = []
+        for ordem in (1, -1):
+            doc = self.collection.find_one(self._filtro(filtro), {campo: 1}, sort=[(campo, ordem)])
+            extremos.append(doc[campo] if doc else None)
+        return tuple(extremos)
+
+    def estatisticas(self, campos, filtro=None):
+        grupo = {"_id": None, "count": {"$sum": 1}}
+        for i, campo in enumerate(campos):
+            valor = self._expressao(campo)
+            grupo.update({
+                f"media_{i}": {"$avg": valor},
+                f"desvio_{i}": {"$stdDevPop": valor},
+                f"min_{i}": {"$min": valor},
+                f"max_{i}": {"$max": valor},
+            })
+        pipeline = [{"$match": self._filtro(filtro)}, {"$group": grupo}]
+        res = next(self.collection.aggregate(pipeline, allowDiskUse=True), {"count": 0})
+        return {
+            campo: {
+                "count": res["count"],
+                "media": res.get(f"media_{i}"),
+                "desvio": res.get(f"desvio_{i}"),
+                "min": res.get(f"min_{i}"),
+                "max": res.get(f"max_{i}"),
+            }
+            for i, campo in enumerate(campos)
+        }
+
+    # Todas as chaves num único $facet (uma passada pela coleção)
+    def agregar_por_chave(self, chaves, somas=None, filtro=None):
+        somas = somas or {}
+        facet = {}
+        for nome, chave in chaves.items():
+            grupo = {"_id": self._expressao(chave), "count": {"$sum": 1}}
+            grupo.update({nome_soma: {"$sum": self._expressao(campo)} for nome_soma, campo in somas.items()})
+            facet[nome] = [{"$group": grupo}]
+        pipeline = [{"$match": self._filtro(filtro)}, {"$facet": facet}]
+        resultado = next(self.collection.aggregate(pipeline, allowDiskUse=True))
+        return {
+            nome: {grupo.pop("_id"): grupo for grupo in grupos}
+            for nome, grupos in resultado.items()
+        }
+
+    # Índice da faixa do valor, como em SomasPorFaixa.indice
+    @staticmethod
+    def _expressao_faixa(valor, faixa):
+        valor = {"$max": [valor, 0]}
+        logaritmico = {"$add": [faixa.exatos, {"$floor": {"$divide": [
+            {"$ln": {"$divide": [{"$max": [valor, faixa.exatos]}, faixa.exatos]}}, math.log(faixa.gamma)]}}]}
+        indice = {"$cond": [{"$lt": [valor, faixa.exatos]}, {"$floor": valor}, logaritmico]}
+        return {"$cond": [{"$gt": [valor, 0]}, {"$add": [indice, faixa.zero]}, 0]} if faixa.zero else indice
+
+    # No servidor: cada fluxo vira um documento por campo ($objectToArray + $unwind) e um único $group por
+    # (campo, faixa, condição) calcula quantidade, soma, soma dos quadrados, mínimo, máximo e as somas.
+    # Só os grupos (alguns milhares por campo) vêm para o cliente, que monta os momentos (combinando os
+    # grupos, sem a perda de precisão de Σx² - n·média² sobre a coleção toda) e as faixas.
+    def faixas_por_condicao(self, campos, somas, condicao, filtro=None):
+        campo_condicao, minimo = condicao
+        momentos = {campo: Momentos() for campo in campos}
+        distribuicoes = {campo: SomasPorFaixa(inteiro=campo not in CAMPOS_DERIVADOS) for campo in campos}
+        faixas = {campo: SomasPorFaixa(somas, inteiro=campo not in CAMPOS_DERIVADOS) for campo in campos}
+        fora = Somas(somas)
+        derivados = [campo for campo in campos if campo in CAMPOS_DERIVADOS]
+        projecao = {
+            "_id": 0,
+            "dentro": {"$gte": [self._expressao(campo_condicao), minimo]},
+            "valores": {"$objectToArray": {campo: self._expressao(campo) for campo in campos}},
+            **{f"soma_{nome}": self._expressao(campo) for nome, campo in somas.items()},
+        }
+        valor = "$valores.v"
+        faixa = {"$cond": [{"$in": ["$valores.k", derivados]},
+                           self._expressao_faixa(valor, SomasPorFaixa(inteiro=False)),
+                           self._expressao_faixa(valor, SomasPorFaixa(inteiro=True))]}
+        grupo = {
+            "_id": {"campo": "$valores.k", "faixa": faixa, "dentro": "$dentro"},
+            "count": {"$sum": 1},
+            "soma": {"$sum": valor},
+            "quadrados": {"$sum": {"$multiply": [valor, valor]}},
+            "min": {"$min": valor},
+            "max": {"$max": valor},
+            **{f"soma_{nome}": {"$sum": f"$soma_{nome}"} for nome in somas},
+        }
+        pipeline = [{"$match": self._filtro(filtro)}, {"$project": projecao}, {"$unwind": "$valores"}, {"$group": grupo}]
+
+        grupos = {campo: [] for campo in campos}
+        for doc in self.collection.aggregate(pipeline, allowDiskUse=True):
+            grupos[doc["_id"]["campo"]].append(doc)
+        total = 0
+        for i, campo in enumerate(campos):
+            for dentro in (False, True):
+                docs = [doc for doc in grupos[campo] if doc["_id"]["dentro"] == dentro]
+                if not docs:
+                    continue
+                indices = [int(doc["_id"]["faixa"]) for doc in docs]
+                contagens = [doc["count"] for doc in docs]
+                minimo_grupo, maximo_grupo = min(doc["min"] for doc in docs), max(doc["max"] for doc in docs)
+                distribuicoes[campo].adicionar_faixas(indices, contagens, {}, minimo_grupo, maximo_grupo)
+                if dentro:
+                    faixas[campo].adicionar_faixas(indices, contagens, {nome: [doc[f"soma_{nome}"] for doc in docs]
+                                                                        for nome in somas}, minimo_grupo, maximo_grupo)
+                if i == 0:
+                    total += sum(contagens)
+                    if not dentro:
+                        fora.adicionar(sum(contagens), {nome: np.array([doc[f"soma_{nome}"] for doc in docs]) for nome in somas})
+                for doc in docs:
+                    media = doc["soma"] / doc["count"]
+                    m2 = max(doc["quadrados"] - doc["soma"] * media, 0.0)
+                    momentos[campo].combinar(Momentos(doc["count"], media, m2, doc["min"], doc["max"]))
+        return total, momentos, distribuicoes, faixas, fora
+
+    def histograma(self, campo, limites, somas=None, filtro=None):
+        somas = somas or {}
+        output = {"count": {"$sum": 1}}
+        output.update({nome: {"$sum": self._expressao(campo_soma)} for nome, campo_soma in somas.items()})
+        pipeline = [
+            {"$match": self._filtro(filtro)},
+            {"$bucket": {"groupBy": self._expressao(campo), "boundaries": list(limites),
+                         "default": "fora", "output": output}},
+        ]
+        bins = len(limites) - 1
+        resultado = {nome: np.zeros(bins, dtype=np.int64) for nome in ["count", *somas]}
+        resultado["fora"] = 0
+        posicoes = {limite: i for i, limite in enumerate(limites)}
+        for bucket in self.collection.aggregate(pipeline, allowDiskUse=True):
+            if bucket["_id"] == "fora":
+                resultado["fora"] = bucket["count"]
+                continue
+            for nome in ["count", *somas]:
+                resultado[nome][posicoes[bucket["_id"]]] = bucket[nome]
+        return resultado
+
+    # Índice cuja primeira chave é o campo: o campo está gravado e pode ser lido já em ordem
+    # (o índice de um campo derivado só vale enquanto o campo estiver materializado)
+    def indexado(self, campo):
+        if self.calculado(campo):
+            return False
+        return any(info["key"][0][0] == campo for info in self.collection.index_information().values())
+
+    # Com índice no campo só os k primeiros documentos do índice são lidos. Sem índice o $sort seguido de
+    # $limit roda no servidor como um top-k (guarda só k documentos, sem ordenar a coleção).
+    # Outros campos calculados pedidos são calculados só para os k documentos.
+    def top_k(self, campo, k, campos=(), filtro=None):
+        campos = list(dict.fromkeys([*campos, campo]))
+        if self.indexado(campo) and not any(self.calculado(c) for c in campos):
+            projecao = {"_id": 1 if "_id" in campos else 0, **{c: 1 for c in campos if c != "_id"}}
+            return list(self.collection.find(self._filtro(filtro), projecao).sort(campo, -1).limit(k))
+        pipeline = [{"$match": self._filtro(filtro)}]
+        if self.calculado(campo):
+            pipeline.append({"$addFields": {campo: expressao_mongo(campo)}})
+        pipeline += [{"$sort": {campo: -1}}, {"$limit": k}, {"$project": self._projecao(campos, None)}]
+        return list(self.collection.aggregate(pipeline, allowDiskUse=True))
+
+    # Top-k por janela com $topN (MongoDB 5.2+): cada grupo guarda só k documentos
+    def top_k_por_janela(self, campo, k, largura, campos=(), filtro=None):
+        campos = list(dict.fromkeys([*campos, campo, "start"]))
+        pipeline = [{"$match": self._filtro(filtro)}]
+        calculados = {c: expressao_mongo(c) for c in campos if self.calculado(c)}
+        if calculados:
+            pipeline.append({"$addFields": calculados})
+        pipeline += [
+            {"$group": {
+                "_id": {"$subtract": ["$start", {"$mod": ["$start", largura]}]},
+                "top": {"$topN": {"n": k, "sortBy": {campo: -1}, "output": {c: f"${c}" for c in campos}}},
+            }},
+            {"$sort": {"_id": 1}},
+        ]
+        return {doc["_id"]: doc["top"] for doc in self.collection.aggregate(pipeline, allowDiskUse=True)}
+
+class ColunarFlowStore(FlowStore):
+    nome = "colunar"
+
+    def __init__(self, armazem):
+        self.armazem = armazem
+        self.identificador = f"colunar_{os.path.basename(os.path.normpath(armazem.diretorio))}"
+
+    def versao(self):
+        return self.armazem.versao()
+
+    def materializados(self):
+        return set(self.armazem.colunas) & set(CAMPOS_DERIVADOS)
+
+    def _chunks(self, campos, filtro):
+        for chunk in self.armazem.chunks(campos, self._filtros_chunk(filtro)):
+            mascara = mascara_filtro(chunk, filtro)
+            if mascara is not None:
+                chunk = {campo: valores[mascara] for campo, valores in chunk.items()}
+            yield chunk
+
+    @staticmethod
+    def _filtros_chunk(filtro):
+        return {
+            campo: (-np.inf if minimo is None else minimo, np.inf if maximo is None else maximo)
+            for campo, (minimo, maximo) in (filtro or {}).items()
+        }
+
+    # Campo gravado: os chunks são lidos do maior máximo (metadados) para o menor, e a leitura para quando
+    # o máximo do chunk não supera o k-ésimo maior valor já encontrado. Campos derivados nos resultados
+    # são calculados (se não estiverem gravados) só para os k fluxos escolhidos.
+    def top_k(self, campo, k, campos=(), filtro=None):
+        chunks = self.armazem.meta["chunks"]
+        if self.calculado(campo) or any(self.calculado(c) for c in filtro or {}) or not chunks:
+            return super().top_k(campo, k, campos, filtro)
+        campos = list(dict.fromkeys([*campos, campo]))
+        derivados = [c for c in campos if self.calculado(c)]
+        gravados = {c for c in campos if not self.calculado(c)} | set(filtro or {})
+        gravados.update(c for d in derivados for c in CAMPOS_DERIVADOS[d].campos)
+        filtros_chunk = self._filtros_chunk(filtro)
+
+        melhores = None
+        for meta in sorted(chunks, key=lambda c: -c["max"][campo]):
+            if melhores is not None and len(melhores[campo]) == k and meta["max"][campo] <= melhores[campo].min():
+                break
+            if not self.armazem.cruza(meta, filtros_chunk):
+                continue
+            chunk = self.armazem.ler_chunk(meta, sorted(gravados))
+            mascara = mascara_filtro(chunk, filtro or {})
+            if mascara is not None:
+                chunk = {c: valores[mascara] for c, valores in chunk.items()}
+            chunk = maiores(chunk, campo, k)
+            melhores = chunk if melhores is None else maiores(concatenar(melhores, chunk), campo, k)
+
+        if melhores is None:
+            return []
+        for d in derivados:
+            melhores[d] = CAMPOS_DERIVADOS[d].funcao(melhores)
+        return documentos_ordenados({c: melhores[c] for c in campos}, campo)
+
+    # Sem filtro, o mínimo e o máximo dos campos gravados vêm dos metadados dos chunks
+    def minimo_maximo(self, campo, filtro=None):
+        if filtro or self.calculado(campo):
+            return super().minimo_maximo(campo, filtro)
+        return self.armazem.minimo(campo), self.armazem.maximo(campo)
+
+    def contar(self, filtro=None):
+        if filtro:
+            return super().contar(filtro)
+        return len(self.armazem)
+
+class MemoriaFlowStore(FlowStore):
+    nome = "memoria"
+
+    def __init__(self, colunas, linhas_por_chunk=LINHAS_POR_CHUNK):
+        self.colunas = {campo: np.asarray(valores) for campo, valores in colunas.items()}
+        self.linhas = len(next(iter(self.colunas.values()))) if self.colunas else 0
+        self.linhas_por_chunk = linhas_por_chunk
+
+    # Colunas numéricas a partir de documentos no formato do FluxoFile.to_dict()
+    @classmethod
+    def de_documentos(cls, docs, linhas_por_chunk=LINHAS_POR_CHUNK):
+        campos = [campo for campo, valor in (docs[0].items() if docs else []) if isinstance(valor, (int, float))]
+        return cls({campo: [doc[campo] for doc in docs] for campo in campos}, linhas_por_chunk)
+
+    def materializados(self):
+        return set(self.colunas) & set(CAMPOS_DERIVADOS)
+
+    def _chunks(self, campos, filtro):
+        for inicio in range(0, self.linhas, self.linhas_por_chunk):
+            fim = min(inicio + self.linhas_por_chunk, self.linhas)
+            chunk = {
+                campo: np.arange(inicio, fim) if campo == "_id" else self.colunas[campo][inicio:fim]
+                for campo in campos
+            }
+            mascara = mascara_filtro(chunk, filtro)
+            if mascara is not None:
+                chunk = {campo: valores[mascara] for campo, valores in chunk.items()}
+            yield chunk
+
+# Abre o dataset no backend escolhido ("mongo" ou "colunar")
+def abrir_store(dataset, backend="mongo", uri=MONGO_URI, diretorio_armazem=None):
+    info = obter_dataset(dataset)
+    if backend == "mongo":
+        import pymongo
+        client = pymongo.MongoClient(uri)
+        return MongoFlowStore(client[info["db"]][info["colecao"]])
+    if backend == "colunar":
+        from ArmazemColunar import abrir_armazem, DIRETORIO_ARMAZEM
+        return ColunarFlowStore(abrir_armazem(info["colecao"], diretorio_armazem or DIRETORIO_ARMAZEM))
+    raise ValueError(f"Backend inválido: {backend}. Use {', '.join(BACKENDS)}.")
@@ -0,0 +1,112 @@
+from collections import namedtuple
+import numpy as np
+from FlowStore import CAMPOS_DERIVADOS
+from Estatisticas import Histograma, SomasPorFaixa
+from CacheEstatisticas import obter_momentos
+from Resumos import obter_resumos, LARGURA_RESUMO, CAMPOS_RESUMO, CAMPOS_SOMA
+
+# Vários histogramas numa única passada pelos fluxos. Os limites de cada histograma vêm do mínimo e
+# do máximo do campo, lidos das estatísticas em cache (CacheEstatisticas): uma coleção nova custa uma
+# passada para as estatísticas e outra para os histogramas; depois disso, nenhuma.
+# Um gráfico novo só acrescenta uma Definicao; a passada continua sendo uma só.
+#
+# Sketches (calcular_sketches): histogramas logarítmicos (Estatisticas.SomasPorFaixa) de cada campo por
+# fatia de tempo, calculados uma vez e guardados no cache. Qualquer divisão em faixas, escala ou zoom
+# sai deles (SomasPorFaixa.reagrupar) sem voltar aos fluxos, e as fatias se combinam em qualquer janela.
+# Com resumos incrementais válidos (Resumos.py) os sketches saem das fatias dos resumos, sem passada.
+
+LARGURA_FATIA = 60000  # ms: uma fatia por minuto (um arquivo da CAIDA)
+GAMMA_SKETCH = 1 + 1 / 64  # faixas com ~1,6% de largura relativa acima de Estatisticas.EXATOS
+
+# Histograma de "campo" com "bins" faixas de mesma largura entre o mínimo e o máximo;
+# "somas" = {nome: campo} soma outros campos em cada faixa
+Definicao = namedtuple("Definicao", ["campo", "bins", "somas"])
+
+# Mesmos limites que os gráficos sempre usaram: bins faixas de largura (máximo - mínimo) / bins,
+# com o último limite em máximo + 1 para incluir o máximo
+def limites_lineares(minimo, maximo, bins):
+    passo = (maximo - minimo) / bins
+    return [minimo + i * passo for i in range(bins)] + [maximo + 1]
+
+def chave_histograma(definicao, limites):
+    somas = ",".join(f"{nome}={campo}" for nome, campo in sorted(definicao.somas.items()))
+    return f"histograma/{definicao.campo}/{definicao.bins}/{limites[0]}/{limites[-1]}/{somas}"
+
+# {nome: Histograma} para {nome: Definicao}; os que não estão no cache saem de uma única passada
+def calcular_histogramas(store, definicoes, cache):
+    momentos = obter_momentos(store, sorted({d.campo for d in definicoes.values()}), cache)
+    limites = {
+        nome: limites_lineares(momentos[d.campo].minimo or 0, momentos[d.campo].maximo or 0, d.bins)
+        for nome, d in definicoes.items()
+    }
+
+    faltando = {nome: d for nome, d in definicoes.items() if chave_histograma(d, limites[nome]) not in cache}
+    if faltando:
+        histogramas = {nome: Histograma(limites[nome], d.somas) for nome, d in faltando.items()}
+        campos = sorted({c for d in faltando.values() for c in [d.campo, *d.somas.values()]})
+        for chunk in store.scan(campos):
+            for nome, d in faltando.items():
+                histogramas[nome].adicionar(chunk[d.campo], {soma: chunk[campo] for soma, campo in d.somas.items()})
+        for nome, d in faltando.items():
+            cache.entradas[chave_histograma(d, limites[nome])] = histogramas[nome].para_dict()
+        cache.gravar()
+
+    return {nome: Histograma.de_dict(cache[chave_histograma(d, limites[nome])]) for nome, d in definicoes.items()}
+
+# Limites logarítmicos do mínimo ao máximo + 1 (a primeira faixa começa no mínimo, mesmo que seja 0)
+def limites_logaritmicos(minimo, maximo, bins):
+    limites = np.geomspace(max(minimo, 1), maximo + 1, bins + 1)
+    limites[0] = min(limites[0], minimo)
+    return limites.tolist()
+
+def chave_sketches(campo, somas, largura):
+    somas = ",".join(f"{nome}={c}" for nome, c in sorted(somas.items()))
+    return f"sketch/{campo}/{largura}/{somas}"
+
+def novo_sketch(campo, somas):
+    return SomasPorFaixa(somas, inteiro=campo not in CAMPOS_DERIVADOS, gamma=GAMMA_SKETCH)
+
+# {campo: {fatia: SomasPorFaixa}}, com a fatia = start // largura; "somas" = {nome: campo} é somado por faixa.
+# Os campos que não estão no cache saem dos resumos incrementais ou de uma única passada.
+def calcular_sketches(store, campos, somas, cache, largura=LARGURA_FATIA):
+    faltando = [campo for campo in campos if chave_sketches(campo, somas, largura) not in cache]
+    resumos = None
+    if faltando and largura == LARGURA_RESUMO and set(faltando) <= set(CAMPOS_RESUMO) and set(somas.values()) <= set(CAMPOS_SOMA):
+        resumos = obter_resumos(store)
+    if resumos is not None:
+        for campo in faltando:
+            cache.entradas[chave_sketches(campo, somas, largura)] = {
+                str(fatia): resumo.sketch(campo, somas).para_dict() for fatia, resumo in resumos.items()
+            }
+        cache.gravar()
+    elif faltando:
+        sketches = {campo: {} for campo in faltando}
+        for chunk in store.scan(sorted({"start", *faltando, *somas.values()})):
+            fatias = chunk["start"] // largura
+            for fatia in np.unique(fatias).tolist():
+                selecionados = fatias == fatia
+                somas_fatia = {nome: chunk[c][selecionados] for nome, c in somas.items()}
+                for campo in faltando:
+                    sketch = sketches[campo].setdefault(fatia, novo_sketch(campo, somas))
+                    sketch.adicionar(chunk[campo][selecionados], somas_fatia)
+        for campo in faltando:
+            cache.entradas[chave_sketches(campo, somas, largura)] = {
+                str(fatia): sketch.para_dict() for fatia, sketch in sketches[campo].items()
+            }
+        cache.gravar()
+
+    return {
+        campo: {int(fatia): SomasPorFaixa.de_dict(dados) for fatia, dados in cache[chave_sketches(campo, somas, largura)].items()}
+        for campo in campos
+    }
+
+# Junta as fatias num único sketch; inicio/fim (em ms) limitam às fatias inteiramente dentro de [inicio, fim)
+def combinar_fatias(fatias, largura=LARGURA_FATIA, inicio=None, fim=None):
+    combinado = None
+    for fatia, sketch in sorted(fatias.items()):
+        if (inicio is not None and fatia * largura < inicio) or (fim is not None and (fatia + 1) * largura > fim):
+            continue
+        if combinado is None:
+            combinado = SomasPorFaixa(sketch.campos_soma, sketch.inteiro, sketch.exatos, sketch.gamma)
+        combinado.combinar(sketch)
+    return combinado
@@ -0,0 +1,143 @@
+import argparse
+import contextlib
+import importlib
+import io
+import json
+import os
+import sys
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+import pandas as pd
+from FlowStore import DATASETS, BACKENDS
+from Datasets import DATASETS_LOTE
+
+# Execução em lote, sem interação: cada análise selecionada roda em cada dataset selecionado como um job
+# separado num pool de processos. Os jobs são independentes (cada um abre o seu store e faz as suas passadas),
+# então o relatório completo leva o tempo do dataset mais lento, não a soma de todos.
+# A saída de cada job vai para um log próprio em DIRETORIO_LOTE e o tempo de cada um fica no resumo.
+
+# Análise: módulo com main(dataset, backend, ...)
+ANALISES = {
+    "proporcoes": "Proporcoes",
+    "relacoes": "Relacoes",
+    "trafego": "Trafego",
+    "maior_taxa": "MaiorTaxa",
+}
+CLASSIFICACOES = ["volume", "duracao", "taxa"]  # classificações do Proporcoes.py em lote
+DIRETORIO_LOTE = "Saida/Lote"
+WORKERS = max(1, (os.cpu_count() or 1) - 1)
+
+today_str = datetime.now().strftime('%Y%m%d')
+
+def log(msg):
+    print(f"[{datetime.now().strftime('%H:%M:%S')}] {msg}", flush=True)
+
+# Roda um job no processo do pool com a saída redirecionada para o log do job
+def executar_job(job):
+    import matplotlib
+    matplotlib.use("Agg")  # sem janela: os gráficos só são gravados
+
+    # Os jobs já rodam em paralelo: cada um desenha os seus gráficos com a sua parte dos processadores
+    importlib.import_module("Renderizacao").WORKERS = job["workers_render"]
+
+    inicio = time.time()
+    erro = None
+    with open(job["log"], "w", encoding="utf-8") as arquivo, \
+            contextlib.redirect_stdout(arquivo), contextlib.redirect_stderr(arquivo):
+        try:
+            modulo = importlib.import_module(ANALISES[job["analise"]])
+            if job["analise"] == "proporcoes":
+                modulo.main(job["dataset"], job["backend"], selecionados=job["classificacoes"])
+            elif job["analise"] == "maior_taxa":
+                pasta = os.path.join(DATASETS[job["dataset"]]["graficos"], "MaiorTaxa")
+                os.makedirs(pasta, exist_ok=True)
+                modulo.main(job["dataset"], job["backend"],
+                            arquivo=os.path.join(pasta, f"{today_str}_{modulo.nome_arquivo()}"))
+            else:
+                modulo.main(job["dataset"], job["backend"])
+        except Exception as e:
+            traceback.print_exc()
+            erro = f"{type(e).__name__}: {e}"
+    return {**job, "tempo": time.time() - inicio, "erro": erro}
+
+# Configuração: os argumentos da linha de comando têm prioridade sobre o arquivo --config (JSON com as
+# mesmas chaves: analises, datasets, backend, classificacoes, workers)
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Roda as análises selecionadas em todos os datasets selecionados, em paralelo.")
+    parser.add_argument("--config", help="Arquivo JSON com as opções (os argumentos abaixo têm prioridade)")
+    parser.add_argument("--analises", nargs="+", choices=sorted(ANALISES), help="Padrão: todas")
+    parser.add_argument("--datasets", nargs="+", choices=sorted(DATASETS), help=f"Padrão: {' '.join(DATASETS_LOTE)}")
+    parser.add_argument("--backend", choices=BACKENDS, help="Padrão: mongo")
+    parser.add_argument("--classificacoes", nargs="+", choices=CLASSIFICACOES, help="Classificações do Proporcoes.py (padrão: todas)")
+    parser.add_argument("--workers", type=int, help=f"Processos do pool (padrão: {WORKERS})")
+    args = parser.parse_args(argv)
+
+    config = {}
+    if args.config:
+        with open(args.config, "r", encoding="utf-8") as file:
+            config = json.load(file)
+    padroes = {"analises": list(ANALISES), "datasets": list(DATASETS_LOTE), "backend": "mongo",
+               "classificacoes": CLASSIFICACOES, "workers": WORKERS}
+    for chave, padrao in padroes.items():
+        if getattr(args, chave) is None:
+            setattr(args, chave, config.get(chave, padrao))
+
+    for chave, validos in (("analises", ANALISES), ("datasets", DATASETS), ("classificacoes", CLASSIFICACOES)):
+        invalidos = [v for v in getattr(args, chave) if v not in validos]
+        if invalidos:
+            parser.error(f"{chave} inválidos: {', '.join(invalidos)}. Use {', '.join(validos)}.")
+    if args.backend not in BACKENDS:
+        parser.error(f"Backend inválido: {args.backend}. Use {', '.join(BACKENDS)}.")
+    return args
+
+def main(argv=None):
+    args = parse_args(argv)
+    pasta = os.path.join(DIRETORIO_LOTE, today_str)
+    os.makedirs(pasta, exist_ok=True)
+
+    jobs = [
+        {"dataset": dataset, "analise": analise, "backend": args.backend, "classificacoes": args.classificacoes,
+         "log": os.path.join(pasta, f"{dataset}_{analise}.log")}
+        for dataset in args.datasets for analise in args.analises
+    ]
+    workers = max(1, min(args.workers, len(jobs)))
+    for job in jobs:
+        job["workers_render"] = max(1, (os.cpu_count() or 1) // workers)
+    log(f"Lote: {len(jobs)} job(s) ({', '.join(args.analises)} × {', '.join(args.datasets)}), "
+        f"{workers} worker(s), backend {args.backend}")
+
+    inicio = time.time()
+    resultados = []
+    with ProcessPoolExecutor(workers) as pool:
+        futuros = [pool.submit(executar_job, job) for job in jobs]
+        for futuro in as_completed(futuros):
+            resultado = futuro.result()
+            resultados.append(resultado)
+            estado = f"erro ({resultado['erro']})" if resultado["erro"] else "ok"
+            log(f"  {resultado['dataset']}/{resultado['analise']}: {estado} em {resultado['tempo']:.2f} s")
+    tempo_total = time.time() - inicio
+
+    relatorio(resultados, tempo_total, os.path.join(pasta, "tempos.csv"))
+    return 1 if any(r["erro"] for r in resultados) else 0
+
+# Tempo de cada job, soma dos tempos (execução sequencial) e tempo real do lote
+def relatorio(resultados, tempo_total, caminho):
+    df = pd.DataFrame([
+        {"dataset": r["dataset"], "analise": r["analise"], "tempo_s": round(r["tempo"], 2),
+         "estado": "erro" if r["erro"] else "ok", "log": r["log"]}
+        for r in sorted(resultados, key=lambda r: (r["dataset"], r["analise"]))
+    ])
+    df.to_csv(caminho, index=False)
+
+    log("Resumo por job:")
+    for linha in df.itertuples():
+        log(f"  {linha.dataset:<10} {linha.analise:<12} {linha.tempo_s:>10.2f} s  {linha.estado}")
+    log("Por dataset: " + ", ".join(f"{dataset} {tempo:.2f} s" for dataset, tempo in df.groupby("dataset")["tempo_s"].sum().items()))
+    log(f"Soma dos jobs: {df['tempo_s'].sum():.2f} s; tempo real do lote: {tempo_total:.2f} s")
+    log(f"Tempos em {caminho}; logs em {os.path.dirname(caminho)}")
+
+if __name__ == "__main__":
+    sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
+    sys.exit(main())
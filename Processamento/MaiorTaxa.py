@@ -1,34 +1,41 @@
-from pymongo import MongoClient
-import pandas as pd
+import csv
+from FlowStore import abrir_store
 
-# Conexão com o MongoDB
-client = MongoClient("mongodb://localhost:27017/")
-db = client["fluxos_database"]  # Altere se necessário
-collection = db["mawi_collection"]  # Altere se necessário
+DATASET = "mawi"  # "caida", "mawi" ou "mawi2025" (ver FlowStore.DATASETS)
+BACKEND = "mongo"  # "mongo" ou "colunar" (armazém local gerado com Ingestao.py --armazem)
+CAMPO = "rate"  # "rate" (maiores taxas), "nbytes_total" (maiores volumes) ou "duration" (mais longos)
+LIMITE = 5  # opcional: limita para os 100 maiores
+JANELA = None  # opcional: largura em ms (ex.: 60000) para os maiores de cada janela de tempo
 
-# Pipeline de agregação
-pipeline = [
-    {"$match": {"duration": {"$gt": 0}}},  # evita divisão por zero
-    {"$addFields": {
-        "rate": {
-            "$divide": ["$nbytes_total", {"$divide": ["$duration", 1000]}]  # bytes / segundos
-        }
-    }},
-    {"$sort": {"rate": -1}},  # ordena do maior para o menor
-    {"$limit": 5}  # opcional: limita para os 100 maiores
-]
+# Maiores valores, do maior para o menor, numa única passada que guarda só LIMITE fluxos
+# (ou direto pelo índice do MongoDB quando o campo está gravado e indexado).
+# duration > 0 evita divisão por zero na taxa.
+# Sem arquivo o CSV vai para a pasta atual (o Lote.py passa um arquivo na pasta de gráficos do dataset).
+# O CSV é gravado com o módulo csv (sem pandas), para a consulta começar rápido.
+def main(dataset=DATASET, backend=BACKEND, arquivo=None, campo=CAMPO, limite=LIMITE, janela=JANELA):
+    store = abrir_store(dataset, backend)
 
-# Executa a agregação
-results = list(collection.aggregate(pipeline))
+    colunas = ["_id", "npackets_total", "nbytes_total", "duration", "rate"]
+    filtro = {"duration": (1, None)} if campo == "rate" else None
+    if janela:
+        resultados = store.top_k_por_janela(campo, limite, janela, colunas, filtro=filtro)
+        linhas = [{"janela": inicio, **doc} for inicio, docs in resultados.items() for doc in docs]
+        colunas = ["janela", *colunas]
+    else:
+        linhas = store.top_k(campo, limite, colunas, filtro=filtro)
 
-# Converte para DataFrame
-df = pd.DataFrame(results)
+    # Salva em CSV (só as colunas relevantes)
+    if arquivo is None:
+        arquivo = nome_arquivo(campo)
+    with open(arquivo, "w", newline="", encoding="utf-8") as file:
+        escritor = csv.writer(file, lineterminator="\n")
+        escritor.writerow(colunas)
+        escritor.writerows([linha.get(coluna, "") for coluna in colunas] for linha in linhas)
 
-# Seleciona colunas relevantes
-colunas = ["_id", "npackets_total", "nbytes_total", "duration", "rate"]
-df = df[colunas]
+    print(f"Arquivo '{arquivo}' criado com sucesso.")
 
-# Salva em CSV
-df.to_csv("top_rates.csv", index=False)
+def nome_arquivo(campo=CAMPO):
+    return "top_rates.csv" if campo == "rate" else f"top_{campo}.csv"
 
-print("Arquivo 'top_rates.csv' criado com sucesso.")
+if __name__ == "__main__":
+    main()
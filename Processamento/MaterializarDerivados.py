@@ -0,0 +1,88 @@
+import argparse
+import sys
+import io
+import time
+from datetime import datetime
+from FlowStore import abrir_store, DATASETS, BACKENDS, MongoFlowStore
+from CacheEstatisticas import CacheEstatisticas, obter_estatisticas
+from Classificacao import (CLASSIFICACOES, CAMPOS_THRESHOLDS, MODO_THRESHOLD, MODOS_THRESHOLD, calcular_thresholds,
+                           campo_classe, expressao_classificacao)
+from CamposDerivados import MATERIALIZAVEIS, ATUALIZACAO_DERIVADOS, criar_indices
+from VersaoColecao import marcar_derivados, marcar_classes
+from ArmazemColunar import EscritorColunar
+
+# Backfill dos campos derivados (rate, avg_pkt_size) em coleções e armazéns que já existem, para que as
+# análises leiam o campo gravado em vez de calculá-lo em cada documento. No MongoDB:
+#   1. update_many com pipeline: o servidor calcula os campos a partir do próprio documento (sem trazer
+#      os fluxos para o Python);
+#   2. índices nos campos (top-k pelo índice no MaiorTaxa, contagens por intervalo com FlowStore.contar);
+#   3. registra em versoes_colecoes a versão em que os campos ficaram completos. Qualquer escrita
+#      posterior sem os campos derivados invalida o registro e as análises voltam a calcular.
+# --classes grava também a categoria de cada classificação (classe_volume, classe_duracao, classe_taxa)
+# com os thresholds da versão atual; como eles dependem da coleção toda, qualquer escrita os invalida.
+# No armazém colunar os campos viram colunas float64 com mínimo/máximo por chunk (sem classes).
+
+def log(msg):
+    print(f"[{datetime.now().strftime('%H:%M:%S')}] {msg}", flush=True)
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Grava os campos derivados (e as classes) nos fluxos existentes.")
+    parser.add_argument("--dataset", choices=sorted(DATASETS), required=True)
+    parser.add_argument("--backend", choices=BACKENDS, default="mongo")
+    parser.add_argument("--classes", action="store_true", help="Grava também as classes de cada fluxo (só MongoDB)")
+    parser.add_argument("--modo", choices=MODOS_THRESHOLD, default=MODO_THRESHOLD,
+                        help=f"Critério dos thresholds das classes (padrão: {MODO_THRESHOLD})")
+    parser.add_argument("--apenas-ausentes", action="store_true",
+                        help="Só calcula os documentos sem os campos (quando as escritas desde o último backfill "
+                             "foram só inserções); por padrão todos são recalculados")
+    return parser.parse_args(argv)
+
+def materializar_mongo(store, apenas_ausentes=False):
+    collection = store.collection
+    if set(MATERIALIZAVEIS) <= store.materializados():
+        log("Campos derivados já gravados na versão atual da coleção.")
+    else:
+        filtro = {"$or": [{campo: {"$exists": False}} for campo in MATERIALIZAVEIS]} if apenas_ausentes else {}
+        inicio = time.time()
+        resultado = collection.update_many(filtro, ATUALIZACAO_DERIVADOS)
+        log(f"Campos derivados gravados em {resultado.modified_count} documentos em {time.time() - inicio:.2f} s")
+        marcar_derivados(collection, MATERIALIZAVEIS)
+    log(f"Índices: {', '.join(criar_indices(collection, MATERIALIZAVEIS))}")
+
+# Classes com os thresholds da versão atual (estatísticas do cache da coleção)
+def materializar_classes(store, modo):
+    collection = store.collection
+    campos = sorted(set(CAMPOS_THRESHOLDS.values()))
+    momentos, distribuicoes = obter_estatisticas(store, campos, CacheEstatisticas(store))
+    thresholds = calcular_thresholds(momentos, distribuicoes, modo)
+    log(f"Thresholds ({modo}): " + ", ".join(f"{nome} {valor:.2f}" for nome, valor in thresholds.items()))
+
+    classes = {campo_classe(s): expressao_classificacao(s, thresholds, f"${c['campo']}")
+               for s, c in CLASSIFICACOES.items()}
+    inicio = time.time()
+    resultado = collection.update_many({}, [{"$set": classes}])
+    log(f"Classes gravadas em {resultado.modified_count} documentos em {time.time() - inicio:.2f} s")
+    marcar_classes(collection, classes, modo, thresholds)
+    log(f"Índices: {', '.join(criar_indices(collection, classes))}")
+
+def main(argv=None):
+    args = parse_args(argv)
+    store = abrir_store(args.dataset, args.backend)
+    if args.backend == "colunar":
+        if args.classes:
+            log("Classes não são gravadas no armazém colunar; gravando só os campos derivados.")
+        inicio = time.time()
+        with EscritorColunar(store.armazem.diretorio, derivados=True) as escritor:
+            total = escritor.linhas
+        log(f"Campos derivados de {total} fluxos gravados em {time.time() - inicio:.2f} s")
+        return
+
+    log(f"Coleção: {store.collection.name}")
+    materializar_mongo(store, args.apenas_ausentes)
+    if args.classes:
+        # Store novo: as estatísticas das classes já leem os campos recém-gravados
+        materializar_classes(MongoFlowStore(store.collection), args.modo)
+
+if __name__ == "__main__":
+    sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
+    main()
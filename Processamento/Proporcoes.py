@@ -1,340 +1,335 @@
 from datetime import datetime
-import matplotlib.pyplot as plt
-import pymongo
 import pandas as pd
 import os
+from FlowStore import abrir_store, obter_dataset
+from Estatisticas import SomasPorFaixa, Somas, EXATOS, GAMMA
+from Classificacao import (CLASSIFICACOES, MINIMO_PACOTES, resolver_faixas, calcular_thresholds, descricao_modo,
+                           classificar, categorias)
+from CacheEstatisticas import CacheEstatisticas, obter_estatisticas, chave_momentos, chave_distribuicao
+from Resumos import obter_resumos, resumo_total
+from Renderizacao import Figura, renderizar
+from Amostragem import amostra_aleatoria, amostra_estratificada, estrato_tempo, NIVEL
 
 # Configurações gerais
-DATABASE = 1  # 1 para CAIDA, 2 para MAWI, 3 para MAWI 2025
-
-if DATABASE == 1:
-    PATH_GRAPHS = "Saida/Graficos/AnaliseCaida/Proporcoes"
-    NAME = "CAIDA 2019"
-    DB_NAME = "fluxos_database"
-    COLLECTION_NAME = "caida_collection"
-elif DATABASE == 2:
-    PATH_GRAPHS = "Saida/Graficos/AnaliseMAWI/Proporcoes"
-    NAME = "MAWI 2019"
-    DB_NAME = "fluxos_database"
-    COLLECTION_NAME = "mawi_collection"
-elif DATABASE == 3:
-    PATH_GRAPHS = "Saida/Graficos/AnaliseMAWI2025/Proporcoes"
-    NAME = "MAWI 2025"
-    DB_NAME = "fluxos_database"
-    COLLECTION_NAME = "mawi2025_collection"
-else:
-    raise ValueError("Banco de dados inválido. Use 1 para CAIDA, 2 para MAWI 2019 ou 3 para MAWI 2025.")
-
-os.makedirs(PATH_GRAPHS, exist_ok=True)
-today_str = datetime.now().strftime('%Y%m%d')
-
-# Pergunta classificações no terminal
-print("Selecione as classificações (separe por vírgula):", flush=True)
-print("1 - Volume (Elefante/Rato)", flush=True)
-print("2 - Duração (Libélula/Tartaruga)", flush=True)
-print("3 - Taxa (Chita/Caracol)", flush=True)
-opcoes = input("Digite os números das classificações (ex: 1,3): ")
+DATASET = "caida"  # "caida", "mawi" ou "mawi2025" (ver FlowStore.DATASETS)
+BACKEND = "mongo"  # "mongo" ou "colunar" (armazém local gerado com Ingestao.py --armazem)
 
-mapa = {"1": "volume", "2": "duracao", "3": "taxa"}
-selecionados = [mapa[o.strip()] for o in opcoes.split(",") if o.strip() in mapa]
+# Pasta e nome do dataset nos gráficos (definidos em main)
+PATH_GRAPHS = None
+NAME = None
 
-print("Classificações selecionadas:", ", ".join(selecionados), flush=True)
+today_str = datetime.now().strftime('%Y%m%d')
 
-# Hiperparâmetros (ajuste conforme necessidade)
-RATO_THRESHOLD = 155  # 130 bytes
-LIBELULA_THRESHOLD = 330  # 1 segundo (em ms)
+# Hiperparâmetros (ajuste conforme necessidade; Rato e Libélula ficam em Classificacao.py)
 MINIMUM_NPACKETS = 3  # mínimo de pacotes para considerar classificação
+MODO_THRESHOLD = "sigma"  # "sigma" (média + 3σ) ou "percentil" (p99; ver Classificacao.py)
 
-client = pymongo.MongoClient("mongodb://localhost:27017/")
-db = client[DB_NAME]
-collection = db[COLLECTION_NAME]
+# Prévia numa amostra (Amostragem.py): thresholds, contagens e médias estimados com intervalos de confiança,
+# sem cache, com as saídas em <graficos>/Proporcoes/Amostra. Para o relatório final deixe os dois em None.
+AMOSTRA = None  # fração dos fluxos na amostra uniforme (ex.: 0.001)
+ESTRATOS = None  # "tempo": amostra estratificada com até POR_ESTRATO fluxos por fatia de LARGURA_ESTRATO ms
+POR_ESTRATO = 1000
+LARGURA_ESTRATO = 60000
 
 def log(msg):
     print(f"[{datetime.now().strftime('%H:%M:%S')}] {msg}", flush=True)
 
-# Estatísticas para cálculo de thresholds
-stats_project = {"_id": None}
-if "volume" in selecionados:
-    stats_project.update({
-        "avg_bytes": {"$avg": "$nbytes_total"},
-        "std_bytes": {"$stdDevPop": "$nbytes_total"},
-    })
-if "duracao" in selecionados:
-    stats_project.update({
-        "avg_duration": {"$avg": "$duration"},
-        "std_duration": {"$stdDevPop": "$duration"},
-    })
-if "taxa" in selecionados:
-    stats_project.update({
-        "avg_rate": {"$avg": {"$cond": [
-            {"$gt": ["$duration", 0]},
-            {"$divide": ["$nbytes_total", {"$divide": ["$duration", 1000]}]},
-            0
-        ]}},
-        "std_rate": {"$stdDevPop": {"$cond": [
-            {"$gt": ["$duration", 0]},
-            {"$divide": ["$nbytes_total", {"$divide": ["$duration", 1000]}]},
-            0
-        ]}},
-    })
-
-stats = collection.aggregate([
-    {"$group": stats_project}
-])
-res = next(stats)
-
-# Cálculo de thresholds com base nos valores reais
-elefante_thresh = res.get("avg_bytes", 0) + 3 * res.get("std_bytes", 0)
-tartaruga_thresh = res.get("avg_duration", 0) + 3 * res.get("std_duration", 0)
-chita_thresh = res.get("avg_rate", 0) + 3 * res.get("std_rate", 0)
-CARACOL_RATE_THRESHOLD = res.get("avg_rate", 0) - res.get("std_rate", 0)
-if CARACOL_RATE_THRESHOLD < 0:
-    CARACOL_RATE_THRESHOLD = 20  # 16KB/s fallback
-
-log("Thresholds calculados:")
-log(f"  Elefante ≥ {elefante_thresh:.2f} bytes; ")
-log(f"  Rato < {RATO_THRESHOLD} bytes; ")
-log(f"  Tartaruga ≥ {tartaruga_thresh:.2f} ms; ")
-log(f"  Libélula < {LIBELULA_THRESHOLD} ms; ")
-log(f"  Caracol < taxa {CARACOL_RATE_THRESHOLD} B/s; ")
-log(f"  Chita ≥ taxa {chita_thresh:.2f} B/s")
-log("Médias: ")
-log(f"  nbytes_total: {res.get('avg_bytes', 0):.2f} bytes")
-log(f"  duration: {res.get('avg_duration', 0):.2f} ms")
-log(f"  taxa: {res.get('avg_rate', 0):.2f} B/s")
-log("Desvios padrão: ")
-log(f"  nbytes_total: {res.get('std_bytes', 0):.2f} bytes")
-log(f"  duration: {res.get('std_duration', 0):.2f} ms")    
-log(f"  taxa: {res.get('std_rate', 0):.2f} B/s")
-
-project = {
-    "duration": 1,
-    "nbytes_total": 1,
-    "npackets_total": 1,
-}
-if "taxa" in selecionados:
-    project["rate"] = {
-        "$cond": [
-            {"$gt": ["$duration", 0]},
-            {"$divide": ["$nbytes_total", {"$divide": ["$duration", 1000]}]},
-            0
-        ]
-    }
-if "volume" in selecionados:
-    project["tipo_volume"] = {
-        "$cond": [
-            {"$lt": ["$npackets_total", MINIMUM_NPACKETS]},
-            "Normal",
-            {"$switch": {
-                "branches": [
-                    {"case": {"$gte": ["$nbytes_total", elefante_thresh]}, "then": "Elefante"},
-                    {"case": {"$lt": ["$nbytes_total", RATO_THRESHOLD]}, "then": "Rato"},
-                ],
-                "default": "Normal"
-            }}
-        ]
-    }
-if "duracao" in selecionados:
-    project["tipo_duracao"] = {
-        "$cond": [
-            {"$lt": ["$npackets_total", MINIMUM_NPACKETS]},
-            "Normal",
-            {"$switch": {
-                "branches": [
-                    {"case": {"$lt": ["$duration", LIBELULA_THRESHOLD]}, "then": "Libélula"},
-                    {"case": {"$gte": ["$duration", tartaruga_thresh]}, "then": "Tartaruga"},
-                ],
-                "default": "Normal"
-            }}
-        ]
-    }
-if "taxa" in selecionados:
-    project["tipo_taxa"] = {
-        "$cond": [
-            {"$lt": ["$npackets_total", MINIMUM_NPACKETS]},
-            "Normal",
-            {"$switch": {
-                "branches": [
-                    {
-                        "case": 
-                        {
-                            "$lt": [
-                                {
-                                    "$cond": [
-                                        {"$gt": ["$duration", 0]},
-                                        {"$divide": ["$nbytes_total", {"$divide": ["$duration", 1000]}]},
-                                        0
-                                    ]
-                                }, CARACOL_RATE_THRESHOLD
-                            ]
-                        }, "then": "Caracol"},
-                    {
-                        "case": 
-                        {
-                            "$gte": [
-                                {
-                                    "$cond": [
-                                        {"$gt": ["$duration", 0]},
-                                        {"$divide": ["$nbytes_total", {"$divide": ["$duration", 1000]}]},
-                                        0
-                                    ]
-                                }, chita_thresh
-                            ]
-                        }, "then": "Chita"},
-                ],
-                "default": "Normal"
-            }}
-        ]
-    }
-
-facet = {"total_fluxos": [{"$count": "count"}]}
-if "volume" in selecionados:
-    facet["contagem_volume"] = [{"$group": {"_id": "$tipo_volume", "count": {"$sum": 1}}}]
-    facet["medias_volume"] = [{
-        "$group": {
-            "_id": "$tipo_volume",
-            "media_duration": {"$avg": "$duration"},
-            "media_bytes": {"$avg": "$nbytes_total"},
-            "media_packets": {"$avg": "$npackets_total"},
-        }
-    }]
-if "duracao" in selecionados:
-    facet["contagem_duracao"] = [{"$group": {"_id": "$tipo_duracao", "count": {"$sum": 1}}}]
-    facet["medias_duracao"] = [{
-        "$group": {
-            "_id": "$tipo_duracao",
-            "media_duration": {"$avg": "$duration"},
-            "media_bytes": {"$avg": "$nbytes_total"},
-            "media_packets": {"$avg": "$npackets_total"},
-        }
-    }]
-if "taxa" in selecionados:
-    facet["contagem_taxa"] = [{"$group": {"_id": "$tipo_taxa", "count": {"$sum": 1}}}]
-    facet["medias_taxa"] = [{
-        "$group": {
-            "_id": "$tipo_taxa",
-            "media_duration": {"$avg": "$duration"},
-            "media_bytes": {"$avg": "$nbytes_total"},
-            "media_packets": {"$avg": "$npackets_total"},
-            "media_rate": {"$avg": "$rate"},
-        }
-    }]
-
-pipeline = [
-    {"$project": project},
-    {"$facet": facet}
-]
-
-log("Executando agregação...")
-result = list(collection.aggregate(pipeline))[0]
+# Pergunta classificações no terminal (execução interativa; o Lote.py passa as classificações em main)
+def perguntar_classificacoes():
+    print("Selecione as classificações (separe por vírgula):", flush=True)
+    print("1 - Volume (Elefante/Rato)", flush=True)
+    print("2 - Duração (Libélula/Tartaruga)", flush=True)
+    print("3 - Taxa (Chita/Caracol)", flush=True)
+    opcoes = input("Digite os números das classificações (ex: 1,3): ")
+
+    mapa = {"1": "volume", "2": "duracao", "3": "taxa"}
+    return [mapa[o.strip()] for o in opcoes.split(",") if o.strip() in mapa]
+
+# Uma única passada pelos fluxos (FlowStore.faixas_por_condicao; no MongoDB, um $group no servidor): momentos
+# e distribuição de cada campo classificado (para os thresholds) e, para os fluxos com pacotes suficientes,
+# a quantidade e as somas por faixa de valor (para as categorias).
+# Fluxos com menos de MINIMUM_NPACKETS pacotes são sempre "Normal" e só entram nas somas gerais.
+# Tudo fica no cache da coleção; a passada só acontece quando falta alguma das classificações pedidas.
+# Com resumos incrementais válidos (Resumos.py, mesmo mínimo de pacotes) as mesmas entradas saem dos resumos.
+SOMAS = {"duration": "duration", "bytes": "nbytes_total", "packets": "npackets_total", "rate": "rate"}
+CHAVE_GERAL = f"proporcoes/geral_min{MINIMUM_NPACKETS}"
+
+def chave_faixas(selecao):
+    return f"proporcoes/faixas_{selecao}_min{MINIMUM_NPACKETS}"
+
+def campo_da(selecao):
+    return CLASSIFICACOES[selecao]["campo"]
+
+def calcular_faixas(store, cache, selecionados):
+    faltando = [s for s in selecionados
+                if any(chave not in cache for chave in (chave_faixas(s), chave_momentos(campo_da(s)), chave_distribuicao(campo_da(s))))]
+    resumos = None
+    if (faltando or CHAVE_GERAL not in cache) and MINIMUM_NPACKETS == MINIMO_PACOTES:
+        resumos = obter_resumos(store)
+    if resumos is not None:
+        log("Lendo os resumos incrementais da coleção...")
+        total = resumo_total(resumos)
+        for s in faltando:
+            cache.entradas[chave_momentos(campo_da(s))] = total.momentos[campo_da(s)].para_dict()
+            cache.entradas[chave_distribuicao(campo_da(s))] = total.distribuicao(campo_da(s)).para_dict()
+            cache.entradas[chave_faixas(s)] = total.sketch(campo_da(s), SOMAS, "suficientes").para_dict()
+        cache.entradas[CHAVE_GERAL] = {"total_fluxos": total.n, "poucos_pacotes": total.somas("poucos", SOMAS).para_dict()}
+        cache.gravar()
+    elif faltando or CHAVE_GERAL not in cache:
+        faltando = faltando or selecionados[:1]
+        log("Percorrendo os fluxos (passada única)...")
+        total_fluxos, momentos, distribuicoes, faixas, poucos_pacotes = store.faixas_por_condicao(
+            [campo_da(s) for s in faltando], SOMAS, ("npackets_total", MINIMUM_NPACKETS))
+
+        for s in faltando:
+            cache.entradas[chave_momentos(campo_da(s))] = momentos[campo_da(s)].para_dict()
+            cache.entradas[chave_distribuicao(campo_da(s))] = distribuicoes[campo_da(s)].para_dict()
+            cache.entradas[chave_faixas(s)] = faixas[campo_da(s)].para_dict()
+        cache.entradas[CHAVE_GERAL] = {"total_fluxos": total_fluxos, "poucos_pacotes": poucos_pacotes.para_dict()}
+        cache.gravar()
+    else:
+        log("Estatísticas lidas do cache (a coleção não mudou desde o último cálculo).")
+
+# Amostra da prévia com os campos de SOMAS e o número de pacotes
+def obter_amostra(store, amostra, estratos):
+    campos = sorted({"npackets_total", *SOMAS.values()})
+    if estratos == "tempo":
+        log(f"Amostrando até {POR_ESTRATO} fluxos por fatia de {LARGURA_ESTRATO} ms (passada única)...")
+        return amostra_estratificada(store, campos, estrato_tempo(LARGURA_ESTRATO), POR_ESTRATO)
+    if estratos is not None:
+        raise ValueError(f"Estratos inválidos: {estratos}. Use \"tempo\" ou None.")
+    log(f"Amostrando {amostra:.4%} dos fluxos...")
+    return amostra_aleatoria(store, campos, fracao=amostra)
+
+def main(dataset=DATASET, backend=BACKEND, selecionados=None, amostra=AMOSTRA, estratos=ESTRATOS):
+    global PATH_GRAPHS, NAME
+    info = obter_dataset(dataset)
+    previa = amostra is not None or estratos is not None
+    PATH_GRAPHS = os.path.join(info["graficos"], "Proporcoes", *(["Amostra"] if previa else []))
+    NAME = f"{info['nome']} (amostra)" if previa else info["nome"]
+    os.makedirs(PATH_GRAPHS, exist_ok=True)
+
+    if selecionados is None:
+        selecionados = perguntar_classificacoes()
+    print("Classificações selecionadas:", ", ".join(selecionados), flush=True)
+
+    store = abrir_store(dataset, backend)
+    if previa:
+        fluxos = obter_amostra(store, amostra, estratos)
+        log(f"Amostra: {len(fluxos)} fluxos. Thresholds, contagens e médias abaixo são estimativas da amostra.")
+        momentos = {campo_da(s): fluxos.momentos(campo_da(s)) for s in selecionados}
+        distribuicoes = {campo_da(s): fluxos.distribuicao(campo_da(s)) for s in selecionados}
+    else:
+        cache = CacheEstatisticas(store)
+        calcular_faixas(store, cache, selecionados)
+        momentos, distribuicoes = obter_estatisticas(store, [campo_da(s) for s in selecionados], cache)
+
+    thresholds = calcular_thresholds(momentos, distribuicoes, MODO_THRESHOLD)
+
+    def media_desvio(campo):
+        m = momentos.get(campo)
+        return (m.media, m.desvio) if m is not None and m.n else (0, 0)
+
+    avg_bytes, std_bytes = media_desvio("nbytes_total")
+    avg_duration, std_duration = media_desvio("duration")
+    avg_rate, std_rate = media_desvio("rate")
+
+    log(f"Thresholds calculados ({descricao_modo(MODO_THRESHOLD)}):")
+    log(f"  Elefante ≥ {thresholds['elefante']:.2f} bytes; ")
+    log(f"  Rato < {thresholds['rato']} bytes; ")
+    log(f"  Tartaruga ≥ {thresholds['tartaruga']:.2f} ms; ")
+    log(f"  Libélula < {thresholds['libelula']} ms; ")
+    log(f"  Caracol < taxa {thresholds['caracol']} B/s; ")
+    log(f"  Chita ≥ taxa {thresholds['chita']:.2f} B/s")
+    log("Médias: ")
+    log(f"  nbytes_total: {avg_bytes:.2f} bytes")
+    log(f"  duration: {avg_duration:.2f} ms")
+    log(f"  taxa: {avg_rate:.2f} B/s")
+    log("Desvios padrão: ")
+    log(f"  nbytes_total: {std_bytes:.2f} bytes")
+    log(f"  duration: {std_duration:.2f} ms")
+    log(f"  taxa: {std_rate:.2f} B/s")
+    log(f"Percentis (p50 / p90 / p99; exatos abaixo de {EXATOS}, erro relativo ≤ {(GAMMA - 1) / 2:.2%} acima):")
+    for campo, distribuicao in distribuicoes.items():
+        log(f"  {campo}: " + " / ".join(f"{distribuicao.quantil(q) or 0:.2f}" for q in (0.5, 0.9, 0.99)))
+
+    if previa:
+        result, total_fluxos = classificar_amostra(fluxos, selecionados, thresholds)
+    else:
+        result, total_fluxos = classificar_faixas(cache, selecionados, thresholds)
+
+    log(f"Total de fluxos: {total_fluxos}")
+    gerar_saidas(selecionados, result, thresholds)
+    log("Processo concluído.")
+
+# Categorias resolvidas a partir das somas por faixa, sem voltar aos fluxos
+def classificar_faixas(cache, selecionados, thresholds):
+    faixas = {s: SomasPorFaixa.de_dict(cache[chave_faixas(s)]) for s in selecionados}
+    poucos_pacotes = Somas.de_dict(cache[CHAVE_GERAL]["poucos_pacotes"])
+    total_fluxos = cache[CHAVE_GERAL]["total_fluxos"]
+
+    log("Classificando a partir das faixas...")
+    result = {}
+    for s in selecionados:
+        grupos, incerteza = resolver_faixas(s, faixas[s], thresholds)
+        grupos["Normal"]["count"] += poucos_pacotes.count
+        for nome, soma in poucos_pacotes.somas.items():
+            grupos["Normal"][nome] += soma
+        if incerteza:
+            log(f"  {s}: {incerteza} fluxos ({incerteza / total_fluxos:.4%}) em faixas que contêm um threshold "
+                f"(erro máximo de cada contagem)")
+
+        grupos = {categoria: g for categoria, g in grupos.items() if g["count"]}
+        # Contagens pelo ponto médio de cada faixa: count_erro_max é o erro máximo de cada uma
+        result[f"contagem_{s}"] = [{"_id": categoria, "count": g["count"], "count_erro_max": incerteza}
+                                   for categoria, g in grupos.items()]
+        result[f"medias_{s}"] = []
+        for categoria, g in grupos.items():
+            medias = {
+                "_id": categoria,
+                "media_duration": g["duration"] / g["count"],
+                "media_bytes": g["bytes"] / g["count"],
+                "media_packets": g["packets"] / g["count"],
+            }
+            if s == "taxa":
+                medias["media_rate"] = g["rate"] / g["count"]
+            result[f"medias_{s}"].append(medias)
+    return result, total_fluxos
+
+# Médias por categoria: coluna → campo (media_rate só na classificação por taxa)
+MEDIAS = {"media_duration": "duration", "media_bytes": "nbytes_total", "media_packets": "npackets_total"}
+
+# Categorias dos fluxos amostrados. Cada contagem e cada média vem com o intervalo de confiança
+# (colunas _inferior/_superior nos CSVs), que considera só a variação da amostragem: os thresholds
+# também são estimados na amostra.
+def classificar_amostra(fluxos, selecionados, thresholds):
+    log(f"Classificando os fluxos da amostra (intervalos de confiança de {NIVEL:.0%})...")
+    result = {}
+    for s in selecionados:
+        codigos = classificar(s, fluxos[campo_da(s)], thresholds, fluxos["npackets_total"], MINIMUM_NPACKETS)
+        medias_campos = dict(MEDIAS, media_rate="rate") if s == "taxa" else MEDIAS
+        result[f"contagem_{s}"] = []
+        result[f"medias_{s}"] = []
+        for codigo, categoria in enumerate(categorias(s)):
+            mascara = codigos == codigo
+            if not mascara.any():
+                continue
+            contagem = fluxos.contagem(mascara)
+            log(f"  {s}/{categoria}: {contagem.valor:.0f} fluxos ({contagem.inferior:.0f} a {contagem.superior:.0f}), "
+                f"{int(mascara.sum())} na amostra")
+            result[f"contagem_{s}"].append({
+                "_id": categoria, "count": round(contagem.valor), "count_inferior": round(contagem.inferior),
+                "count_superior": round(contagem.superior), "amostrados": int(mascara.sum()),
+            })
+            medias = {"_id": categoria}
+            for coluna, campo in medias_campos.items():
+                media = fluxos.media(campo, mascara)
+                medias.update({coluna: media.valor, f"{coluna}_inferior": media.inferior, f"{coluna}_superior": media.superior})
+            result[f"medias_{s}"].append(medias)
+    return result, round(fluxos.contagem().valor)
 
 def facet_to_df(facet_result):
     return pd.DataFrame(facet_result).rename(columns={"_id": "Categoria"}) if facet_result else pd.DataFrame(columns=["Categoria", "count"])
 
-def get_legend_text(selecao):
+def get_legend_text(selecao, thresholds):
     if selecao == "taxa":
-        return (f"Thresholds Taxa (B/s):\n"
-                f"Chita ≥ {chita_thresh:.0f}\n"
-                f"Caracol < {CARACOL_RATE_THRESHOLD:.0f}")
+        return (f"Thresholds Taxa (B/s), {descricao_modo(MODO_THRESHOLD)}:\n"
+                f"Chita ≥ {thresholds['chita']:.0f}\n"
+                f"Caracol < {thresholds['caracol']:.0f}")
     elif selecao == "volume":
-        return (f"Thresholds Volume (bytes):\n"
-                f"Elefante ≥ {elefante_thresh:.0f}\n"
-                f"Rato < {RATO_THRESHOLD}")
+        return (f"Thresholds Volume (bytes), {descricao_modo(MODO_THRESHOLD)}:\n"
+                f"Elefante ≥ {thresholds['elefante']:.0f}\n"
+                f"Rato < {thresholds['rato']}")
     elif selecao == "duracao":
-        return (f"Thresholds Duração (ms):\n"
-                f"Tartaruga ≥ {tartaruga_thresh:.0f}\n"
-                f"Libélula < {LIBELULA_THRESHOLD}")
+        return (f"Thresholds Duração (ms), {descricao_modo(MODO_THRESHOLD)}:\n"
+                f"Tartaruga ≥ {thresholds['tartaruga']:.0f}\n"
+                f"Libélula < {thresholds['libelula']}")
     else:
         return ""
 
+# Legenda das pizzas; com contagens aproximadas (resolvidas pelas faixas) acrescenta o erro máximo
+def legenda_contagem(selecao, thresholds, df):
+    legenda = get_legend_text(selecao, thresholds)
+    if "count_erro_max" in df.columns and not df.empty and df["count_erro_max"].max() > 0:
+        erro = int(df["count_erro_max"].max())
+        legenda += f"\nContagens aproximadas: erro máximo ±{erro} fluxos ({erro / df['count'].sum():.2%})"
+    return legenda
+
 def plot_pie(df, title, filename, legend_text=None):
     if df.empty:
-        return
-    plt.figure(figsize=(9, 6))
-    patches, texts, autotexts = plt.pie(df["count"], labels=df["Categoria"], autopct="%1.1f%%")
-    plt.title(title)
-    if legend_text:
-        plt.legend(
-            patches,
-            df["Categoria"],
-            title=legend_text,
-            loc="upper left",
-            bbox_to_anchor=(1.05, 1)
-        )
-        plt.subplots_adjust(right=0.75)
-    else:
-        plt.tight_layout()
-    plt.savefig(os.path.join(PATH_GRAPHS, f"{today_str}_{filename}.png"))
-    plt.close()
+        return []
+    return [Figura(os.path.join(PATH_GRAPHS, f"{today_str}_{filename}.png"), "pizza",
+                   {"rotulos": df["Categoria"].tolist(), "valores": df["count"].tolist()},
+                   {"figsize": (9, 6), "titulo": title, "legenda": legend_text})]
 
 def plot_single_bar(df_means, title, filename, column, ylabel):
     if df_means.empty or column not in df_means.columns:
-        return
-    df_means = df_means.set_index("Categoria")
-    ax = df_means[[column]].plot(kind="bar", figsize=(10,6), legend=False)
-    ax.set_title(title)
-    ax.set_ylabel(ylabel)
-    plt.xticks(rotation=0)
-    plt.tight_layout()
-    plt.savefig(os.path.join(PATH_GRAPHS, f"{today_str}_{filename}.png"))
-    plt.close()
-
-total_fluxos = result["total_fluxos"][0]["count"] if result["total_fluxos"] else 0
-log(f"Total de fluxos: {total_fluxos}")
-
-# Volume
-if "volume" in selecionados:
-    df_volume = facet_to_df(result["contagem_volume"])
-    df_volume.to_csv(os.path.join(PATH_GRAPHS, f"{today_str}_Contagem_Volume.csv"), index=False)
-    plot_pie(df_volume[df_volume["Categoria"].isin(["Elefante", "Rato"])],
-             f"Proporção Elefante/Rato - {NAME}", "Pie_Elefante_Rato", legend_text=get_legend_text("volume"))
-    plot_pie(df_volume, f"Proporção Volume Total - {NAME}", "Pie_Volume_Todas", legend_text=get_legend_text("volume"))
-
-    df_medias_volume = facet_to_df(result.get("medias_volume", []))
-    df_medias_volume.to_csv(os.path.join(PATH_GRAPHS, f"{today_str}_Medias_Volume.csv"), index=False)
-
-    plot_single_bar(df_medias_volume, f"Média de Volume (bytes) por padrão - {NAME}", "Bar_Medias_Volume", "media_bytes", "Bytes")
-    plot_single_bar(df_medias_volume, f"Média de Duração (ms) por padrão - {NAME}", "Bar_Medias_Duracao_Volume", "media_duration", "Milissegundos")
-    plot_single_bar(df_medias_volume, f"Média de Pacotes por padrão - {NAME}", "Bar_Medias_Pacotes_Volume", "media_packets", "Pacotes")
-    log("Geração de gráficos e CSV para volume concluída.")
-
-# Duração
-if "duracao" in selecionados:
-    df_duracao = facet_to_df(result["contagem_duracao"])
-    df_duracao.to_csv(os.path.join(PATH_GRAPHS, f"{today_str}_Contagem_Duracao.csv"), index=False)
-    plot_pie(df_duracao[df_duracao["Categoria"].isin(["Libélula", "Tartaruga"])],
-             f"Proporção Libélula/Tartaruga - {NAME}", "Pie_Libelula_Tartaruga", legend_text=get_legend_text("duracao"))
-    plot_pie(df_duracao, f"Proporção Duração Total - {NAME}", "Pie_Duracao_Todas", legend_text=get_legend_text("duracao"))
-
-    df_medias_duracao = facet_to_df(result.get("medias_duracao", []))
-    df_medias_duracao.to_csv(os.path.join(PATH_GRAPHS, f"{today_str}_Medias_Duracao.csv"), index=False)
-
-    plot_single_bar(df_medias_duracao, f"Média de Duração (ms) por padrão - {NAME}", "Bar_Medias_Duracao", "media_duration", "Milissegundos")
-    plot_single_bar(df_medias_duracao, f"Média de Volume (bytes) por padrão - {NAME}", "Bar_Medias_Volume_Duracao", "media_bytes", "Bytes")
-    plot_single_bar(df_medias_duracao, f"Média de Pacotes por padrão - {NAME}", "Bar_Medias_Pacotes_Duracao", "media_packets", "Pacotes")
-    log("Geração de gráficos e CSV para duração concluída.")
-
-# Taxa
-if "taxa" in selecionados:
-    df_taxa = facet_to_df(result["contagem_taxa"])
-    df_taxa.to_csv(os.path.join(PATH_GRAPHS, f"{today_str}_Contagem_Taxa.csv"), index=False)
-    plot_pie(df_taxa[df_taxa["Categoria"].isin(["Chita", "Caracol"])],
-             f"Proporção Chita/Caracol - {NAME}", "Pie_Chita_Caracol", legend_text=get_legend_text("taxa"))
-    plot_pie(df_taxa, f"Proporção Taxa Total - {NAME}", "Pie_Taxa_Todas", legend_text=get_legend_text("taxa"))
-
-    df_medias_taxa = facet_to_df(result.get("medias_taxa", []))
-    df_medias_taxa.to_csv(os.path.join(PATH_GRAPHS, f"{today_str}_Medias_Taxa.csv"), index=False)
-
-    # Converter taxa para KB/s para melhor visualização
-    if not df_medias_taxa.empty and "media_rate" in df_medias_taxa.columns:
-        df_medias_taxa["media_rate_kbps"] = df_medias_taxa["media_rate"] / 1024
-    else:
-        df_medias_taxa["media_rate_kbps"] = pd.Series(dtype=float)
-
-    plot_single_bar(df_medias_taxa, f"Média de Taxa (B/s) por padrão - {NAME}", "Bar_Medias_Taxa", "media_rate", "Bytes por segundo (B/s)")
-    plot_single_bar(df_medias_taxa, f"Média de Taxa (KB/s) por padrão - {NAME}", "Bar_Medias_Taxa_KBps", "media_rate_kbps", "Kilobytes por segundo (KB/s)")
-    plot_single_bar(df_medias_taxa, f"Média de Duração (ms) por padrão - {NAME}", "Bar_Medias_Duracao_Taxa", "media_duration", "Milissegundos")
-    plot_single_bar(df_medias_taxa, f"Média de Pacotes por padrão - {NAME}", "Bar_Medias_Pacotes_Taxa", "media_packets", "Pacotes")
-    log("Geração de gráficos e CSV para taxa concluída.")
-
-log("Processo concluído.")
+        return []
+    return [Figura(os.path.join(PATH_GRAPHS, f"{today_str}_{filename}.png"), "barra_categorias",
+                   {"rotulos": df_means["Categoria"].tolist(), "valores": df_means[column].tolist()},
+                   {"titulo": title, "xlabel": "Categoria", "ylabel": ylabel, "ajustar": True})]
+
+# CSVs gravados na hora; as figuras são montadas aqui e desenhadas juntas no fim (Renderizacao.py)
+def gerar_saidas(selecionados, result, thresholds):
+    figuras = []
+
+    # Volume
+    if "volume" in selecionados:
+        df_volume = facet_to_df(result["contagem_volume"])
+        df_volume.to_csv(os.path.join(PATH_GRAPHS, f"{today_str}_Contagem_Volume.csv"), index=False)
+        figuras += plot_pie(df_volume[df_volume["Categoria"].isin(["Elefante", "Rato"])],
+                            f"Proporção Elefante/Rato - {NAME}", "Pie_Elefante_Rato", legend_text=legenda_contagem("volume", thresholds, df_volume))
+        figuras += plot_pie(df_volume, f"Proporção Volume Total - {NAME}", "Pie_Volume_Todas", legend_text=legenda_contagem("volume", thresholds, df_volume))
+
+        df_medias_volume = facet_to_df(result.get("medias_volume", []))
+        df_medias_volume.to_csv(os.path.join(PATH_GRAPHS, f"{today_str}_Medias_Volume.csv"), index=False)
+
+        figuras += plot_single_bar(df_medias_volume, f"Média de Volume (bytes) por padrão - {NAME}", "Bar_Medias_Volume", "media_bytes", "Bytes")
+        figuras += plot_single_bar(df_medias_volume, f"Média de Duração (ms) por padrão - {NAME}", "Bar_Medias_Duracao_Volume", "media_duration", "Milissegundos")
+        figuras += plot_single_bar(df_medias_volume, f"Média de Pacotes por padrão - {NAME}", "Bar_Medias_Pacotes_Volume", "media_packets", "Pacotes")
+        log("CSV e figuras de volume prontos.")
+
+    # Duração
+    if "duracao" in selecionados:
+        df_duracao = facet_to_df(result["contagem_duracao"])
+        df_duracao.to_csv(os.path.join(PATH_GRAPHS, f"{today_str}_Contagem_Duracao.csv"), index=False)
+        figuras += plot_pie(df_duracao[df_duracao["Categoria"].isin(["Libélula", "Tartaruga"])],
+                            f"Proporção Libélula/Tartaruga - {NAME}", "Pie_Libelula_Tartaruga", legend_text=legenda_contagem("duracao", thresholds, df_duracao))
+        figuras += plot_pie(df_duracao, f"Proporção Duração Total - {NAME}", "Pie_Duracao_Todas", legend_text=legenda_contagem("duracao", thresholds, df_duracao))
+
+        df_medias_duracao = facet_to_df(result.get("medias_duracao", []))
+        df_medias_duracao.to_csv(os.path.join(PATH_GRAPHS, f"{today_str}_Medias_Duracao.csv"), index=False)
+
+        figuras += plot_single_bar(df_medias_duracao, f"Média de Duração (ms) por padrão - {NAME}", "Bar_Medias_Duracao", "media_duration", "Milissegundos")
+        figuras += plot_single_bar(df_medias_duracao, f"Média de Volume (bytes) por padrão - {NAME}", "Bar_Medias_Volume_Duracao", "media_bytes", "Bytes")
+        figuras += plot_single_bar(df_medias_duracao, f"Média de Pacotes por padrão - {NAME}", "Bar_Medias_Pacotes_Duracao", "media_packets", "Pacotes")
+        log("CSV e figuras de duração prontos.")
+
+    # Taxa
+    if "taxa" in selecionados:
+        df_taxa = facet_to_df(result["contagem_taxa"])
+        df_taxa.to_csv(os.path.join(PATH_GRAPHS, f"{today_str}_Contagem_Taxa.csv"), index=False)
+        figuras += plot_pie(df_taxa[df_taxa["Categoria"].isin(["Chita", "Caracol"])],
+                            f"Proporção Chita/Caracol - {NAME}", "Pie_Chita_Caracol", legend_text=legenda_contagem("taxa", thresholds, df_taxa))
+        figuras += plot_pie(df_taxa, f"Proporção Taxa Total - {NAME}", "Pie_Taxa_Todas", legend_text=legenda_contagem("taxa", thresholds, df_taxa))
+
+        df_medias_taxa = facet_to_df(result.get("medias_taxa", []))
+        df_medias_taxa.to_csv(os.path.join(PATH_GRAPHS, f"{today_str}_Medias_Taxa.csv"), index=False)
+
+        # Converter taxa para KB/s para melhor visualização
+        if not df_medias_taxa.empty and "media_rate" in df_medias_taxa.columns:
+            df_medias_taxa["media_rate_kbps"] = df_medias_taxa["media_rate"] / 1024
+        else:
+            df_medias_taxa["media_rate_kbps"] = pd.Series(dtype=float)
+
+        figuras += plot_single_bar(df_medias_taxa, f"Média de Taxa (B/s) por padrão - {NAME}", "Bar_Medias_Taxa", "media_rate", "Bytes por segundo (B/s)")
+        figuras += plot_single_bar(df_medias_taxa, f"Média de Taxa (KB/s) por padrão - {NAME}", "Bar_Medias_Taxa_KBps", "media_rate_kbps", "Kilobytes por segundo (KB/s)")
+        figuras += plot_single_bar(df_medias_taxa, f"Média de Duração (ms) por padrão - {NAME}", "Bar_Medias_Duracao_Taxa", "media_duration", "Milissegundos")
+        figuras += plot_single_bar(df_medias_taxa, f"Média de Pacotes por padrão - {NAME}", "Bar_Medias_Pacotes_Taxa", "media_packets", "Pacotes")
+        log("CSV e figuras de taxa prontos.")
+
+    log(f"Renderizando {len(figuras)} gráficos...")
+    renderizar(figuras, log=log)
+
+if __name__ == "__main__":
+    main()
@@ -1,168 +1,148 @@
 from datetime import datetime
-import matplotlib.pyplot as plt
-import pymongo
+import numpy as np
 import os
 import time
+from FlowStore import abrir_store, obter_dataset
+from CacheEstatisticas import CacheEstatisticas
+from Histogramas import (Definicao, calcular_histogramas, calcular_sketches, combinar_fatias,
+                         limites_lineares, limites_logaritmicos)
+from Renderizacao import Figura, renderizar
 
 # Configurações
-DATABASE = 2  # 1 para CAIDA, 2 para MAWI, 3 para MAWI 2025
-
-if DATABASE == 1:
-    PATH_GRAPHS = "Saida/Graficos/AnaliseCaida/Relacoes"
-    NAME = "CAIDA 2019"
-    DB_NAME = "fluxos_database"
-    COLLECTION_NAME = "caida_collection"
-elif DATABASE == 2:
-    PATH_GRAPHS = "Saida/Graficos/AnaliseMAWI/Relacoes"
-    NAME = "MAWI 2019"
-    DB_NAME = "fluxos_database"
-    COLLECTION_NAME = "mawi_collection"
-elif DATABASE == 3:
-    PATH_GRAPHS = "Saida/Graficos/AnaliseMAWI2025/Relacoes"
-    NAME = "MAWI 2025"
-    DB_NAME = "fluxos_database"
-    COLLECTION_NAME = "mawi2025_collection"
-else:
-    raise ValueError("Banco de dados inválido. Use 1 para CAIDA, 2 para MAWI 2019 ou 3 para MAWI 2025.")
+DATASET = "mawi"  # "caida", "mawi" ou "mawi2025" (ver FlowStore.DATASETS)
+BACKEND = "mongo"  # "mongo" ou "colunar" (armazém local gerado com Ingestao.py --armazem)
+
+# Pasta e nome do dataset nos gráficos (definidos em main)
+PATH_GRAPHS = None
+NAME = None
 
 NUMBER_BINS = 60
+ESCALA = "linear"  # "linear" (faixas de mesma largura) ou "log" (faixas logarítmicas, melhor para as caudas longas)
+ZOOM = {}  # opcional: {campo: (minimo, maximo)}, ex.: {"duration": (0, 5000)}; sem zoom vai do mínimo ao máximo
+EXATO = False  # True: histogramas exatos, lineares e sem zoom (uma passada a cada divisão nova); False: renderiza dos sketches guardados
 
 today_str = datetime.now().strftime('%Y%m%d')
 
 def log(msg):
     print(f"[{datetime.now().strftime('%H:%M:%S')}] {msg}", flush=True)
 
-def main():
-    log("Conectando ao MongoDB...")
-    client = pymongo.MongoClient("mongodb://localhost:27017/")
-    collection = client[DB_NAME][COLLECTION_NAME]
+# Todos os histogramas da análise, calculados juntos numa única passada (Histogramas.py).
+# Sem EXATO, cada campo tem um sketch por minuto guardado no cache: mudar NUMBER_BINS, ESCALA ou ZOOM
+# não volta aos fluxos.
+SOMAS = {"total_packets": "npackets_total", "total_bytes": "nbytes_total"}
+DEFINICOES = {
+    "duracao": Definicao("duration", NUMBER_BINS, SOMAS),
+    "volume": Definicao("nbytes_total", NUMBER_BINS, SOMAS),
+    "pacotes": Definicao("npackets_total", NUMBER_BINS, SOMAS),
+    "taxa": Definicao("rate", NUMBER_BINS, SOMAS),
+    "tamanho_pacote": Definicao("avg_pkt_size", NUMBER_BINS, SOMAS),
+}
+
+def main(dataset=DATASET, backend=BACKEND):
+    global PATH_GRAPHS, NAME
+    info = obter_dataset(dataset)
+    PATH_GRAPHS = os.path.join(info["graficos"], "Relacoes")
+    NAME = info["nome"]
+    log(f"Abrindo {NAME} (backend {backend})...")
+    store = abrir_store(dataset, backend)
+    os.makedirs(PATH_GRAPHS, exist_ok=True)
+
+    cache = CacheEstatisticas(store)
+    if EXATO:
+        log("Calculando os histogramas exatos (passada única)...")
+        histogramas = calcular_histogramas(store, DEFINICOES, cache)
+    else:
+        log("Lendo os sketches (passada única se ainda não estiverem no cache)...")
+        campos = sorted({d.campo for d in DEFINICOES.values()})
+        sketches = calcular_sketches(store, campos, SOMAS, cache)
+        histogramas = {nome: histograma_do_sketch(combinar_fatias(sketches[d.campo]), d) for nome, d in DEFINICOES.items()}
+
+    # As figuras são montadas a partir dos histogramas e desenhadas juntas (Renderizacao.py)
+    figuras = [
+        *generate_duration_histograms(histogramas["duracao"]),
+        *generate_volume_histograms(histogramas["volume"]),
+        *generate_packets_histograms(histogramas["pacotes"]),
+        *generate_rate_histograms(histogramas["taxa"]),
+        *generate_packet_size_histograms(histogramas["tamanho_pacote"]),
+    ]
+    log(f"Renderizando {len(figuras)} gráficos...")
+    renderizar(figuras, log=log)
 
-    log("Calculando histogramas de duração...")
-    generate_duration_histograms(collection)
+    log("Todos os gráficos foram gerados com sucesso.")
 
-    log("Histogramas de duração finalizados.")
-    log("Calculando histogramas de volume...")
-    generate_volume_histograms(collection)
+def limites(d, minimo, maximo):
+    minimo, maximo = ZOOM.get(d.campo, (minimo, maximo))
+    if ESCALA == "log":
+        return limites_logaritmicos(minimo, maximo, d.bins)
+    return limites_lineares(minimo, maximo, d.bins)
+
+def histograma_do_sketch(sketch, d):
+    return sketch.reagrupar(limites(d, sketch.minimo or 0, sketch.maximo or 0))
+
+# Centro e largura das faixas. Na escala linear a última faixa vai até máximo + 1, mas o centro segue
+# a largura das demais; na logarítmica o centro é a média geométrica dos limites.
+def centros(histograma):
+    if ESCALA == "log":
+        inferior, superior = histograma.limites[:-1], histograma.limites[1:]
+        return np.sqrt(np.maximum(inferior, 1) * superior).tolist(), (superior - inferior).tolist()
+    minimo, step = histograma.limites[0], histograma.limites[1] - histograma.limites[0]
+    return [round(minimo + (i + 0.5) * step) for i in range(len(histograma.count))], step
+
+def avg_pkt_size_por_faixa(histograma):
+    return [
+        total_bytes / total_packets if total_packets else 0
+        for total_bytes, total_packets in zip(histograma.somas["total_bytes"].tolist(), histograma.somas["total_packets"].tolist())
+    ]
 
-    log("Todos os gráficos foram gerados com sucesso.")
+# Linha e barras com os mesmos dados e parâmetros
+def plot_linha_barra(centers, valores, step, xlabel, ylabel, title, nome_linha, nome_barra, log_y=False):
+    parametros = {"xlabel": xlabel, "ylabel": ylabel, "titulo": f"{title} - {NAME}", "log_x": ESCALA == "log", "log_y": log_y}
+    return [
+        Figura(os.path.join(PATH_GRAPHS, f"{today_str}_{nome_linha}.png"), "linha", {"x": centers, "y": valores}, parametros),
+        Figura(os.path.join(PATH_GRAPHS, f"{today_str}_{nome_barra}.png"), "barra",
+               {"x": centers, "y": valores, "largura": np.multiply(step, 0.8)}, {**parametros, "cor": "blue"}),
+    ]
 
-def generate_duration_histograms(collection):
-    min_dur = collection.find_one(sort=[("duration", 1)])["duration"]
-    max_dur = collection.find_one(sort=[("duration", -1)])["duration"]
-    step = (max_dur - min_dur) / NUMBER_BINS
-
-    pipeline = [
-        {
-            "$bucket": {
-                "groupBy": "$duration",
-                "boundaries": [min_dur + i * step for i in range(NUMBER_BINS)] + [max_dur + 1],
-                "default": "out_of_range",
-                "output": {
-                    "count": {"$sum": 1},
-                    "total_packets": {"$sum": "$npackets_total"},
-                    "total_bytes": {"$sum": "$nbytes_total"},
-                }
-            }
-        }
+def generate_duration_histograms(histograma):
+    centers, step = centros(histograma)
+    counts = histograma.count.tolist()
+    return [
+        *plot_linha_barra(centers, counts, step, "Duração (ms)", "Quantidade de fluxos",
+                          "Quantidade de fluxos por duração",
+                          "NumeroDeFluxosPorDuracaoLinha", "NumeroDeFluxosPorDuracaoBarra"),
+        *plot_linha_barra(centers, avg_pkt_size_por_faixa(histograma), step, "Duração (ms)", "Tamanho médio de pacote (bytes)",
+                          "Tamanho médio dos pacotes por duração",
+                          "TamanhoMedioPacotesPorDuracaoLinha", "TamanhoMedioPacotesPorDuracaoBarra"),
     ]
 
-    buckets = list(collection.aggregate(pipeline))
-
-    centers = [round(min_dur + (i + 0.5) * step) for i in range(NUMBER_BINS)]
-    counts = []
-    avg_pkt_size = []
-
-    for b in buckets:
-        count = b["count"]
-        total_packets = b["total_packets"]
-        total_bytes = b["total_bytes"]
-        counts.append(count)
-        avg_pkt_size.append(total_bytes / total_packets if total_packets else 0)
-
-    log("Gerando gráfico de linha - Número de fluxos por duração...")
-    plt.figure(figsize=(10, 5))
-    plt.plot(centers, counts)
-    plt.xlabel("Duração (ms)")
-    plt.ylabel("Quantidade de fluxos")
-    plt.title("Quantidade de fluxos por duração - " + NAME)
-    plt.savefig(os.path.join(PATH_GRAPHS, f"{today_str}_NumeroDeFluxosPorDuracaoLinha.png"))
-    plt.close()
-
-    log("Gerando gráfico de barras - Número de fluxos por duração...")
-    plt.figure(figsize=(10, 5))
-    plt.bar(centers, counts, width=step * 0.8, color='blue')
-    plt.xlabel("Duração (ms)")
-    plt.ylabel("Quantidade de fluxos")
-    plt.title("Quantidade de fluxos por duração - " + NAME)
-    plt.savefig(os.path.join(PATH_GRAPHS, f"{today_str}_NumeroDeFluxosPorDuracaoBarra.png"))
-    plt.close()
-
-    log("Gerando gráfico de linha - Tamanho médio dos pacotes por duração...")
-    plt.figure(figsize=(10, 5))
-    plt.plot(centers, avg_pkt_size)
-    plt.xlabel("Duração (ms)")
-    plt.ylabel("Tamanho médio de pacote (bytes)")
-    plt.title("Tamanho médio dos pacotes por duração - " + NAME)
-    plt.savefig(os.path.join(PATH_GRAPHS, f"{today_str}_TamanhoMedioPacotesPorDuracaoLinha.png"))
-    plt.close()
-
-    log("Gerando gráfico de barras - Tamanho médio dos pacotes por duração...")
-    plt.figure(figsize=(10, 5))
-    plt.bar(centers, avg_pkt_size, width=step * 0.8, color='blue')
-    plt.xlabel("Duração (ms)")
-    plt.ylabel("Tamanho médio de pacote (bytes)")
-    plt.title("Tamanho médio dos pacotes por duração - " + NAME)
-    plt.savefig(os.path.join(PATH_GRAPHS, f"{today_str}_TamanhoMedioPacotesPorDuracaoBarra.png"))
-    plt.close()
-
-def generate_volume_histograms(collection):
-    min_bytes = collection.find_one(sort=[("nbytes_total", 1)])["nbytes_total"]
-    max_bytes = collection.find_one(sort=[("nbytes_total", -1)])["nbytes_total"]
-    step = (max_bytes - min_bytes) / NUMBER_BINS
-
-    boundaries = [min_bytes + i * step for i in range(NUMBER_BINS)] + [max_bytes + 1]
-    centers = [round(min_bytes + (i + 0.5) * step) for i in range(NUMBER_BINS)]
-    counts = [0] * NUMBER_BINS  # Inicializa todos os buckets com zero
-
-    pipeline = [
-        {
-            "$bucket": {
-                "groupBy": "$nbytes_total",
-                "boundaries": boundaries,
-                "default": "out_of_range",
-                "output": {"count": {"$sum": 1}}
-            }
-        }
+def generate_volume_histograms(histograma):
+    centers, step = centros(histograma)
+    return plot_linha_barra(centers, histograma.count.tolist(), step, "Volume de dados (bytes)", "Quantidade de fluxos",
+                            "Quantidade de fluxos por volume",
+                            "NumeroFluxosPorBytesLinha", "NumeroFluxosPorBytesBarras", log_y=True)
+
+def generate_packets_histograms(histograma):
+    centers, step = centros(histograma)
+    return plot_linha_barra(centers, histograma.count.tolist(), step, "Pacotes", "Quantidade de fluxos",
+                            "Quantidade de fluxos por número de pacotes",
+                            "NumeroFluxosPorPacotesLinha", "NumeroFluxosPorPacotesBarras", log_y=True)
+
+def generate_rate_histograms(histograma):
+    centers, step = centros(histograma)
+    return [
+        *plot_linha_barra(centers, histograma.count.tolist(), step, "Taxa (B/s)", "Quantidade de fluxos",
+                          "Quantidade de fluxos por taxa",
+                          "NumeroFluxosPorTaxaLinha", "NumeroFluxosPorTaxaBarras", log_y=True),
+        *plot_linha_barra(centers, avg_pkt_size_por_faixa(histograma), step, "Taxa (B/s)", "Tamanho médio de pacote (bytes)",
+                          "Tamanho médio dos pacotes por taxa",
+                          "TamanhoMedioPacotesPorTaxaLinha", "TamanhoMedioPacotesPorTaxaBarra"),
     ]
 
-    buckets = list(collection.aggregate(pipeline))
-
-    # Preenche os counts com base na posição correta de cada bucket
-    for i, bucket in enumerate(buckets):
-        if bucket["_id"] != "out_of_range":
-            index = boundaries.index(bucket["_id"])
-            if index < NUMBER_BINS:
-                counts[index] = bucket["count"]
-
-    log("Gerando gráfico de linha - Fluxos por volume...")
-    plt.figure(figsize=(10, 5))
-    plt.plot(centers, counts)
-    plt.yscale("log")
-    plt.xlabel("Volume de dados (bytes)")
-    plt.ylabel("Quantidade de fluxos")
-    plt.title("Quantidade de fluxos por volume - " + NAME)
-    plt.savefig(os.path.join(PATH_GRAPHS, f"{today_str}_NumeroFluxosPorBytesLinha.png"))
-    plt.close()
-
-    log("Gerando gráfico de barras - Fluxos por volume...")
-    plt.figure(figsize=(10, 5))
-    plt.bar(centers, counts, width=step * 0.8, color='blue')
-    plt.yscale("log")
-    plt.xlabel("Volume de dados (bytes)")
-    plt.ylabel("Quantidade de fluxos")
-    plt.title("Quantidade de fluxos por volume - " + NAME)
-    plt.savefig(os.path.join(PATH_GRAPHS, f"{today_str}_NumeroFluxosPorBytesBarras.png"))
-    plt.close()
+def generate_packet_size_histograms(histograma):
+    centers, step = centros(histograma)
+    return plot_linha_barra(centers, histograma.count.tolist(), step, "Tamanho médio de pacote (bytes)", "Quantidade de fluxos",
+                            "Quantidade de fluxos por tamanho médio de pacote",
+                            "NumeroFluxosPorTamanhoPacoteLinha", "NumeroFluxosPorTamanhoPacoteBarras", log_y=True)
 
 if __name__ == "__main__":
     start = time.time()
@@ -0,0 +1,172 @@
+import hashlib
+import json
+import os
+import shutil
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+
+# Estágio de renderização: as análises montam a lista de figuras (tipo, dados já agregados e parâmetros)
+# e renderizar() desenha todas num pool de processos com a API orientada a objetos do matplotlib
+# (Figure + Agg, sem o estado global do pyplot e sem janela).
+# Cada figura tem um hash do conteúdo (tipo, dados, parâmetros e VERSAO_RENDER); o hash de cada arquivo
+# gerado fica em MANIFESTO, dentro da pasta dos gráficos. Uma figura com o mesmo hash não é desenhada de
+# novo: se o arquivo já existe ela é pulada, e se outro arquivo tem o mesmo hash (outra data no nome ou a
+# mesma figura pedida duas vezes) ele é copiado.
+
+WORKERS = max(1, (os.cpu_count() or 1) - 1)
+MANIFESTO = ".renderizacao.json"
+VERSAO_RENDER = 1  # muda quando o desenho de algum tipo muda (invalida os hashes antigos)
+
+# arquivo: caminho do PNG; tipo: chave de TIPOS; dados: {nome: lista/array}; parametros: {nome: valor}
+Figura = namedtuple("Figura", ["arquivo", "tipo", "dados", "parametros"])
+
+# Arrays entram no hash pelos bytes (sem converter para lista)
+def _json(valor):
+    if isinstance(valor, np.ndarray):
+        return [str(valor.dtype), valor.shape, hashlib.sha256(np.ascontiguousarray(valor).tobytes()).hexdigest()]
+    if isinstance(valor, np.generic):
+        return valor.item()
+    raise TypeError(f"Valor não serializável: {type(valor).__name__}")
+
+def hash_figura(figura):
+    conteudo = json.dumps([VERSAO_RENDER, figura.tipo, figura.dados, figura.parametros], sort_keys=True, default=_json)
+    return hashlib.sha256(conteudo.encode("utf-8")).hexdigest()
+
+def _nova_figura(p):
+    from matplotlib.figure import Figure
+    figura = Figure(figsize=p.get("figsize", (10, 5)))
+    return figura, figura.add_subplot()
+
+def _eixos(ax, p):
+    if p.get("log_x"):
+        ax.set_xscale("log")
+    if p.get("log_y"):
+        ax.set_yscale("log")
+    ax.set_xlabel(p.get("xlabel", ""))
+    ax.set_ylabel(p.get("ylabel", ""))
+    ax.set_title(p.get("titulo", ""))
+
+def _salvar(figura, arquivo, p):
+    if p.get("ajustar"):
+        figura.tight_layout()
+    figura.savefig(arquivo)
+
+def desenhar_linha(arquivo, d, p):
+    figura, ax = _nova_figura(p)
+    ax.plot(d["x"], d["y"], linewidth=p.get("espessura"))
+    _eixos(ax, p)
+    _salvar(figura, arquivo, p)
+
+def desenhar_barra(arquivo, d, p):
+    figura, ax = _nova_figura(p)
+    ax.bar(d["x"], d["y"], width=d["largura"], color=p.get("cor"))
+    _eixos(ax, p)
+    _salvar(figura, arquivo, p)
+
+# Barras por categoria (eixo x com os nomes das categorias)
+def desenhar_barra_categorias(arquivo, d, p):
+    figura, ax = _nova_figura(p)
+    ax.bar(d["rotulos"], d["valores"], width=0.5)
+    ax.tick_params(axis="x", labelrotation=0)
+    _eixos(ax, p)
+    _salvar(figura, arquivo, p)
+
+# Barras empilhadas (d["camadas"] = {rótulo: valores}, de baixo para cima) com legenda à direita
+def desenhar_barras_empilhadas(arquivo, d, p):
+    figura, ax = _nova_figura(p)
+    base = np.zeros(len(d["x"]))
+    for rotulo, valores in d["camadas"].items():
+        ax.bar(d["x"], valores, width=d["largura"], bottom=base, align="edge", label=rotulo)
+        base += np.asarray(valores, dtype=float)
+    _eixos(ax, p)
+    ax.legend(loc="upper left", bbox_to_anchor=(1.01, 1))
+    _salvar(figura, arquivo, p)
+
+# Pizza com percentuais; com p["legenda"] a legenda (com esse título) fica à direita
+def desenhar_pizza(arquivo, d, p):
+    figura, ax = _nova_figura(p)
+    patches, _, _ = ax.pie(d["valores"], labels=d["rotulos"], autopct="%1.1f%%")
+    ax.set_title(p.get("titulo", ""))
+    if p.get("legenda"):
+        ax.legend(patches, d["rotulos"], title=p["legenda"], loc="upper left", bbox_to_anchor=(1.05, 1))
+        figura.subplots_adjust(right=0.75)
+        figura.savefig(arquivo, bbox_inches="tight")  # a legenda não é cortada na borda
+    else:
+        figura.tight_layout()
+        figura.savefig(arquivo)
+
+TIPOS = {
+    "linha": desenhar_linha,
+    "barra": desenhar_barra,
+    "barra_categorias": desenhar_barra_categorias,
+    "barras_empilhadas": desenhar_barras_empilhadas,
+    "pizza": desenhar_pizza,
+}
+
+def desenhar(figura):
+    TIPOS[figura.tipo](figura.arquivo, figura.dados, figura.parametros)
+    return figura.arquivo
+
+def _ler_manifesto(pasta):
+    caminho = os.path.join(pasta, MANIFESTO)
+    if not os.path.isfile(caminho):
+        return {}
+    try:
+        with open(caminho, "r", encoding="utf-8") as file:
+            return json.load(file)
+    except ValueError:
+        return {}
+
+def _gravar_manifesto(pasta, manifesto):
+    caminho = os.path.join(pasta, MANIFESTO)
+    with open(caminho + ".tmp", "w", encoding="utf-8") as file:
+        json.dump(manifesto, file, indent=1, sort_keys=True)
+    os.replace(caminho + ".tmp", caminho)
+
+# Desenha as figuras que mudaram (em paralelo) e devolve {"desenhadas", "copiadas", "puladas"}.
+# log(msg) recebe o resumo; workers=None usa WORKERS.
+def renderizar(figuras, workers=None, log=None):
+    workers = WORKERS if workers is None else workers
+    contagem = {"desenhadas": 0, "copiadas": 0, "puladas": 0}
+    pendentes = {}  # hash → figura a desenhar
+    copias = []  # (hash, arquivo) copiados depois que a figura do hash existir
+    manifestos = {}
+    for figura in figuras:
+        pasta = os.path.dirname(figura.arquivo) or "."
+        if pasta not in manifestos:
+            os.makedirs(pasta, exist_ok=True)
+            manifestos[pasta] = _ler_manifesto(pasta)
+        chave = hash_figura(figura)
+        nome = os.path.basename(figura.arquivo)
+        if manifestos[pasta].get(nome) == chave and os.path.isfile(figura.arquivo):
+            contagem["puladas"] += 1
+        elif chave in pendentes:
+            copias.append((chave, figura.arquivo))
+        else:
+            existente = next((os.path.join(pasta, outro) for outro, h in manifestos[pasta].items()
+                              if h == chave and os.path.isfile(os.path.join(pasta, outro))), None)
+            if existente:
+                shutil.copyfile(existente, figura.arquivo)
+                contagem["copiadas"] += 1
+            else:
+                pendentes[chave] = figura
+        manifestos[pasta][nome] = chave
+
+    if len(pendentes) > 1 and workers > 1:
+        with ProcessPoolExecutor(min(workers, len(pendentes))) as pool:
+            list(pool.map(desenhar, pendentes.values()))
+    else:
+        for figura in pendentes.values():
+            desenhar(figura)
+    contagem["desenhadas"] = len(pendentes)
+    for chave, arquivo in copias:
+        shutil.copyfile(pendentes[chave].arquivo, arquivo)
+        contagem["copiadas"] += 1
+
+    for pasta, manifesto in manifestos.items():
+        _gravar_manifesto(pasta, manifesto)
+    if log:
+        log(f"Figuras: {contagem['desenhadas']} desenhadas, {contagem['copiadas']} copiadas de figuras iguais, "
+            f"{contagem['puladas']} sem mudança")
+    return contagem
@@ -0,0 +1,72 @@
+import argparse
+import sys
+import io
+import time
+from datetime import datetime
+from FlowStore import abrir_store, DATASETS, MongoFlowStore
+from VersaoColecao import marcar_resumos, resumos_atualizados
+from ResumosFluxos import (COLECAO_RESUMOS, LARGURA_RESUMO, CAMPOS_RESUMO, CAMPOS_SOMA, CAMPOS_FLUXO, Resumo, resumir,
+                           gravar_resumos, ler_resumos, apagar_resumos, compactar)
+
+# Lado das análises dos resumos incrementais: reconstrução, leitura validada pela versão da coleção e a
+# linha de comando. O formato e a escrita dos deltas (Resumo, DeltaResumos, gravar_resumos, compactar...)
+# ficam em PreProcessamento/ResumosFluxos.py, usados pela ingestão e pela unificação sem importar o Processamento.
+
+def log(msg):
+    print(f"[{datetime.now().strftime('%H:%M:%S')}] {msg}", flush=True)
+
+# Recalcula os resumos a partir de todos os fluxos (uma passada) e marca a versão atual como coberta
+def construir_resumos(store):
+    collection = store.collection
+    resumos = {}
+    for chunk in store.scan(list(CAMPOS_FLUXO)):
+        resumir(chunk, resumos)
+    apagar_resumos(collection)
+    gravados = gravar_resumos(collection, resumos)
+    marcar_resumos(collection)
+    return gravados
+
+# {fatia: Resumo} da coleção, ou None quando não há resumos válidos (armazém colunar, resumos desatualizados
+# ou que não somam o número de documentos da coleção); nesse caso a análise percorre os fluxos
+def obter_resumos(store):
+    if not isinstance(store, MongoFlowStore) or not resumos_atualizados(store.collection):
+        return None
+    resumos = ler_resumos(store.collection)
+    if not resumos or sum(resumo.n for resumo in resumos.values()) != store.collection.estimated_document_count():
+        return None
+    return resumos
+
+# Junta as fatias num único Resumo
+def resumo_total(resumos):
+    total = Resumo()
+    for resumo in resumos.values():
+        total.combinar(resumo)
+    return total
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Constrói, compacta ou mostra os resumos incrementais de uma coleção.")
+    parser.add_argument("acao", choices=("construir", "compactar", "info"))
+    parser.add_argument("--dataset", choices=sorted(DATASETS), required=True)
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    store = abrir_store(args.dataset, "mongo")
+    collection = store.collection
+    log(f"Coleção: {collection.name}")
+    inicio = time.time()
+    if args.acao == "construir":
+        log(f"{construir_resumos(store)} fatias gravadas em {time.time() - inicio:.2f} s")
+    elif args.acao == "compactar":
+        antigos, novos = compactar(collection)
+        log(f"{antigos} deltas compactados em {novos} documentos em {time.time() - inicio:.2f} s")
+    else:
+        deltas = collection.database[COLECAO_RESUMOS].count_documents({"colecao": collection.name})
+        resumos = ler_resumos(collection)
+        log(f"{deltas} deltas, {len(resumos)} fatias, {sum(r.n for r in resumos.values())} fluxos "
+            f"({collection.estimated_document_count()} documentos na coleção)")
+        log("Resumos válidos." if obter_resumos(store) is not None else "Resumos desatualizados: rode \"construir\".")
+
+if __name__ == "__main__":
+    sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
+    main()
@@ -0,0 +1,191 @@
+import numpy as np
+from Classificacao import CLASSIFICACOES, categorias, classificar
+
+# Séries temporais do tráfego em janelas de "largura" ms do start: fluxos iniciados, fluxos ativos, bytes e
+# pacotes (cada fluxo espalhado proporcionalmente pela sua duração) e fluxos iniciados por categoria.
+# Tudo sai de uma única passada pelos fluxos, em qualquer ordem: os fluxos ativos e as janelas cobertas por
+# inteiro são guardados como diferenças (+ na primeira janela, - depois da última) e acumulados só na saída,
+# então a memória é proporcional ao número de janelas (não ao de fluxos) e os fluxos não precisam estar
+# ordenados por start. As séries se combinam entre chunks, arquivos e shards (combinar).
+
+CAMPOS_SERIE = ("start", "duration", "nbytes_total", "npackets_total")
+ESPALHADOS = {"bytes": "nbytes_total", "pacotes": "npackets_total"}  # série: campo espalhado pela duração
+
+class SerieTemporal:
+    def __init__(self, largura, classificacoes=()):
+        self.largura = largura
+        self.classificacoes = list(classificacoes)
+        self.origem = None  # índice absoluto (start // largura) da primeira janela
+        self.tamanho = 0
+        self.iniciados = np.zeros(0, dtype=np.int64)
+        self.dif_ativos = np.zeros(0, dtype=np.int64)
+        # Parte das janelas de início e de fim de cada fluxo e diferenças das janelas cobertas por inteiro
+        self.parciais = {nome: np.zeros(0) for nome in ESPALHADOS}
+        self.dif_cheias = {nome: np.zeros(0) for nome in ESPALHADOS}
+        self.classes = {selecao: np.zeros((0, len(categorias(selecao))), dtype=np.int64) for selecao in self.classificacoes}
+
+    def _arrays(self):
+        return [("iniciados", None), ("dif_ativos", None), *(("parciais", n) for n in ESPALHADOS),
+                *(("dif_cheias", n) for n in ESPALHADOS), *(("classes", s) for s in self.classificacoes)]
+
+    def _aplicar(self, funcao):
+        for nome, chave in self._arrays():
+            if chave is None:
+                setattr(self, nome, funcao(getattr(self, nome)))
+            else:
+                getattr(self, nome)[chave] = funcao(getattr(self, nome)[chave])
+
+    # Garante as janelas absolutas [primeira, ultima] e uma posição a mais, onde ficam as diferenças dos
+    # fluxos que terminam na última janela; à direita a capacidade cresce em dobro (fluxos em ordem de
+    # start só acrescentam janelas no fim)
+    def _cobrir(self, primeira, ultima):
+        if self.origem is None:
+            self.origem = primeira
+        if primeira < self.origem:
+            extra = self.origem - primeira
+            self._aplicar(lambda a: np.concatenate([np.zeros((extra,) + a.shape[1:], dtype=a.dtype), a]))
+            self.origem = primeira
+            self.tamanho += extra
+        tamanho = ultima - self.origem + 1
+        capacidade = len(self.iniciados)
+        if tamanho + 1 > capacidade:
+            extra = max(tamanho + 1, 2 * capacidade) - capacidade
+            self._aplicar(lambda a: np.concatenate([a, np.zeros((extra,) + a.shape[1:], dtype=a.dtype)]))
+        self.tamanho = max(self.tamanho, tamanho)
+
+    # chunk: {campo: array} com CAMPOS_SERIE e os campos das classificações; thresholds: os de
+    # Classificacao.calcular_thresholds (só com classificações)
+    def adicionar(self, chunk, thresholds=None):
+        start = np.asarray(chunk["start"], dtype=np.int64)
+        if not len(start):
+            return self
+        duration = np.asarray(chunk["duration"], dtype=np.int64)
+        fim = start + duration
+        largura = self.largura
+        # Janelas da primeira e da última parte ativa; o fim é exclusivo (duração 0 fica na janela do início)
+        j0 = start // largura
+        j1 = np.where(duration > 0, (fim - 1) // largura, j0)
+        self._cobrir(int(j0.min()), int(j1.max()))
+        a, b = j0 - self.origem, j1 - self.origem
+        n = len(self.iniciados)
+
+        self.iniciados += np.bincount(a, minlength=n)
+        # A diferença de cada fluxo é desfeita na janela seguinte à última
+        self.dif_ativos += np.bincount(a, minlength=n) - np.bincount(b + 1, minlength=n)
+
+        # Espalhados: valor por ms em [start, fim); fluxos numa janela só ficam inteiros nela
+        mesma = a == b
+        with np.errstate(divide="ignore", invalid="ignore"):
+            primeira_parte = np.where(mesma, 1.0, ((j0 + 1) * largura - start) / duration)
+            ultima_parte = np.where(mesma, 0.0, (fim - j1 * largura) / duration)
+            cheia = np.where(mesma, 0.0, largura / duration)
+        meio = b > a + 1
+        for nome, campo in ESPALHADOS.items():
+            valores = np.asarray(chunk[campo], dtype=np.float64)
+            self.parciais[nome] += np.bincount(a, weights=valores * primeira_parte, minlength=n)
+            self.parciais[nome] += np.bincount(b, weights=valores * ultima_parte, minlength=n)
+            por_janela = (valores * cheia)[meio]
+            self.dif_cheias[nome] += np.bincount(a[meio] + 1, weights=por_janela, minlength=n)
+            self.dif_cheias[nome] -= np.bincount(b[meio], weights=por_janela, minlength=n)
+
+        for selecao in self.classificacoes:
+            quantidade = len(categorias(selecao))
+            codigos = classificar(selecao, chunk[CLASSIFICACOES[selecao]["campo"]], thresholds, chunk["npackets_total"])
+            self.classes[selecao] += np.bincount(a * quantidade + codigos, minlength=n * quantidade).reshape(n, quantidade)
+        return self
+
+    def combinar(self, outro):
+        if outro.origem is None:
+            return self
+        self._cobrir(outro.origem, outro.origem + outro.tamanho - 1)
+        inicio = outro.origem - self.origem
+        for nome, chave in self._arrays():
+            destino = getattr(self, nome) if chave is None else getattr(self, nome)[chave]
+            origem = getattr(outro, nome) if chave is None else getattr(outro, nome)[chave]
+            destino[inicio:inicio + outro.tamanho + 1] += origem[:outro.tamanho + 1]
+        return self
+
+    # Início (ms) de cada janela
+    def janelas(self):
+        if self.origem is None:
+            return np.zeros(0, dtype=np.int64)
+        return (self.origem + np.arange(self.tamanho, dtype=np.int64)) * self.largura
+
+    def ativos(self):
+        return np.cumsum(self.dif_ativos[:self.tamanho])
+
+    def espalhado(self, nome):
+        return self.parciais[nome][:self.tamanho] + np.cumsum(self.dif_cheias[nome][:self.tamanho])
+
+    # Vazão em bytes/s e pacotes/s de cada janela
+    def por_segundo(self, nome):
+        return self.espalhado(nome) / (self.largura / 1000)
+
+    # Fluxos iniciados em cada janela por categoria: {categoria: array}
+    def por_categoria(self, selecao):
+        contagens = self.classes[selecao][:self.tamanho]
+        return {categoria: contagens[:, i] for i, categoria in enumerate(categorias(selecao))}
+
+    # Todas as séries como arrays de mesmo tamanho (para gráficos, CSV ou .npz)
+    def colunas(self):
+        colunas = {
+            "inicio": self.janelas(),
+            "fluxos_iniciados": self.iniciados[:self.tamanho],
+            "fluxos_ativos": self.ativos(),
+            "bytes": self.espalhado("bytes"),
+            "pacotes": self.espalhado("pacotes"),
+            "bytes_por_segundo": self.por_segundo("bytes"),
+            "pacotes_por_segundo": self.por_segundo("pacotes"),
+        }
+        for selecao in self.classificacoes:
+            for categoria, contagens in self.por_categoria(selecao).items():
+                colunas[f"{selecao}_{categoria}"] = contagens
+        return colunas
+
+    # Guarda também a posição depois da última janela (diferenças dos fluxos que terminam nela)
+    def para_dict(self):
+        fim = self.tamanho + 1 if self.origem is not None else 0
+        return {
+            "largura": self.largura, "classificacoes": self.classificacoes, "origem": self.origem,
+            "tamanho": self.tamanho, "iniciados": self.iniciados[:fim].tolist(), "dif_ativos": self.dif_ativos[:fim].tolist(),
+            "parciais": {nome: valores[:fim].tolist() for nome, valores in self.parciais.items()},
+            "dif_cheias": {nome: valores[:fim].tolist() for nome, valores in self.dif_cheias.items()},
+            "classes": {selecao: valores[:fim].tolist() for selecao, valores in self.classes.items()},
+        }
+
+    @classmethod
+    def de_dict(cls, dados):
+        serie = cls(dados["largura"], dados["classificacoes"])
+        serie.origem = dados["origem"]
+        serie.tamanho = dados["tamanho"]
+        serie.iniciados = np.array(dados["iniciados"], dtype=np.int64)
+        serie.dif_ativos = np.array(dados["dif_ativos"], dtype=np.int64)
+        serie.parciais = {nome: np.array(valores, dtype=np.float64) for nome, valores in dados["parciais"].items()}
+        serie.dif_cheias = {nome: np.array(valores, dtype=np.float64) for nome, valores in dados["dif_cheias"].items()}
+        serie.classes = {
+            selecao: np.array(valores, dtype=np.int64).reshape(-1, len(categorias(selecao)))
+            for selecao, valores in dados["classes"].items()
+        }
+        return serie
+
+def chave_serie(largura, classificacoes, modo, filtro):
+    intervalo = ",".join(f"{campo}={minimo}:{maximo}" for campo, (minimo, maximo) in sorted((filtro or {}).items()))
+    return f"serie/{largura}/{','.join(classificacoes)}/{modo if classificacoes else ''}/{intervalo}"
+
+# {nome: SerieTemporal} para definicoes = {nome: (largura, classificacoes)}, todas numa única passada.
+# As séries ficam no cache da coleção; filtro (ex.: {"start": (inicio, fim)}) limita os fluxos pelo start
+# (usa o índice de start do MongoDB ou os mínimos/máximos dos chunks do armazém colunar).
+def calcular_series(store, definicoes, cache, thresholds=None, modo=None, filtro=None):
+    chaves = {nome: chave_serie(largura, classificacoes, modo, filtro)
+              for nome, (largura, classificacoes) in definicoes.items()}
+    faltando = {nome: definicoes[nome] for nome, chave in chaves.items() if chave not in cache}
+    if faltando:
+        series = {nome: SerieTemporal(largura, classificacoes) for nome, (largura, classificacoes) in faltando.items()}
+        campos = sorted({*CAMPOS_SERIE, *(CLASSIFICACOES[s]["campo"] for _, classes in faltando.values() for s in classes)})
+        for chunk in store.scan(campos, filtro):
+            for serie in series.values():
+                serie.adicionar(chunk, thresholds)
+        for nome, serie in series.items():
+            cache.entradas[chaves[nome]] = serie.para_dict()
+        cache.gravar()
+    return {nome: SerieTemporal.de_dict(cache[chave]) for nome, chave in chaves.items()}
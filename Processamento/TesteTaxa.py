@@ -1,99 +1,167 @@
-from pymongo import MongoClient
-from pprint import pprint
+import csv
+import sys
+import time
+import numpy as np
+from FlowStore import abrir_store, Expressao, avaliar_expressao, campos_expressao
+from CacheEstatisticas import CacheEstatisticas, obter_estatisticas
+from Classificacao import CLASSIFICACOES, calcular_thresholds, campo_classe, classificar, categorias, expressao_rotulo
+from Amostragem import amostra_estratificada, estrato_classe
 
 # Configuração
-DATABASE = 2  # 1 para CAIDA, 2 para MAWI
-
-if DATABASE == 1:
-    DB_NAME = "fluxos_database"
-    COLLECTION_NAME = "caida_collection"
-elif DATABASE == 2:
-    DB_NAME = "fluxos_database"
-    COLLECTION_NAME = "mawi_collection"
-else:
-    raise ValueError("Escolha 1 (CAIDA) ou 2 (MAWI)")
-
-# Thresholds fixos (ajuste se quiser usar os dinâmicos calculados antes)
-CARACOL_RATE_THRESHOLD = 16384  # 16 KB/s
-CHITA_RATE_THRESHOLD = 279265.20  # valor que saiu no seu script principal
+DATASET = "mawi"  # "caida", "mawi" ou "mawi2025" (ver FlowStore.DATASETS)
+BACKEND = "mongo"  # "mongo" ou "colunar" (armazém local gerado com Ingestao.py --armazem)
+
 MIN_PACKETS = 3
+MODO_THRESHOLD = "sigma"  # "sigma" (média + 3σ) ou "percentil" (p99; ver Classificacao.py)
+LIMITE = 1000  # fluxos conferidos (teste rápido, aumente se quiser)
+# Os fluxos conferidos são uma amostra aleatória de toda a coleção ($sample no MongoDB), não os primeiros
+# na ordem de inserção. Com ESTRATIFICAR cada categoria (Normal, Caracol, Chita) entra com LIMITE / 3 fluxos,
+# para que as categorias raras também sejam conferidas (no MongoDB sorteados no servidor, categoria a categoria;
+# nos backends locais, uma passada completa pelos fluxos).
+ESTRATIFICAR = False
+SEMENTE = None  # None: uma amostra diferente a cada execução
+
+# Validação completa: todos os fluxos da coleção, em chunks, em cada uma de CLASSIFICACOES_TESTE.
+# Toda divergência vai para ARQUIVO_DIVERGENCIAS e no fim sai a matriz de confusão de cada classificação.
+# É feita para os backends locais (colunar ou em memória): a referência roda em NumPy sobre cada fluxo, então
+# no MongoDB todos os documentos vêm para o cliente (uma passada completa pela rede). Para uma coleção grande,
+# exporte-a para o armazém colunar (ArmazemColunar.py exportar) e valide lá com BACKEND = "colunar".
+COMPLETO = False
+CLASSIFICACOES_TESTE = ["volume", "duracao", "taxa"]
+ARQUIVO_DIVERGENCIAS = "divergencias_classificacao.csv"
+INTERVALO_LOG = 10  # s entre as mensagens de progresso
+
+# Classificação em teste: a expressão do MongoDB gerada a partir das regras de Classificacao.py (no servidor;
+# nos backends locais a mesma expressão é avaliada em NumPy por avaliar_expressao) ou, com as classes gravadas
+# na coleção no mesmo modo (MaterializarDerivados.py --classes), o campo gravado.
+# A referência é sempre Classificacao.classificar, vetorizado sobre os chunks.
+# Devolve o campo com o rótulo testado e as expressões que o calculam.
+def classificacao_testada(store, selecao, thresholds):
+    classes = store.classes()
+    if classes and classes["modo"] == MODO_THRESHOLD and campo_classe(selecao) in classes["campos"]:
+        print(f"Classificação lida do campo {campo_classe(selecao)} (gravado na coleção)")
+        return campo_classe(selecao), {}
+    expressao = expressao_rotulo(selecao, thresholds, MIN_PACKETS).expressao
+    testada = Expressao(tuple(sorted(campos_expressao(expressao))), lambda chunk: avaliar_expressao(expressao, chunk), expressao)
+    return f"tipo_{selecao}", {f"tipo_{selecao}": testada}
+
+def referencia(selecao, chunk, thresholds):
+    return classificar(selecao, chunk[CLASSIFICACOES[selecao]["campo"]], thresholds, chunk["npackets_total"], MIN_PACKETS)
+
+def main(dataset=DATASET, backend=BACKEND, limite=LIMITE, estratificar=ESTRATIFICAR, completo=COMPLETO):
+    store = abrir_store(dataset, backend)
+
+    # Thresholds iguais aos do Proporcoes.py, lidos do cache da coleção (calculados só se faltarem)
+    selecoes = CLASSIFICACOES_TESTE if completo else ["taxa"]
+    momentos, distribuicoes = obter_estatisticas(store, sorted({CLASSIFICACOES[s]["campo"] for s in selecoes}),
+                                                 CacheEstatisticas(store))
+    thresholds = calcular_thresholds(momentos, distribuicoes, MODO_THRESHOLD)
+    if completo:
+        return validar_completo(store, selecoes, thresholds)
+    conferir_amostra(store, thresholds, limite, estratificar)
+
+def conferir_amostra(store, thresholds, limite, estratificar):
+    CARACOL_RATE_THRESHOLD = thresholds["caracol"]
+    CHITA_RATE_THRESHOLD = thresholds["chita"]
+    print(f"Thresholds: Caracol < {CARACOL_RATE_THRESHOLD:.2f} B/s, Chita ≥ {CHITA_RATE_THRESHOLD:.2f} B/s")
+    campo_tipo, expressoes = classificacao_testada(store, "taxa", thresholds)
+
+    # Executa (amostra de LIMITE fluxos)
+    campos = ["nbytes_total", "duration", "npackets_total", "rate"]
+    filtro = {"nbytes_total": (1, None), "duration": (1, None)}
+    if estratificar:
+        amostra = amostra_estratificada(store, [*campos, campo_tipo], estrato_classe("taxa", thresholds, MIN_PACKETS),
+                                        max(1, limite // 3), filtro, SEMENTE, expressoes)
+        print("Amostra por categoria: " + ", ".join(f"{rotulo} {n} de {populacao:.0f}" for rotulo, n, populacao
+                                                    in zip(amostra.rotulos, amostra.tamanhos, amostra.populacao)))
+        chunks = [amostra.colunas]
+    else:
+        chunks = store.amostrar([*campos, campo_tipo], tamanho=limite, filtro=filtro, semente=SEMENTE, expressoes=expressoes)
+    fluxos = []
+    for chunk in chunks:
+        chunk = dict(chunk, esperado=np.array(categorias("taxa"))[referencia("taxa", chunk, thresholds)])
+        colunas = [chunk[campo].tolist() for campo in [*campos, campo_tipo, "esperado"]]
+        fluxos.extend(dict(zip([*campos, "tipo_taxa", "esperado"], valores)) for valores in zip(*colunas))
+
+    print("\nClassificação dos Fluxos:")
+    for f in fluxos:
+        rate = f['rate']
+        tipo = f['tipo_taxa']
+        print(f"rate: {rate:.2f} B/s | duration: {f['duration']} ms | bytes: {f['nbytes_total']} | npackets: {f['npackets_total']} → {tipo}")
+
+    # Verificação extra: inconsistência com a referência
+    print("\n🔍 Verificando possíveis erros de classificação:")
+    for f in fluxos:
+        if f['tipo_taxa'] != f['esperado']:
+            print(f"❌ Deveria ser '{f['esperado']}': rate={f['rate']:.2f} B/s, npackets={f['npackets_total']}, "
+                  f"classificado como {f['tipo_taxa']}")
+
+# Confere todos os fluxos: em cada chunk as classificações testadas (calculadas no servidor no MongoDB) são
+# comparadas com a referência de uma vez, sem laço por fluxo. Devolve 1 se houver divergências.
+def validar_completo(store, selecoes, thresholds, arquivo=ARQUIVO_DIVERGENCIAS):
+    testadas, expressoes = {}, {}
+    for s in selecoes:
+        testadas[s], expressao = classificacao_testada(store, s, thresholds)
+        expressoes.update(expressao)
+    campos = sorted({"_id", "npackets_total", *(CLASSIFICACOES[s]["campo"] for s in selecoes)})
+    print("Thresholds: " + ", ".join(f"{nome} {valor:.2f}" for nome, valor in thresholds.items()))
+    if store.nome == "mongo":
+        print("Aviso: no MongoDB a validação completa traz todos os fluxos para o cliente (ver COMPLETO)")
+
+    confusao = {s: {} for s in selecoes}  # {(esperado, obtido): fluxos}
+    total = divergencias = 0
+    inicio = ultimo_log = time.time()
+    with open(arquivo, "w", newline="", encoding="utf-8") as file:
+        escritor = csv.writer(file, lineterminator="\n")
+        escritor.writerow(["classificacao", "_id", "campo", "valor", "npackets_total", "esperado", "obtido"])
+        for chunk in store.scan([*campos, *dict.fromkeys(testadas.values())], expressoes=expressoes):
+            total += len(chunk["npackets_total"])
+            for s in selecoes:
+                nomes = categorias(s)
+                esperados = referencia(s, chunk, thresholds)
+                # Código da categoria obtida (len(nomes) para um rótulo desconhecido)
+                rotulos = np.asarray(chunk[testadas[s]], dtype=object)
+                obtidos = np.full(len(rotulos), len(nomes))
+                for codigo, nome in enumerate(nomes):
+                    obtidos[rotulos == nome] = codigo
+                pares = np.bincount(esperados * (len(nomes) + 1) + obtidos, minlength=len(nomes) * (len(nomes) + 1))
+                for par in np.flatnonzero(pares).tolist():
+                    esperado, obtido = divmod(par, len(nomes) + 1)
+                    if obtido < len(nomes):
+                        chave = (nomes[esperado], nomes[obtido])
+                        confusao[s][chave] = confusao[s].get(chave, 0) + int(pares[par])
+                for esperado, rotulo in zip(esperados[obtidos == len(nomes)].tolist(), rotulos[obtidos == len(nomes)].tolist()):
+                    chave = (nomes[esperado], str(rotulo))
+                    confusao[s][chave] = confusao[s].get(chave, 0) + 1
+
+                diferentes = np.flatnonzero(esperados != obtidos)
+                divergencias += len(diferentes)
+                campo = CLASSIFICACOES[s]["campo"]
+                escritor.writerows(
+                    [s, _id, campo, valor, npackets, nomes[esperado], rotulo]
+                    for _id, valor, npackets, esperado, rotulo in zip(
+                        chunk["_id"][diferentes].tolist(), chunk[campo][diferentes].tolist(),
+                        chunk["npackets_total"][diferentes].tolist(), esperados[diferentes].tolist(),
+                        rotulos[diferentes].tolist())
+                )
+            if time.time() - ultimo_log >= INTERVALO_LOG:
+                ultimo_log = time.time()
+                print(f"  {total} fluxos conferidos ({total / (ultimo_log - inicio):.0f}/s), {divergencias} divergência(s)", flush=True)
+
+    tempo = time.time() - inicio
+    print(f"\n{total} fluxos conferidos em {tempo:.1f} s ({total / max(tempo, 1e-9):.0f}/s) em {', '.join(selecoes)}")
+    for s in selecoes:
+        erros = sum(n for (esperado, obtido), n in confusao[s].items() if esperado != obtido)
+        print(f"\n{s}: {erros} divergência(s) (linhas: referência, colunas: obtido)")
+        obtidos = sorted({obtido for _, obtido in confusao[s]})
+        print(" " * 12 + "".join(f"{obtido:>12}" for obtido in obtidos))
+        for esperado in categorias(s):
+            print(f"{esperado:<12}" + "".join(f"{confusao[s].get((esperado, obtido), 0):>12}" for obtido in obtidos))
+    if divergencias:
+        print(f"\n❌ {divergencias} divergência(s) gravada(s) em '{arquivo}'")
+        return 1
+    print(f"\n✅ Nenhuma divergência ('{arquivo}' só tem o cabeçalho)")
+    return 0
 
-# Conexão
-client = MongoClient("mongodb://localhost:27017/")
-collection = client[DB_NAME][COLLECTION_NAME]
-
-# Pipeline de teste
-pipeline = [
-    {"$match": {
-        "nbytes_total": {"$gt": 0},
-        "duration": {"$gt": 0}
-    }},
-    {"$limit": 1000},  # Para teste rápido, aumente se quiser
-    {"$project": {
-        "nbytes_total": 1,
-        "duration": 1,
-        "npackets_total": 1,
-        "rate": {
-            "$cond": [
-                {"$gt": ["$duration", 0]},
-                {"$divide": ["$nbytes_total", {"$divide": ["$duration", 1000]}]},
-                0
-            ]
-        },
-        "tipo_taxa": {
-            "$cond": [
-                {"$lt": ["$npackets_total", MIN_PACKETS]},
-                "Normal",
-                {
-                    "$switch": {
-                        "branches": [
-                            {"case": {
-                                "$lt": [
-                                    {
-                                        "$cond": [
-                                            {"$gt": ["$duration", 0]},
-                                            {"$divide": ["$nbytes_total", {"$divide": ["$duration", 1000]}]},
-                                            0
-                                        ]
-                                    }, CARACOL_RATE_THRESHOLD
-                                ]
-                            }, "then": "Caracol"},
-                            {"case": {
-                                "$gte": [
-                                    {
-                                        "$cond": [
-                                            {"$gt": ["$duration", 0]},
-                                            {"$divide": ["$nbytes_total", {"$divide": ["$duration", 1000]}]},
-                                            0
-                                        ]
-                                    }, CHITA_RATE_THRESHOLD
-                                ]
-                            }, "then": "Chita"},
-                        ],
-                        "default": "Normal"
-                    }
-                }
-            ]
-        }
-    }}
-]
-
-# Executa
-fluxos = list(collection.aggregate(pipeline))
-
-print("\nClassificação dos Fluxos:")
-for f in fluxos:
-    rate = f['rate']
-    tipo = f['tipo_taxa']
-    print(f"rate: {rate:.2f} B/s | duration: {f['duration']} ms | bytes: {f['nbytes_total']} | npackets: {f['npackets_total']} → {tipo}")
-
-# Verificação extra: inconsistência
-print("\n🔍 Verificando possíveis erros de classificação:")
-for f in fluxos:
-    if f['npackets_total'] >= MIN_PACKETS:
-        if f['rate'] < CARACOL_RATE_THRESHOLD and f['tipo_taxa'] != "Caracol":
-            print(f"❌ Deveria ser 'Caracol': rate={f['rate']:.2f} B/s, classificado como {f['tipo_taxa']}")
-        elif f['rate'] >= CHITA_RATE_THRESHOLD and f['tipo_taxa'] != "Chita":
-            print(f"❌ Deveria ser 'Chita': rate={f['rate']:.2f} B/s, classificado como {f['tipo_taxa']}")
-        elif CARACOL_RATE_THRESHOLD <= f['rate'] < CHITA_RATE_THRESHOLD and f['tipo_taxa'] != "Normal":
-            print(f"❌ Deveria ser 'Normal': rate={f['rate']:.2f} B/s, classificado como {f['tipo_taxa']}")
+if __name__ == "__main__":
+    sys.exit(main())
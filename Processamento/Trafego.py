@@ -0,0 +1,100 @@
+from datetime import datetime
+import numpy as np
+import pandas as pd
+import os
+import time
+from FlowStore import abrir_store, obter_dataset
+from CacheEstatisticas import CacheEstatisticas, obter_estatisticas
+from Classificacao import CAMPOS_THRESHOLDS, calcular_thresholds, descricao_modo
+from SeriesTemporais import calcular_series
+from Renderizacao import Figura, renderizar
+
+# Configurações
+DATASET = "caida"  # "caida", "mawi" ou "mawi2025" (ver FlowStore.DATASETS)
+BACKEND = "mongo"  # "mongo" ou "colunar" (armazém local gerado com Ingestao.py --armazem)
+
+# Pasta e nome do dataset nos gráficos (definidos em main)
+PATH_GRAPHS = None
+NAME = None
+
+LARGURA_VAZAO = 1000  # ms: vazão, fluxos ativos e fluxos iniciados por segundo
+LARGURA_CLASSES = 60000  # ms: mistura de categorias por minuto
+CLASSES = ["volume", "duracao", "taxa"]  # classificações da mistura por minuto (Classificacao.py)
+MODO_THRESHOLD = "sigma"  # "sigma" (média + 3σ) ou "percentil" (p99; ver Classificacao.py)
+INTERVALO = None  # opcional: (inicio, fim) em ms do start, ex.: (0, 600000); sem intervalo usa todos os fluxos
+
+today_str = datetime.now().strftime('%Y%m%d')
+
+def log(msg):
+    print(f"[{datetime.now().strftime('%H:%M:%S')}] {msg}", flush=True)
+
+# Séries temporais do tráfego (SeriesTemporais.py): as duas larguras saem da mesma passada e ficam no cache
+# da coleção. Com INTERVALO só entram os fluxos que começam dentro dele.
+def main(dataset=DATASET, backend=BACKEND):
+    global PATH_GRAPHS, NAME
+    info = obter_dataset(dataset)
+    PATH_GRAPHS = os.path.join(info["graficos"], "Trafego")
+    NAME = info["nome"]
+    log(f"Abrindo {NAME} (backend {backend})...")
+    store = abrir_store(dataset, backend)
+    os.makedirs(PATH_GRAPHS, exist_ok=True)
+    cache = CacheEstatisticas(store)
+
+    thresholds = None
+    if CLASSES:
+        momentos, distribuicoes = obter_estatisticas(store, sorted(set(CAMPOS_THRESHOLDS.values())), cache)
+        thresholds = calcular_thresholds(momentos, distribuicoes, MODO_THRESHOLD)
+
+    log("Calculando as séries temporais (passada única se ainda não estiverem no cache)...")
+    filtro = {"start": INTERVALO} if INTERVALO else None
+    series = calcular_series(store, {"vazao": (LARGURA_VAZAO, []), "classes": (LARGURA_CLASSES, CLASSES)},
+                             cache, thresholds, MODO_THRESHOLD, filtro)
+
+    for nome, serie in series.items():
+        colunas = serie.colunas()
+        pd.DataFrame(colunas).to_csv(os.path.join(PATH_GRAPHS, f"{today_str}_Serie_{nome}.csv"), index=False)
+        np.savez_compressed(os.path.join(PATH_GRAPHS, f"{today_str}_Serie_{nome}.npz"), **colunas)
+        log(f"Série {nome}: {len(colunas['inicio'])} janelas de {serie.largura} ms")
+
+    figuras = generate_throughput_graphs(series["vazao"])
+    for selecao in CLASSES:
+        figuras += generate_class_mix_graph(series["classes"], selecao)
+    log(f"Renderizando {len(figuras)} gráficos...")
+    renderizar(figuras, log=log)
+    log("Gráficos gerados.")
+
+# Eixo x em segundos desde a primeira janela
+def eixo_tempo(serie):
+    janelas = serie.janelas()
+    return (janelas - janelas[0]) / 1000 if len(janelas) else janelas
+
+def plot_serie(x, y, ylabel, title, filename):
+    return Figura(os.path.join(PATH_GRAPHS, f"{today_str}_{filename}.png"), "linha", {"x": x, "y": y},
+                  {"figsize": (12, 5), "espessura": 0.8, "xlabel": "Tempo (s)", "ylabel": ylabel,
+                   "titulo": f"{title} - {NAME}", "ajustar": True})
+
+def generate_throughput_graphs(serie):
+    x = eixo_tempo(serie)
+    return [
+        plot_serie(x, serie.por_segundo("bytes") * 8 / 1e6, "Vazão (Mbit/s)", "Vazão ao longo do tempo", "VazaoMbps"),
+        plot_serie(x, serie.por_segundo("pacotes"), "Pacotes por segundo", "Pacotes por segundo ao longo do tempo", "PacotesPorSegundo"),
+        plot_serie(x, serie.ativos(), "Fluxos ativos", "Fluxos ativos ao longo do tempo", "FluxosAtivos"),
+        plot_serie(x, serie.iniciados[:serie.tamanho], "Fluxos iniciados", "Fluxos iniciados por janela", "FluxosIniciados"),
+    ]
+
+def generate_class_mix_graph(serie, selecao):
+    contagens = serie.por_categoria(selecao)
+    totais = np.maximum(sum(contagens.values()), 1)
+    camadas = {categoria: valores / totais * 100 for categoria, valores in contagens.items()}
+    titulo = f"Categorias de {selecao} por janela de {serie.largura / 1000:g} s ({descricao_modo(MODO_THRESHOLD)}) - {NAME}"
+    return [Figura(os.path.join(PATH_GRAPHS, f"{today_str}_MisturaCategorias_{selecao}.png"), "barras_empilhadas",
+                   {"x": eixo_tempo(serie), "largura": serie.largura / 1000, "camadas": camadas},
+                   {"figsize": (12, 5), "xlabel": "Tempo (s)", "ylabel": "Fluxos iniciados (%)", "titulo": titulo, "ajustar": True})]
+
+if __name__ == "__main__":
+    start = time.time()
+    log("Iniciando as séries temporais...")
+    log("=" * 50)
+    main()
+    log("=" * 50)
+    log(f"Tempo total: {round(time.time() - start, 2)} segundos.")
@@ -0,0 +1,178 @@
+import argparse
+import builtins
+import io
+import os
+import sys
+import time
+
+# CLI do projeto: um subcomando por etapa (ingestão, unificação, cópia e análises).
+# Só o necessário é importado no início (argparse e Datasets, sem dependências, para validar --dataset e
+# --backend); cada subcomando importa os seus módulos, e com eles numpy, pandas, matplotlib ou pymongo,
+# dentro da própria função. Uma consulta rápida (top-rates, validate)
+# não paga a importação do pandas nem do matplotlib.
+# Com --profile-startup o tempo de importação de cada módulo é mostrado no fim (em stderr).
+#   python nbig.py top-rates --dataset caida --limite 10
+#   python nbig.py proportions --dataset mawi --classificacoes volume taxa
+#   python nbig.py proportions --dataset caida --amostra 0.001
+#   python nbig.py ingest --dataset caida --workers 4 --resumos
+#   python nbig.py unify --engine memoria && python nbig.py proportions --dataset caida_unificada
+
+INICIO = time.perf_counter()
+RAIZ = os.path.dirname(os.path.abspath(__file__))
+sys.path[:0] = [os.path.join(RAIZ, "Processamento"), os.path.join(RAIZ, "PreProcessamento")]
+
+from Datasets import DATASETS, BACKENDS
+
+AJUDA_PADRAO = "padrão: {} do script"
+
+# Tempo próprio (sem os módulos que ele importa) de cada importação nova, somado por pacote de topo
+class PerfilImportacao:
+    def __init__(self):
+        self.tempos = {}
+        self.pilha = []
+        self.original = None
+
+    def __enter__(self):
+        self.original = builtins.__import__
+        builtins.__import__ = self._importar
+        return self
+
+    def __exit__(self, *erro):
+        builtins.__import__ = self.original
+
+    def _importar(self, nome, globals=None, locals=None, fromlist=(), level=0):
+        if level or nome in sys.modules:
+            return self.original(nome, globals, locals, fromlist, level)
+        inicio = time.perf_counter()
+        self.pilha.append(0.0)
+        try:
+            return self.original(nome, globals, locals, fromlist, level)
+        finally:
+            total = time.perf_counter() - inicio
+            filhos = self.pilha.pop()
+            pacote = nome.partition(".")[0]
+            self.tempos[pacote] = self.tempos.get(pacote, 0.0) + total - filhos
+            if self.pilha:
+                self.pilha[-1] += total
+
+    def relatorio(self, inicio_comando, fim_comando, maximo=20):
+        sys.stdout.flush()
+        saida = sys.stderr
+        total = sum(self.tempos.values())
+        print(f"\nInício até o comando: {inicio_comando - INICIO:.3f} s; comando: {fim_comando - inicio_comando:.3f} s, "
+              f"dos quais {total:.3f} s em importações ({len(self.tempos)} módulo(s) de topo):", file=saida)
+        for pacote, tempo in sorted(self.tempos.items(), key=lambda item: -item[1])[:maximo]:
+            print(f"  {pacote:<28} {tempo * 1000:>9.1f} ms", file=saida)
+
+# Argumentos informados (os não informados ficam com as constantes do script)
+def opcoes(args, *nomes):
+    return {nome: getattr(args, nome) for nome in nomes if getattr(args, nome) is not None}
+
+def cmd_ingest(args, resto):
+    import Ingestao
+    Ingestao.main(resto)
+
+# Módulo de cada motor de unificação; todos menos "fluxos" gravam em caida_unificada_collection
+# (dataset caida_unificada)
+MOTORES_UNIFICACAO = {
+    "fluxos": "UnificadorFluxos",
+    "memoria": "UnificadorMemoria",
+    "externo": "UnificadorExterno",
+    "paralelo": "UnificadorParalelo",
+}
+
+def cmd_unify(args, resto):
+    import importlib
+    importlib.import_module(MOTORES_UNIFICACAO[args.engine]).main()
+
+def cmd_copy(args, resto):
+    import CopiaBanco
+    CopiaBanco.main(**opcoes(args, "origem", "destino", "db", "uri"))
+
+def cmd_proportions(args, resto):
+    import Proporcoes
+    Proporcoes.main(**opcoes(args, "dataset", "backend", "amostra", "estratos"), selecionados=args.classificacoes)
+
+def cmd_relations(args, resto):
+    import Relacoes
+    Relacoes.main(**opcoes(args, "dataset", "backend"))
+
+def cmd_traffic(args, resto):
+    import Trafego
+    Trafego.main(**opcoes(args, "dataset", "backend"))
+
+def cmd_top_rates(args, resto):
+    import MaiorTaxa
+    MaiorTaxa.main(**opcoes(args, "dataset", "backend", "arquivo", "campo", "limite", "janela"))
+
+def cmd_validate(args, resto):
+    import TesteTaxa
+    return TesteTaxa.main(**opcoes(args, "dataset", "backend", "limite", "estratificar", "completo"))
+
+def cmd_batch(args, resto):
+    import Lote
+    return Lote.main(resto)
+
+# Subcomandos que repassam os próprios argumentos para o script (ex.: ingest --help mostra os do Ingestao.py)
+REPASSADOS = {"ingest", "batch"}
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog="nbig", description="Ingestão, unificação e análises dos fluxos.")
+    parser.add_argument("--profile-startup", action="store_true", help="Mostra o tempo de importação de cada módulo")
+    comandos = parser.add_subparsers(dest="comando", required=True, metavar="comando")
+
+    def comando(nome, funcao, ajuda, dados=True):
+        sub = comandos.add_parser(nome, help=ajuda, description=ajuda, add_help=nome not in REPASSADOS)
+        sub.set_defaults(funcao=funcao)
+        if dados:
+            sub.add_argument("--dataset", choices=sorted(DATASETS), help=AJUDA_PADRAO.format("DATASET"))
+            sub.add_argument("--backend", choices=sorted(BACKENDS), help=AJUDA_PADRAO.format("BACKEND"))
+        return sub
+
+    comando("ingest", cmd_ingest, "Insere arquivos de fluxos no MongoDB ou no armazém colunar (argumentos do Ingestao.py)", dados=False)
+    sub = comando("unify", cmd_unify, "Unifica os fluxos dos arquivos (configuração no script de cada motor)", dados=False)
+    sub.add_argument("--engine", choices=list(MOTORES_UNIFICACAO), default="fluxos",
+                     help="fluxos: na coleção do caida01 (UnificadorFluxos.py); memoria, externo ou paralelo: "
+                          "de todos os arquivos numa coleção nova (Unificador<Motor>.py, dataset caida_unificada)")
+    sub = comando("copy", cmd_copy, "Copia uma coleção no servidor ($out)", dados=False)
+    sub.add_argument("--origem", help="Coleção original")
+    sub.add_argument("--destino", help="Coleção de destino")
+    sub.add_argument("--db", help="Base de dados")
+    sub.add_argument("--uri", help="URI do MongoDB")
+    sub = comando("proportions", cmd_proportions, "Proporções das categorias (Proporcoes.py)")
+    sub.add_argument("--classificacoes", nargs="+", choices=["volume", "duracao", "taxa"], default=["volume", "duracao", "taxa"])
+    sub.add_argument("--amostra", type=float, help="Prévia numa amostra uniforme com essa fração dos fluxos (ex.: 0.001)")
+    sub.add_argument("--estratos", choices=["tempo"], help="Prévia numa amostra estratificada por fatia de tempo")
+    comando("relations", cmd_relations, "Histogramas das relações entre os campos (Relacoes.py)")
+    comando("traffic", cmd_traffic, "Séries temporais do tráfego (Trafego.py)")
+    sub = comando("top-rates", cmd_top_rates, "Maiores fluxos por taxa, volume ou duração (MaiorTaxa.py)")
+    sub.add_argument("--campo", choices=["rate", "nbytes_total", "duration"])
+    sub.add_argument("--limite", type=int)
+    sub.add_argument("--janela", type=int, help="Largura em ms para os maiores de cada janela")
+    sub.add_argument("--arquivo", help="CSV de saída")
+    sub = comando("validate", cmd_validate, "Confere a classificação de taxa numa amostra ou em todos os fluxos (TesteTaxa.py)")
+    sub.add_argument("--limite", type=int)
+    sub.add_argument("--estratificar", action="store_true", default=None, help="Mesmo número de fluxos de cada categoria")
+    sub.add_argument("--completo", action="store_true", default=None,
+                     help="Confere todos os fluxos em todas as classificações e grava as divergências")
+    comando("batch", cmd_batch, "Todas as análises em todos os datasets, em paralelo (argumentos do Lote.py)", dados=False)
+
+    args, resto = parser.parse_known_args(argv)
+    if resto and args.comando not in REPASSADOS:
+        parser.error(f"argumentos não reconhecidos: {' '.join(resto)}")
+    return args, resto
+
+def main(argv=None):
+    args, resto = parse_args(argv)
+    if not args.profile_startup:
+        return args.funcao(args, resto)
+    inicio_comando = time.perf_counter()
+    with PerfilImportacao() as perfil:
+        try:
+            return args.funcao(args, resto)
+        finally:
+            perfil.relatorio(inicio_comando, time.perf_counter())
+
+if __name__ == "__main__":
+    sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
+    sys.exit(main())